@@ -1,6 +1,9 @@
 Create database verano_cientifico;
 use verano_cientifico;
 
+-- Después de crear las tablas (y en bases existentes), aplicar los índices versionados:
+--     python -m migraciones.Ejecutar_Migraciones
+
 -- Tabla para guardar los datos del analisis
 CREATE TABLE comparacion_similitud (
     id int UNSIGNED NOT NULL AUTO_INCREMENT,
@@ -22,9 +25,42 @@ CREATE TABLE comparacion_similitud (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 
-    PRIMARY KEY (id)
+    PRIMARY KEY (id),
+    UNIQUE KEY uk_proyecto_usuarios (project_id, usuario_1_id, usuario_2_id), -- clave natural del par
+    KEY idx_usuario_1_detectada (usuario_1_id, similitud_detectada), -- mantenimiento de usuarios_marcados
+    KEY idx_usuario_2_detectada (usuario_2_id, similitud_detectada)
+);
+
+-- Tabla para guardar los datos del analisis semantico
+CREATE TABLE comparacion_similitud2 (
+    id int UNSIGNED NOT NULL AUTO_INCREMENT,
+    usuario_1_id INT NOT NULL,
+    usuario_2_id INT NOT NULL,
+    project_id INT NOT NULL,
+    
+    introduccion FLOAT,
+    marcoteorico FLOAT,
+    metodo FLOAT,
+    resultados FLOAT,
+    discusion FLOAT,
+    conclusiones FLOAT,
+    
+    secciones_similares INT,
+    similitud_detectada INT,
+    status_analisis TINYINT DEFAULT 0,
+    
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (id),
+    UNIQUE KEY uk_proyecto_usuarios (project_id, usuario_1_id, usuario_2_id)
 );
 
+-- Bases de datos existentes: las migraciones (python -m migraciones.Ejecutar_Migraciones) eliminan
+-- los pares duplicados (se conserva el más reciente) y agregan la clave natural uk_proyecto_usuarios
+-- en las diez tablas de comparación, además de los índices por usuario de comparacion_similitud.
+-- El guardado por lotes no escribe en una tabla sin esa clave.
+
 CREATE TABLE comparacion_similitud_3 (
     id int UNSIGNED NOT NULL AUTO_INCREMENT,
     usuario_1_id INT NOT NULL,
@@ -137,7 +173,8 @@ CREATE TABLE comparacion_tm (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 
-    PRIMARY KEY (id)
+    PRIMARY KEY (id),
+    UNIQUE KEY uk_proyecto_usuarios (project_id, usuario_1_id, usuario_2_id)
 );
 CREATE TABLE comparacion_tm_bigrama (
     id int UNSIGNED NOT NULL AUTO_INCREMENT,
@@ -159,7 +196,8 @@ CREATE TABLE comparacion_tm_bigrama (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 
-    PRIMARY KEY (id)
+    PRIMARY KEY (id),
+    UNIQUE KEY uk_proyecto_usuarios (project_id, usuario_1_id, usuario_2_id)
 );
 
 CREATE TABLE comparacion_tm_trigrama (
@@ -182,7 +220,8 @@ CREATE TABLE comparacion_tm_trigrama (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 
-    PRIMARY KEY (id)
+    PRIMARY KEY (id),
+    UNIQUE KEY uk_proyecto_usuarios (project_id, usuario_1_id, usuario_2_id)
 );
 
 CREATE TABLE comparacion_tm_4grama (
@@ -205,9 +244,12 @@ CREATE TABLE comparacion_tm_4grama (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 
-    PRIMARY KEY (id)
+    PRIMARY KEY (id),
+    UNIQUE KEY uk_proyecto_usuarios (project_id, usuario_1_id, usuario_2_id)
 );
 
+-- Bases de datos existentes: la clave natural de las tablas comparacion_tm* la agregan las migraciones.
+
 CREATE TABLE estadistica_tm (
     id int UNSIGNED NOT NULL AUTO_INCREMENT,
     project_id INT NOT NULL,
@@ -256,6 +298,76 @@ CREATE TABLE estadistica_tm_b (
     PRIMARY KEY (id)
 );
 
+-- Caché de textos lematizados por reporte y sección (se invalida por hash del texto crudo)
+CREATE TABLE reportes_lemas_cache (
+    id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+    reporte_id INT NOT NULL,          -- reportes_finales.id
+    seccion VARCHAR(50) NOT NULL,     -- 'introduccion', 'marcoteorico', etc.
+    texto_hash CHAR(64) NOT NULL,     -- sha256 del texto crudo de la sección
+    lemas TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (id),
+    UNIQUE KEY uk_reporte_seccion (reporte_id, seccion)
+);
+
+-- Huellas del último análisis por integrante (modo incremental)
+CREATE TABLE analisis_huellas (
+    id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+    tipo_analisis VARCHAR(20) NOT NULL, -- 'sintactico' o 'semantico'
+    ngrama INT NOT NULL DEFAULT 0,      -- 0 para el análisis semántico
+    project_id INT NOT NULL,
+    user_id INT NOT NULL,
+    reporte_id INT NOT NULL,            -- reportes_finales.id analizado
+    huella CHAR(64) NOT NULL,           -- sha256 de los hashes de las secciones del reporte
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (id),
+    UNIQUE KEY uk_huella_integrante (tipo_analisis, ngrama, project_id, user_id)
+);
+
+-- Usuarios con al menos una comparación con similitud detectada en comparacion_similitud.
+-- Se mantiene al guardar las comparaciones y la usa el filtro de reportes.
+CREATE TABLE usuarios_marcados (
+    user_id INT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (user_id)
+);
+
+-- Destino del filtro en modo 'ids' (FILTRO_MODO_DESTINO=ids): reportes sin similitud, sin copiar textos
+CREATE TABLE reportes_finales_analisis_ids (
+    reporte_id INT NOT NULL,            -- reportes_finales.id
+    user_id INT NOT NULL,
+    project_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (reporte_id),
+    KEY idx_usuario (user_id)
+);
+
+-- Resumen por proyecto del listado por temática; se actualiza al guardar en comparacion_similitud
+-- (también lo crea y lo llena la migración V002)
+CREATE TABLE resumen_proyectos (
+    project_id INT NOT NULL,
+    id_thematic INT NOT NULL,
+    num_integrantes INT NOT NULL DEFAULT 0,
+    integrantes_con_similitud INT NOT NULL DEFAULT 0,
+    analizado TINYINT NOT NULL DEFAULT 0,  -- 1 si tiene comparaciones y ninguna está pendiente
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (project_id),
+    KEY idx_resumen_tematica_proyecto (id_thematic, project_id)
+);
+
+-- Destino del filtro en modo 'vista' (FILTRO_MODO_DESTINO=vista); el servicio también la crea
+CREATE OR REPLACE VIEW reportes_finales_analisis_vista AS
+SELECT rf.id, rf.user_id, rf.project_id, rf.thematic_id, rf.subtematica_id, rf.nombre_reporte,
+       rf.created_at, rf.updated_at
+FROM reportes_finales rf
+WHERE NOT EXISTS (SELECT 1 FROM usuarios_marcados um WHERE um.user_id = rf.user_id);
+
 -- Tabla para ajustar_tolerancias
 CREATE TABLE tolerancias_similitud (
   id INT UNSIGNED NOT NULL AUTO_INCREMENT,          -- Identificador único de la configuración
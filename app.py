@@ -1,13 +1,19 @@
 from flask import Flask
 from routes.Ajuste_Tolerancia import tolerancia
 from routes.Analisis_Similitud import analisis
+from routes.Trabajos import trabajos
+from routes.Metricas import metricas
 from config.config import db
+from services.Registro import configurar_registro
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Registro por cola: los análisis no escriben en stdout desde su propio hilo
+configurar_registro()
+
 app = Flask(__name__)
 
 CORS(app)
@@ -26,3 +32,5 @@ db.init_app(app)
 
 app.register_blueprint(analisis)
 app.register_blueprint(tolerancia)
+app.register_blueprint(trabajos)
+app.register_blueprint(metricas)
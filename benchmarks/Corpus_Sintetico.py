@@ -0,0 +1,85 @@
+import random
+
+from services.Procesamiento_Similitud import COLUMNAS_SECCIONES
+
+# Vocabulario base de los reportes sintéticos (registro académico en español)
+VOCABULARIO = """
+análisis investigación estudio resultado resultados método métodos muestra muestras datos variable
+variables hipótesis objetivo objetivos teoría teórico marco conceptual modelo modelos proceso procesos
+sistema sistemas desarrollo evaluación medición medida medidas experimento experimentos prueba pruebas
+población participantes encuesta entrevista observación registro instrumento instrumentos validez
+confiabilidad estadística estadístico promedio desviación correlación regresión significativo
+significativa diferencia diferencias grupo grupos control tratamiento efecto efectos factor factores
+condición condiciones ambiente ambiental social sociales económico económica cultural educativo
+educativa salud calidad agua suelo energía temperatura presión concentración solución reacción
+compuesto material materiales estructura propiedades superficie tiempo periodo etapa etapas fase
+fases valor valores nivel niveles tasa porcentaje proporción cantidad número total parcial
+comparación relación relaciones tendencia tendencias patrón patrones comportamiento respuesta
+respuestas impacto influencia importancia contribución aporte conocimiento literatura autores
+antecedentes revisión enfoque cualitativo cuantitativo mixto diseño descriptivo exploratorio
+experimental transversal longitudinal técnica técnicas herramienta herramientas software programa
+algoritmo simulación cálculo ecuación función parámetro parámetros criterio criterios indicador
+indicadores región comunidad institución universidad estudiantes docentes profesores escuela
+proyecto propuesta discusión conclusión conclusiones introducción problema problemática pregunta
+justificación alcance limitación limitaciones recomendación recomendaciones futuro futuras mejora
+mejoras aplicación aplicaciones práctica prácticas evidencia evidencias hallazgo hallazgos
+mostrar muestra indica indican sugiere sugieren permite permiten obtener obtuvo obtuvieron
+analizar analizaron evaluar evaluaron medir midieron comparar compararon determinar determinaron
+observar observaron identificar identificaron describir describe explicar explica proponer propone
+considerar considera presentar presenta realizar realizó aplicar aplicó utilizar utilizó
+mayor menor alto alta bajo baja nuevo nueva importante principal general específico específica
+positivo positiva negativo negativa directo directa diverso diversa posible necesario necesaria
+""".split()
+
+CONECTORES = "el la los las de del en con para por que se un una como entre sobre además sin embargo también".split()
+
+def generar_texto(rng, num_palabras):
+    """Texto de 'num_palabras' palabras con conectores intercalados y puntuación."""
+    palabras = []
+    for i in range(num_palabras):
+        palabras.append(rng.choice(CONECTORES) if rng.random() < 0.3 else rng.choice(VOCABULARIO))
+        if i % 15 == 14:
+            palabras[-1] += "."
+    return " ".join(palabras).capitalize()
+
+def mezclar_texto(rng, texto, proporcion_copia):
+    """Copia parcial de 'texto': conserva cada palabra con probabilidad 'proporcion_copia'."""
+    return " ".join(palabra if rng.random() < proporcion_copia else rng.choice(VOCABULARIO)
+                    for palabra in texto.split())
+
+def generar_corpus(num_proyectos=20, integrantes_por_proyecto=4, palabras_por_seccion=200,
+                proporcion_similares=0.3, proporcion_copia=0.7, proporcion_vacias=0.05, semilla=1):
+    """
+    Filas sintéticas de 'reportes_finales', reproducibles con la misma 'semilla'.
+    - Cada proyecto tiene 'integrantes_por_proyecto' usuarios con un reporte cada uno.
+    - En una fracción 'proporcion_similares' de las secciones, el reporte copia parcialmente la
+    sección de otro integrante del proyecto (palabras conservadas: 'proporcion_copia').
+    - Una fracción 'proporcion_vacias' de las secciones queda vacía.
+    """
+    rng = random.Random(semilla)
+    filas = []
+    siguiente_usuario = 1
+    for project_id in range(1, num_proyectos + 1):
+        thematic_id = (project_id - 1) % 5 + 1
+        reportes_proyecto = []
+        for _ in range(integrantes_por_proyecto):
+            fila = {
+                "user_id": siguiente_usuario,
+                "project_id": project_id,
+                "thematic_id": thematic_id,
+                "subtematica_id": thematic_id,
+                "nombre_reporte": f"Reporte sintético {siguiente_usuario}",
+                "status": 1,
+            }
+            siguiente_usuario += 1
+            for seccion in COLUMNAS_SECCIONES:
+                if rng.random() < proporcion_vacias:
+                    fila[seccion] = ""
+                elif reportes_proyecto and rng.random() < proporcion_similares:
+                    fuente = rng.choice(reportes_proyecto)[seccion] or generar_texto(rng, palabras_por_seccion)
+                    fila[seccion] = mezclar_texto(rng, fuente, proporcion_copia)
+                else:
+                    fila[seccion] = generar_texto(rng, palabras_por_seccion)
+            reportes_proyecto.append(fila)
+        filas.extend(reportes_proyecto)
+    return filas
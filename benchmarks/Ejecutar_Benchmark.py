@@ -0,0 +1,268 @@
+"""
+Benchmark del análisis de similitud sobre un corpus sintético de 'reportes_finales'.
+
+Mide por separado cada etapa (carga, preprocesamiento, vectorización, embeddings, puntuación y
+escritura) contra una base SQLite local o una base MySQL desechable, guarda los tiempos en JSON
+y los compara con una línea base.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.Ejecutar_Benchmark --proyectos 50 --integrantes 5 --palabras 300
+    python -m benchmarks.Ejecutar_Benchmark --guardar-linea-base benchmarks/lineas_base/base.json
+    python -m benchmarks.Ejecutar_Benchmark --linea-base benchmarks/lineas_base/base.json --umbral 0.15
+
+Las tablas del benchmark se eliminan y se vuelven a crear en cada repetición: '--db' debe apuntar
+a una base de datos desechable, nunca a la de producción.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import insert
+
+# Las frecuencias de documento del benchmark no deben escribirse en la caché de la aplicación
+os.environ.setdefault("LEXICO_DIRECTORIO", tempfile.mkdtemp(prefix="benchmark_lexico_"))
+
+from config.config import db
+from models.Reportes_Finales import ReportesFinales
+from models.Lemas_Reportes import LemasReporte
+from models.Comparacion_Similitud import ComparacionSimilitud
+from models.Huellas_Analisis import HuellaAnalisis
+from models.Usuarios_Marcados import UsuarioMarcado
+from services.Carga_Reportes import iterar_reportes_por_proyecto
+from services.Cache_Lemas import obtener_lemas_reportes
+from services.Guardado_Comparaciones import ResultadosComparacion, guardar_comparaciones_lote
+from services.Modelos_NLP import obtener_nlp, obtener_modelo_semantico
+from services.Registro import configurar_registro
+from services.Motores_Lexicos import (
+    MOTORES, MOTOR_CONTEO, usa_estadisticas, actualizar_estadisticas, obtener_estadisticas_seccion, tokenizar_lemas
+)
+from services.Procesamiento_Similitud import COLUMNAS_SECCIONES, preprocesar_textos, calcular_matrices_similitud
+from benchmarks.Corpus_Sintetico import generar_corpus
+
+ETAPAS = ["carga", "preprocesamiento", "vectorizacion", "embeddings", "puntuacion", "escritura"]
+
+# Tablas que crea y elimina el benchmark
+TABLAS_BENCHMARK = [ReportesFinales.__table__, LemasReporte.__table__, ComparacionSimilitud.__table__,
+                    HuellaAnalisis.__table__, UsuarioMarcado.__table__]
+
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+
+# Regresiones menores a este número de segundos se consideran ruido de medición
+MINIMO_SEGUNDOS_REGRESION = 0.05
+
+def crear_app(uri_bd):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri_bd
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+def preparar_base(corpus):
+    """Recrea las tablas del benchmark e inserta el corpus (no se mide)."""
+    db.session.remove()
+    db.metadata.drop_all(bind=db.engine, tables=TABLAS_BENCHMARK)
+    db.metadata.create_all(bind=db.engine, tables=TABLAS_BENCHMARK)
+    for i in range(0, len(corpus), 1000):
+        db.session.execute(insert(ReportesFinales.__table__), corpus[i:i + 1000])
+    db.session.commit()
+
+def lematizar_sin_spacy(textos):
+    """Sustituto del preprocesamiento cuando el modelo de spaCy no está instalado."""
+    return [" ".join(tokenizar_lemas(str(texto))) if texto else "" for texto in textos]
+
+class Cronometro:
+    """Acumula el tiempo de cada etapa; una etapa puede medirse en varios tramos."""
+
+    def __init__(self):
+        self.segundos = {}
+
+    @contextlib.contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.segundos[etapa] = self.segundos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+def ejecutar_repeticion(corpus, ngrama, motor, con_embeddings):
+    """Ejecuta una vez todas las etapas sobre una base recién creada. Retorna (segundos, conteos, omitidas)."""
+    preparar_base(corpus)
+    cronometro = Cronometro()
+    omitidas = []
+
+    with cronometro.medir("carga"):
+        proyectos = list(iterar_reportes_por_proyecto())
+
+    reportes = [reporte for _, reportes_por_usuario in proyectos for reporte in reportes_por_usuario.values()]
+    lematizar = preprocesar_textos if obtener_nlp() else lematizar_sin_spacy
+    if not obtener_nlp():
+        omitidas.append("preprocesamiento")
+    with cronometro.medir("preprocesamiento"):
+        lemas = obtener_lemas_reportes(reportes, COLUMNAS_SECCIONES, lematizar)
+
+    if usa_estadisticas(motor):
+        with cronometro.medir("vectorizacion"):
+            actualizar_estadisticas((ngrama,))
+
+    pares = 0
+    for project_id, reportes_por_usuario in proyectos:
+        usuarios = list(reportes_por_usuario.keys())
+        if len(usuarios) < 2:
+            continue
+        with cronometro.medir("vectorizacion"):
+            matrices_por_seccion = {}
+            for seccion in COLUMNAS_SECCIONES:
+                textos = [lemas.get((reportes_por_usuario[user_id].id, seccion), "") for user_id in usuarios]
+                estadisticas = {ngrama: obtener_estadisticas_seccion(ngrama, seccion, project_id)} \
+                    if usa_estadisticas(motor) else None
+                matrices_por_seccion[seccion] = calcular_matrices_similitud(textos, (ngrama,), motor, estadisticas)[ngrama]
+        with cronometro.medir("puntuacion"):
+            comparaciones = ResultadosComparacion.desde_matrices(project_id, usuarios, matrices_por_seccion,
+                                                                {seccion: 0.5 for seccion in COLUMNAS_SECCIONES})
+        with cronometro.medir("escritura"):
+            if guardar_comparaciones_lote(ComparacionSimilitud, comparaciones) is None:
+                raise RuntimeError(f"Falló la escritura de las comparaciones del proyecto {project_id}.")
+        pares += len(comparaciones)
+
+    textos_semanticos = [str(getattr(reporte, seccion)) for reporte in reportes for seccion in COLUMNAS_SECCIONES
+                        if getattr(reporte, seccion)]
+    if con_embeddings and obtener_modelo_semantico():
+        from services.Procesamiento_Semantico import codificar_textos
+        with cronometro.medir("embeddings"):
+            codificar_textos(textos_semanticos)
+    else:
+        omitidas.append("embeddings")
+
+    conteos = {"proyectos": len(proyectos), "reportes": len(reportes), "pares": pares,
+            "secciones": len(textos_semanticos)}
+    return cronometro.segundos, conteos, omitidas
+
+def ejecutar_benchmark(parametros):
+    corpus = generar_corpus(parametros["proyectos"], parametros["integrantes"], parametros["palabras"],
+                            semilla=parametros["semilla"])
+    app = crear_app(parametros["db"])
+    repeticiones = {etapa: [] for etapa in ETAPAS}
+    with app.app_context():
+        for i in range(parametros["repeticiones"]):
+            segundos, conteos, omitidas = ejecutar_repeticion(corpus, parametros["ngrama"], parametros["motor"],
+                                                            not parametros["sin_embeddings"])
+            for etapa, valor in segundos.items():
+                repeticiones[etapa].append(valor)
+            print(f"Repetición {i + 1}/{parametros['repeticiones']}: "
+                + ", ".join(f"{etapa}={segundos[etapa]:.3f}s" for etapa in ETAPAS if etapa in segundos))
+        db.session.remove()
+        db.metadata.drop_all(bind=db.engine, tables=TABLAS_BENCHMARK)
+
+    etapas = {}
+    for etapa in ETAPAS:
+        if not repeticiones[etapa]:
+            continue
+        mediana = statistics.median(repeticiones[etapa])
+        etapas[etapa] = {"segundos": round(mediana, 4), "repeticiones": [round(v, 4) for v in repeticiones[etapa]]}
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "parametros": {clave: valor for clave, valor in parametros.items() if clave not in ("db", "detallado")},
+        "entorno": {"python": platform.python_version(), "plataforma": platform.platform(),
+                    "base_de_datos": parametros["db"].split(":", 1)[0]},
+        "conteos": conteos,
+        "etapas_omitidas": omitidas,
+        "etapas": etapas,
+        "total_segundos": round(sum(datos["segundos"] for datos in etapas.values()), 4),
+    }
+
+def comparar_con_linea_base(resultado, linea_base, umbral, minimo_segundos=MINIMO_SEGUNDOS_REGRESION):
+    """
+    Compara la mediana de cada etapa con la línea base. Una etapa es una regresión si tarda más
+    de (1 + umbral) veces lo de la línea base y la diferencia supera 'minimo_segundos'.
+    Retorna la lista de comparaciones por etapa.
+    """
+    if linea_base.get("parametros") != resultado["parametros"]:
+        print("Advertencia: La línea base se midió con otros parámetros; la comparación puede no ser válida.")
+    comparaciones = []
+    for etapa in ETAPAS:
+        if etapa not in resultado["etapas"] or etapa not in linea_base.get("etapas", {}):
+            continue
+        actual = resultado["etapas"][etapa]["segundos"]
+        base = linea_base["etapas"][etapa]["segundos"]
+        cambio = (actual - base) / base if base > 0 else 0.0
+        comparaciones.append({
+            "etapa": etapa, "base_segundos": base, "actual_segundos": actual, "cambio": round(cambio, 4),
+            "regresion": cambio > umbral and actual - base > minimo_segundos,
+        })
+    return comparaciones
+
+def guardar_json(datos, ruta):
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, indent=2)
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark del análisis de similitud con un corpus sintético.")
+    parser.add_argument("--proyectos", type=int, default=20, help="Número de proyectos del corpus.")
+    parser.add_argument("--integrantes", type=int, default=4, help="Integrantes (reportes) por proyecto.")
+    parser.add_argument("--palabras", type=int, default=200, help="Palabras por sección.")
+    parser.add_argument("--semilla", type=int, default=1, help="Semilla del generador del corpus.")
+    parser.add_argument("--ngrama", type=int, default=1, help="Orden de n-grama del análisis sintáctico.")
+    parser.add_argument("--motor", default=MOTOR_CONTEO, choices=list(MOTORES), help="Motor de similitud léxica.")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones; se reporta la mediana.")
+    parser.add_argument("--sin-embeddings", action="store_true", help="Omite la etapa de embeddings.")
+    parser.add_argument("--db", default=None,
+                        help="URI de la base desechable (por defecto, un archivo SQLite temporal).")
+    parser.add_argument("--salida", default=None, help="Ruta del JSON de resultados.")
+    parser.add_argument("--linea-base", default=None, help="JSON de una ejecución anterior para comparar.")
+    parser.add_argument("--guardar-linea-base", default=None, help="Guarda el resultado como nueva línea base.")
+    parser.add_argument("--umbral", type=float, default=0.10,
+                        help="Aumento relativo tolerado por etapa antes de considerarlo regresión (0.10 = 10%%).")
+    parser.add_argument("--detallado", action="store_true", help="Muestra el registro de los servicios (nivel DEBUG).")
+    args = parser.parse_args(argumentos)
+    configurar_registro(nivel="DEBUG" if args.detallado else "WARNING")
+
+    uri_bd = args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='benchmark_similitud_'), 'benchmark.db')}"
+    parametros = {
+        "proyectos": args.proyectos, "integrantes": args.integrantes, "palabras": args.palabras,
+        "semilla": args.semilla, "ngrama": args.ngrama, "motor": args.motor,
+        "repeticiones": max(1, args.repeticiones),
+        "sin_embeddings": args.sin_embeddings, "db": uri_bd, "detallado": args.detallado,
+    }
+    print(f"Benchmark: {args.proyectos} proyectos x {args.integrantes} integrantes, {args.palabras} palabras por sección "
+        f"(motor {args.motor}, n-grama {args.ngrama}) en {uri_bd.split(':', 1)[0]}.")
+    resultado = ejecutar_benchmark(parametros)
+
+    print("\nMediana por etapa:")
+    for etapa, datos in resultado["etapas"].items():
+        print(f"  {etapa:<17} {datos['segundos']:>9.4f}s")
+    if resultado["etapas_omitidas"]:
+        print(f"  Etapas omitidas o sustituidas (modelo no disponible): {', '.join(resultado['etapas_omitidas'])}")
+    print(f"  {'total':<17} {resultado['total_segundos']:>9.4f}s  ({resultado['conteos']['pares']} pares)")
+
+    salida = args.salida or os.path.join(DIRECTORIO_RESULTADOS, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    guardar_json(resultado, salida)
+    print(f"\nResultados guardados en {salida}")
+    if args.guardar_linea_base:
+        guardar_json(resultado, args.guardar_linea_base)
+        print(f"Línea base guardada en {args.guardar_linea_base}")
+
+    if args.linea_base:
+        with open(args.linea_base, encoding="utf-8") as archivo:
+            linea_base = json.load(archivo)
+        comparaciones = comparar_con_linea_base(resultado, linea_base, args.umbral)
+        print(f"\nComparación con {args.linea_base} (umbral {args.umbral:.0%}):")
+        for comparacion in comparaciones:
+            marca = "REGRESIÓN" if comparacion["regresion"] else "ok"
+            print(f"  {comparacion['etapa']:<17} {comparacion['base_segundos']:>9.4f}s -> "
+                f"{comparacion['actual_segundos']:>9.4f}s ({comparacion['cambio']:+.1%}) {marca}")
+        if any(comparacion["regresion"] for comparacion in comparaciones):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
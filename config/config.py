@@ -1,3 +1,73 @@
 from flask_sqlalchemy import SQLAlchemy
+import os
+from dotenv import load_dotenv
+
+DIRECTORIO_BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
 
 db = SQLAlchemy()
+
+# --- Ejecución del análisis global ---
+# Procesos trabajadores que reciben proyectos completos (1 = secuencial en el proceso actual)
+ANALISIS_NUM_PROCESOS = int(os.getenv('ANALISIS_NUM_PROCESOS', 1))
+# Filas de 'reportes_finales' que se traen por lote al recorrer los reportes en flujo
+CARGA_REPORTES_TAMANO_LOTE = int(os.getenv('CARGA_REPORTES_TAMANO_LOTE', 1000))
+
+# --- Parámetros del preprocesamiento con spaCy ---
+# Número de procesos y tamaño de lote usados por nlp.pipe
+SPACY_N_PROCESS = int(os.getenv('SPACY_N_PROCESS', 1))
+SPACY_BATCH_SIZE = int(os.getenv('SPACY_BATCH_SIZE', 64))
+# Número de reportes cuyas secciones se envían juntas a nlp.pipe en un análisis global
+SPACY_BLOQUE_REPORTES = int(os.getenv('SPACY_BLOQUE_REPORTES', 1000))
+
+# --- Parámetros del análisis semántico ---
+# Tamaño de lote usado por SentenceTransformer.encode
+SEMANTICO_BATCH_SIZE = int(os.getenv('SEMANTICO_BATCH_SIZE', 32))
+# Almacén persistente de embeddings (float32 o float16)
+EMBEDDINGS_DIRECTORIO = os.getenv('EMBEDDINGS_DIRECTORIO', os.path.join(DIRECTORIO_BASE, 'cache', 'embeddings'))
+EMBEDDINGS_DTYPE = os.getenv('EMBEDDINGS_DTYPE', 'float32')
+
+# --- Trabajos en segundo plano (análisis globales) ---
+# Hilos del grupo que ejecuta los trabajos y número de trabajos terminados que se conservan
+TRABAJOS_MAX_HILOS = int(os.getenv('TRABAJOS_MAX_HILOS', 2))
+TRABAJOS_MAX_HISTORIAL = int(os.getenv('TRABAJOS_MAX_HISTORIAL', 100))
+
+# --- Índice MinHash/LSH para casi duplicados entre proyectos ---
+MINHASH_DIRECTORIO = os.getenv('MINHASH_DIRECTORIO', os.path.join(DIRECTORIO_BASE, 'cache', 'minhash'))
+# Longitud de la firma, número de bandas LSH (debe dividir a la longitud) y lemas por shingle
+MINHASH_PERMUTACIONES = int(os.getenv('MINHASH_PERMUTACIONES', 128))
+MINHASH_BANDAS = int(os.getenv('MINHASH_BANDAS', 32))
+MINHASH_TAMANO_SHINGLE = int(os.getenv('MINHASH_TAMANO_SHINGLE', 3))
+
+# --- Índice de vecinos aproximados (IVF) sobre los embeddings ---
+VECINOS_DIRECTORIO = os.getenv('VECINOS_DIRECTORIO', os.path.join(DIRECTORIO_BASE, 'cache', 'vecinos'))
+# Listas invertidas (0 = raíz cuadrada del número de embeddings) y listas recorridas por consulta
+VECINOS_NUM_LISTAS = int(os.getenv('VECINOS_NUM_LISTAS', 0))
+VECINOS_NUM_SONDEOS = int(os.getenv('VECINOS_NUM_SONDEOS', 8))
+
+# --- Motores de similitud léxica (análisis sintáctico) ---
+# Frecuencias de documento del corpus para TF-IDF y BM25, reutilizadas entre ejecuciones
+LEXICO_DIRECTORIO = os.getenv('LEXICO_DIRECTORIO', os.path.join(DIRECTORIO_BASE, 'cache', 'lexico'))
+# 'corpus' (todos los reportes) o 'tematica' (los proyectos de la misma temática)
+LEXICO_AMBITO_ESTADISTICAS = os.getenv('LEXICO_AMBITO_ESTADISTICAS', 'corpus')
+# Parámetros de BM25: saturación de la frecuencia y normalización por longitud
+BM25_K1 = float(os.getenv('BM25_K1', 1.2))
+BM25_B = float(os.getenv('BM25_B', 0.75))
+
+# --- Flujo SSE del análisis completo ---
+# Segundos mínimos entre dos eventos de progreso enviados al navegador
+SSE_INTERVALO_MINIMO = float(os.getenv('SSE_INTERVALO_MINIMO', 0.5))
+
+# --- Filtro de reportes ---
+# Destino de los reportes sin similitud: 'tabla' (copia con textos en reportes_finales_analisis),
+# 'ids' (solo identificadores en reportes_finales_analisis_ids) o 'vista' (reportes_finales_analisis_vista)
+FILTRO_MODO_DESTINO = os.getenv('FILTRO_MODO_DESTINO', 'tabla').lower()
+
+# --- Registro (logging) ---
+# Nivel general y niveles por módulo, p. ej. "services.Cache_Lemas=WARNING,services.Procesamiento_Similitud=DEBUG"
+LOG_NIVEL = os.getenv('LOG_NIVEL', 'INFO')
+LOG_NIVELES_MODULOS = os.getenv('LOG_NIVELES_MODULOS', '')
+LOG_FORMATO = os.getenv('LOG_FORMATO', '%(asctime)s %(levelname)s [%(processName)s] %(name)s: %(message)s')
+# Traza de cada par comparado (similitudes por sección); muy verbosa, solo para diagnóstico
+LOG_TRAZA_PARES = os.getenv('LOG_TRAZA_PARES', '0').lower() in ('1', 'true', 'si')
@@ -1,9 +1,11 @@
-from app import app
-from config.config import db
-
+# Punto de entrada del servidor de desarrollo. Con el pool 'spawn' de los análisis globales, cada
+# trabajador vuelve a importar este módulo como '__mp_main__': todo queda bajo el guardia para que
+# no importe la aplicación ni abra conexiones (el proceso principal es el único con acceso a la BD).
+if __name__ == '__main__':
+    from app import app
+    from config.config import db
 
-with app.app_context():
-    db.create_all()
+    with app.app_context():
+        db.create_all()
 
-if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
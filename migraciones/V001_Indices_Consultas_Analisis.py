@@ -0,0 +1,27 @@
+from services.Migraciones import crear_indice, crear_clave_unica
+from services.Guardado_Comparaciones import TABLAS_COMPARACION, COLUMNAS_CLAVE
+
+DESCRIPCION = ("Índices compuestos para el listado por temática, la carga y los usuarios marcados; "
+               "clave única por par en las tablas de comparación (elimina duplicados)")
+
+def aplicar(conexion):
+    # Listado por temática: project filtrado por id_thematic
+    crear_indice(conexion, 'project', 'idx_project_tematica', ['id_thematic', 'id'])
+
+    # reportes_finales por proyecto: JOIN del listado, COUNT(DISTINCT user_id) y carga por proyecto
+    crear_indice(conexion, 'reportes_finales', 'idx_reportes_proyecto_usuario', ['project_id', 'user_id'])
+
+    # Clave natural del par: sin ella el guardado por lotes inserta una copia de cada par en cada
+    # análisis. También sirve a los detalles por proyecto. Se omite donde ya existe.
+    for tabla in TABLAS_COMPARACION:
+        crear_clave_unica(conexion, tabla, 'uk_proyecto_usuarios', COLUMNAS_CLAVE)
+
+    # Usuarios con similitud por proyecto (UNION del listado), cubiertos sin leer la fila
+    crear_indice(conexion, 'comparacion_similitud', 'idx_detectada_proyecto_usuario_1',
+                ['similitud_detectada', 'project_id', 'usuario_1_id'])
+    crear_indice(conexion, 'comparacion_similitud', 'idx_detectada_proyecto_usuario_2',
+                ['similitud_detectada', 'project_id', 'usuario_2_id'])
+
+    # Mantenimiento de usuarios_marcados por usuario
+    crear_indice(conexion, 'comparacion_similitud', 'idx_usuario_1_detectada', ['usuario_1_id', 'similitud_detectada'])
+    crear_indice(conexion, 'comparacion_similitud', 'idx_usuario_2_detectada', ['usuario_2_id', 'similitud_detectada'])
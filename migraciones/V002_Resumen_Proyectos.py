@@ -0,0 +1,10 @@
+from models.Resumen_Proyectos import ResumenProyecto
+from services.Migraciones import crear_tabla
+from services.Resumen_Proyectos import llenar_resumen_proyectos
+
+DESCRIPCION = "Tabla resumen_proyectos para el listado por temática, llenada con los proyectos existentes"
+
+def aplicar(conexion):
+    crear_tabla(conexion, ResumenProyecto.__table__)
+    # Después, el guardado de comparaciones la mantiene por proyecto
+    llenar_resumen_proyectos(conexion)
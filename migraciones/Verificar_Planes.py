@@ -0,0 +1,286 @@
+"""
+Verifica con EXPLAIN que las consultas frecuentes del análisis usan índices: crea una base
+desechable (SQLite temporal por defecto), la llena con proyectos, reportes y comparaciones
+sintéticas, aplica las migraciones y termina con código 1 si alguna consulta vuelve a recorrer
+completa una de sus tablas indexables. Las tablas de comparación se crean como en el script
+anterior a las migraciones (sin clave única y con pares repetidos): también se verifica que las
+migraciones eliminen los duplicados y creen la clave única que necesita el guardado por lotes.
+
+Uso (desde la raíz del proyecto):
+    python -m migraciones.Verificar_Planes
+    python -m migraciones.Verificar_Planes --proyectos 1000 --detallado
+    python -m migraciones.Verificar_Planes --sin-migraciones     # muestra los escaneos sin índices
+
+Con '--db' las tablas se eliminan y se vuelven a crear: debe ser una base desechable.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from itertools import combinations
+
+from flask import Flask
+from sqlalchemy import event, insert, text, bindparam, Integer
+
+from config.config import db
+from models.Reportes_Finales import ReportesFinales
+from models.Comparacion_Similitud import ComparacionSimilitud
+from models.Comparacion_Similitud2 import ComparacionSimilitud as ComparacionSimilitudSemantica
+from models.Usuarios_Marcados import UsuarioMarcado
+from models.Resumen_Proyectos import ResumenProyecto
+from services.Carga_Reportes import construir_consulta_reportes
+from services.Migraciones import aplicar_migraciones, clave_unica_existente, TABLA_VERSIONES
+from services.Registro import configurar_registro
+from services.Usuarios_Marcados import SQL_MARCAR, SQL_DESMARCAR
+from services.Resumen_Proyectos import (
+    SQL_INTEGRANTES, SQL_INTEGRANTES_CON_SIMILITUD, SQL_ESTADO_ANALISIS, reconstruir_resumen_proyectos
+)
+from routes.Analisis_Similitud import (
+    SQL_PROYECTOS_TEMATICA, SQL_PROYECTOS_TEMATICA_ANTERIORES, SQL_DETALLES_SINTACTICO, SQL_DETALLES_SEMANTICO
+)
+from benchmarks.Corpus_Sintetico import generar_corpus
+
+TABLAS_MODELOS = [ReportesFinales.__table__, ComparacionSimilitud.__table__,
+                ComparacionSimilitudSemantica.__table__, UsuarioMarcado.__table__, ResumenProyecto.__table__]
+
+# Tablas externas al proyecto que leen las páginas de resultados (solo las columnas usadas)
+DDL_TABLAS_EXTERNAS = [
+    "CREATE TABLE project (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(255) NOT NULL, id_thematic INTEGER NOT NULL)",
+    "CREATE TABLE user (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(255), falastname VARCHAR(255), molastname VARCHAR(255))",
+]
+TABLAS_EXTERNAS = ["project", "user"]
+
+# Tablas de comparación como las creaba el script anterior a las migraciones: solo la clave primaria
+TABLAS_COMPARACION_PREVIAS = [ComparacionSimilitud.__table__, ComparacionSimilitudSemantica.__table__]
+DDL_COMPARACION_PREVIA = """
+    CREATE TABLE {tabla} (
+        id INTEGER NOT NULL {autoincremento},
+        usuario_1_id INTEGER NOT NULL,
+        usuario_2_id INTEGER NOT NULL,
+        project_id INTEGER NOT NULL,
+        introduccion FLOAT, marcoteorico FLOAT, metodo FLOAT, resultados FLOAT, discusion FLOAT, conclusiones FLOAT,
+        secciones_similares INTEGER,
+        similitud_detectada INTEGER,
+        status_analisis INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id)
+    )
+"""
+COLUMNAS_PAR = ['project_id', 'usuario_1_id', 'usuario_2_id']
+
+# Fracción de pares que se insertan dos veces, como los dejaba el guardado sin clave única
+FRACCION_PARES_REPETIDOS = 0.1
+
+# Escaneo completo en EXPLAIN QUERY PLAN de SQLite: "SCAN rf" o "SCAN TABLE reportes_finales AS rf",
+# sin "USING ... INDEX"
+PATRON_ESCANEO_SQLITE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$")
+
+def consultas_criticas():
+    """
+    Consultas frecuentes con sus parámetros y los alias de tabla que no deben recorrerse completos.
+    Se usan las mismas sentencias que las rutas y los servicios.
+    """
+    ids = bindparam("ids", value=[1, 2, 3], type_=Integer, expanding=True)
+    return [
+        {"nombre": "listado_siguientes", "consulta": SQL_PROYECTOS_TEMATICA,
+        "parametros": {"tematica_id": 1, "despues": 100, "limit": 11}, "alias": {"rp", "p"}},
+        {"nombre": "listado_anteriores", "consulta": SQL_PROYECTOS_TEMATICA_ANTERIORES,
+        "parametros": {"tematica_id": 1, "antes": 100, "limit": 11}, "alias": {"rp", "p"}},
+        {"nombre": "resumen_integrantes", "consulta": text(SQL_INTEGRANTES).bindparams(ids),
+        "parametros": {}, "alias": {"reportes_finales"}},
+        {"nombre": "resumen_similitud", "consulta": text(SQL_INTEGRANTES_CON_SIMILITUD).bindparams(ids),
+        "parametros": {}, "alias": {"comparacion_similitud"}},
+        {"nombre": "resumen_estado", "consulta": text(SQL_ESTADO_ANALISIS).bindparams(ids),
+        "parametros": {}, "alias": {"comparacion_similitud"}},
+        {"nombre": "detalles_sintactico", "consulta": SQL_DETALLES_SINTACTICO,
+        "parametros": {"proyecto_id": 1}, "alias": {"cs1"}},
+        {"nombre": "detalles_semantico", "consulta": SQL_DETALLES_SEMANTICO,
+        "parametros": {"proyecto_id": 1}, "alias": {"cs", "u1", "u2"}},
+        {"nombre": "carga_por_proyecto", "consulta": construir_consulta_reportes(project_ids=[1, 2]),
+        "parametros": {}, "alias": {"reportes_finales"}},
+        {"nombre": "marcar_usuarios",
+        "consulta": text(SQL_MARCAR.format(filtro_1="AND usuario_1_id IN :ids", filtro_2="AND usuario_2_id IN :ids"))
+            .bindparams(ids),
+        "parametros": {"ahora": "2000-01-01 00:00:00"}, "alias": {"comparacion_similitud", "um"}},
+        {"nombre": "desmarcar_usuarios",
+        "consulta": text(SQL_DESMARCAR.format(filtro="AND usuarios_marcados.user_id IN :ids")).bindparams(ids),
+        "parametros": {}, "alias": {"cs", "usuarios_marcados"}},
+    ]
+
+def crear_app(uri_bd):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri_bd
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+def registrar_concat_sqlite(motor):
+    """SQLite anterior a 3.44 no tiene CONCAT, que usan las consultas de detalles (escritas para MySQL)."""
+    if motor.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(motor, "connect")
+    def _registrar(conexion_dbapi, _):
+        conexion_dbapi.create_function("CONCAT", -1, lambda *partes: "".join("" if p is None else str(p) for p in partes))
+    motor.dispose()
+
+def preparar_base(num_proyectos, integrantes, semilla):
+    """
+    Recrea las tablas y las llena con datos sintéticos (sin textos largos). Las tablas de
+    comparación se crean con el DDL previo a las migraciones e incluyen pares repetidos.
+    """
+    with db.engine.begin() as conexion:
+        for tabla in TABLAS_EXTERNAS + [TABLA_VERSIONES]:
+            conexion.execute(text(f"DROP TABLE IF EXISTS {tabla}"))
+    db.metadata.drop_all(bind=db.engine, tables=TABLAS_MODELOS)
+    db.metadata.create_all(bind=db.engine, tables=[tabla for tabla in TABLAS_MODELOS
+                                                    if tabla not in TABLAS_COMPARACION_PREVIAS])
+    autoincremento = "PRIMARY KEY AUTOINCREMENT" if db.engine.dialect.name == "sqlite" else "AUTO_INCREMENT"
+    with db.engine.begin() as conexion:
+        for tabla in TABLAS_COMPARACION_PREVIAS:
+            ddl = DDL_COMPARACION_PREVIA.format(tabla=tabla.name, autoincremento=autoincremento)
+            if db.engine.dialect.name == "sqlite":
+                ddl = ddl.replace(",\n        PRIMARY KEY (id)", "")
+            conexion.execute(text(ddl))
+
+    rng = random.Random(semilla)
+    corpus = generar_corpus(num_proyectos, integrantes, palabras_por_seccion=3, semilla=semilla)
+    proyectos = [{"id": project_id, "name": f"Proyecto {project_id}", "id_thematic": (project_id - 1) % 5 + 1}
+                for project_id in range(1, num_proyectos + 1)]
+    usuarios = [{"id": fila["user_id"], "name": f"Usuario {fila['user_id']}", "falastname": "A", "molastname": "B"}
+                for fila in corpus]
+    integrantes_por_proyecto = {}
+    for fila in corpus:
+        integrantes_por_proyecto.setdefault(fila["project_id"], []).append(fila["user_id"])
+    comparaciones = []
+    for project_id, miembros in integrantes_por_proyecto.items():
+        for usuario_1_id, usuario_2_id in combinations(sorted(miembros), 2):
+            detectada = 1 if rng.random() < 0.2 else 0
+            comparaciones.append({"usuario_1_id": usuario_1_id, "usuario_2_id": usuario_2_id, "project_id": project_id,
+                                "secciones_similares": detectada, "similitud_detectada": detectada,
+                                "status_analisis": 1})
+    comparaciones += [dict(fila) for fila in comparaciones if rng.random() < FRACCION_PARES_REPETIDOS]
+
+    with db.engine.begin() as conexion:
+        for ddl in DDL_TABLAS_EXTERNAS:
+            conexion.execute(text(ddl))
+        conexion.execute(text("INSERT INTO project (id, name, id_thematic) VALUES (:id, :name, :id_thematic)"), proyectos)
+        conexion.execute(text("INSERT INTO user (id, name, falastname, molastname) "
+                            "VALUES (:id, :name, :falastname, :molastname)"), usuarios)
+        conexion.execute(insert(ReportesFinales.__table__), corpus)
+        conexion.execute(insert(ComparacionSimilitud.__table__), comparaciones)
+        conexion.execute(insert(ComparacionSimilitudSemantica.__table__), comparaciones)
+        marcados = {fila[columna] for fila in comparaciones if fila["similitud_detectada"]
+                    for columna in ("usuario_1_id", "usuario_2_id")}
+        if marcados:
+            conexion.execute(insert(UsuarioMarcado.__table__), [{"user_id": user_id} for user_id in sorted(marcados)])
+
+def actualizar_estadisticas():
+    """Estadísticas del optimizador, para que el plan corresponda a una base con datos."""
+    with db.engine.begin() as conexion:
+        if db.engine.dialect.name == "sqlite":
+            conexion.execute(text("ANALYZE"))
+        else:
+            tablas = TABLAS_EXTERNAS + [tabla.name for tabla in TABLAS_MODELOS]
+            conexion.execute(text(f"ANALYZE TABLE {', '.join(tablas)}"))
+
+def explicar(conexion, consulta, parametros):
+    """
+    Plan de la consulta como lista de (alias, descripcion, escaneo_completo).
+    SQLite: EXPLAIN QUERY PLAN; MySQL: EXPLAIN, con type = 'ALL' como escaneo completo.
+    """
+    if parametros:
+        # Con valor, cada parámetro toma el tipo del valor y se puede escribir como literal
+        consulta = consulta.bindparams(*[bindparam(nombre, value=valor) for nombre, valor in parametros.items()])
+    sql = str(consulta.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+    if db.engine.dialect.name == "sqlite":
+        plan = []
+        for fila in conexion.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"):
+            detalle = fila[3]
+            coincidencia = PATRON_ESCANEO_SQLITE.match(detalle)
+            alias = (coincidencia.group(2) or coincidencia.group(1)) if coincidencia else None
+            plan.append((alias, detalle, coincidencia is not None))
+        return plan
+    plan = []
+    for fila in conexion.exec_driver_sql(f"EXPLAIN {sql}"):
+        datos = fila._mapping
+        plan.append((datos["table"], f"{datos['table']}: type={datos['type']} key={datos['key']} rows={datos['rows']}",
+                    datos["type"] == "ALL"))
+    return plan
+
+def verificar_claves_unicas():
+    """Retorna la lista de tablas de comparación sin clave única por par o con pares repetidos."""
+    fallas = []
+    with db.engine.connect() as conexion:
+        for tabla in TABLAS_COMPARACION_PREVIAS:
+            clave = clave_unica_existente(conexion, tabla.name, COLUMNAS_PAR)
+            repetidos = conexion.execute(text(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {tabla.name} GROUP BY {', '.join(COLUMNAS_PAR)} "
+                f"HAVING COUNT(*) > 1) pares")).scalar()
+            problemas = ([] if clave else ["SIN CLAVE ÚNICA"]) + ([f"{repetidos} PARES REPETIDOS"] if repetidos else [])
+            print(f"  {tabla.name:<22} {', '.join(problemas) if problemas else 'ok (' + clave + ')'}")
+            if problemas:
+                fallas.append(tabla.name)
+    return fallas
+
+def verificar_planes(detallado=False):
+    """Retorna la lista de (consulta, alias) que recorren completa una tabla que debería usar índice."""
+    fallas = []
+    with db.engine.connect() as conexion:
+        for critica in consultas_criticas():
+            plan = explicar(conexion, critica["consulta"], critica["parametros"])
+            escaneos = [alias for alias, _, completo in plan if completo and alias in critica["alias"]]
+            print(f"  {critica['nombre']:<22} {'ESCANEO COMPLETO: ' + ', '.join(escaneos) if escaneos else 'ok'}")
+            if detallado or escaneos:
+                for _, detalle, _ in plan:
+                    print(f"      {detalle}")
+            fallas.extend((critica["nombre"], alias) for alias in escaneos)
+    return fallas
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Verifica con EXPLAIN que las consultas del análisis usan índices.")
+    parser.add_argument("--proyectos", type=int, default=500, help="Proyectos de la base sintética.")
+    parser.add_argument("--integrantes", type=int, default=4, help="Integrantes (reportes) por proyecto.")
+    parser.add_argument("--semilla", type=int, default=1, help="Semilla de los datos sintéticos.")
+    parser.add_argument("--db", default=None,
+                        help="URI de la base desechable (por defecto, un archivo SQLite temporal).")
+    parser.add_argument("--sin-migraciones", action="store_true", help="No aplica las migraciones antes de verificar.")
+    parser.add_argument("--detallado", action="store_true", help="Muestra el plan completo de cada consulta.")
+    args = parser.parse_args(argumentos)
+    configurar_registro(nivel="INFO" if args.detallado else "WARNING")
+
+    uri_bd = args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='verificar_planes_'), 'planes.db')}"
+    app = crear_app(uri_bd)
+    with app.app_context():
+        registrar_concat_sqlite(db.engine)
+        preparar_base(args.proyectos, args.integrantes, args.semilla)
+        if not args.sin_migraciones:
+            # V002 llena resumen_proyectos
+            resultado = aplicar_migraciones()
+            if resultado["estado"] != "completado":
+                print(resultado["mensaje"])
+                return 1
+        else:
+            reconstruir_resumen_proyectos()
+        actualizar_estadisticas()
+
+        print(f"Planes de consulta ({args.proyectos} proyectos x {args.integrantes} integrantes, "
+            f"{uri_bd.split(':', 1)[0]}):")
+        fallas = verificar_planes(args.detallado)
+        print("Claves únicas de las tablas de comparación:")
+        fallas_claves = verificar_claves_unicas()
+
+    if fallas:
+        print(f"\n{len(fallas)} escaneos completos de tablas indexables; revisar los índices de migraciones/.")
+    if fallas_claves:
+        print(f"\n{len(fallas_claves)} tablas de comparación sin clave única por par; revisar migraciones/.")
+    if fallas or fallas_claves:
+        return 1
+    print("\nTodas las consultas usan índices y las tablas de comparación tienen su clave única.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
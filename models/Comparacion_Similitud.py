@@ -20,6 +20,11 @@ class ComparacionSimilitud(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Clave natural del par analizado, usada por INSERT ... ON DUPLICATE KEY UPDATE
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'usuario_1_id', 'usuario_2_id', name='uk_proyecto_usuarios'),
+    )
+
     def __init__(self, usuario_1_id, usuario_2_id, project_id, 
                 introduccion=0.0, marcoteorico=0.0, metodo=0.0, 
                 resultados=0.0, discusion=0.0, conclusiones=0.0,
@@ -0,0 +1,39 @@
+from config.config import db
+from datetime import datetime
+from sqlalchemy.orm import declared_attr
+
+class ColumnasComparacionTM:
+    """Columnas comunes a las tablas comparacion_tm_* (una por orden de n-grama)."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    usuario_1_id = db.Column(db.Integer, nullable=False)
+    usuario_2_id = db.Column(db.Integer, nullable=False)
+    project_id = db.Column(db.Integer, nullable=False)
+    introduccion = db.Column(db.Float, default=0.0)
+    marcoteorico = db.Column(db.Float, default=0.0)
+    metodo = db.Column(db.Float, default=0.0)
+    resultados = db.Column(db.Float, default=0.0)
+    discusion = db.Column(db.Float, default=0.0)
+    conclusiones = db.Column(db.Float, default=0.0)
+    secciones_similares = db.Column(db.Integer, default=0)
+    similitud_detectada = db.Column(db.Integer, default=0) # 0 o 1
+    status_analisis = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Clave natural del par analizado, usada por INSERT ... ON DUPLICATE KEY UPDATE
+    # (declared_attr: cada tabla necesita su propia instancia de la restricción)
+    @declared_attr
+    def __table_args__(cls):
+        return (db.UniqueConstraint('project_id', 'usuario_1_id', 'usuario_2_id', name='uk_proyecto_usuarios'),)
+
+class ComparacionTM(ColumnasComparacionTM, db.Model):
+    __tablename__ = 'comparacion_tm'
+
+class ComparacionTMBigrama(ColumnasComparacionTM, db.Model):
+    __tablename__ = 'comparacion_tm_bigrama'
+
+class ComparacionTMTrigrama(ColumnasComparacionTM, db.Model):
+    __tablename__ = 'comparacion_tm_trigrama'
+
+class ComparacionTM4grama(ColumnasComparacionTM, db.Model):
+    __tablename__ = 'comparacion_tm_4grama'
@@ -0,0 +1,26 @@
+from config.config import db
+from datetime import datetime
+
+class HuellaAnalisis(db.Model):
+    __tablename__ = 'analisis_huellas'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tipo_analisis = db.Column(db.String(20), nullable=False) # 'sintactico' o 'semantico'
+    ngrama = db.Column(db.Integer, nullable=False, default=0) # 0 para el análisis semántico
+    project_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    reporte_id = db.Column(db.Integer, nullable=False)
+    huella = db.Column(db.String(64), nullable=False) # sha256 de los hashes de las secciones
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('tipo_analisis', 'ngrama', 'project_id', 'user_id', name='uk_huella_integrante'),
+    )
+
+    def __init__(self, tipo_analisis, ngrama, project_id, user_id, reporte_id, huella):
+        self.tipo_analisis = tipo_analisis
+        self.ngrama = ngrama
+        self.project_id = project_id
+        self.user_id = user_id
+        self.reporte_id = reporte_id
+        self.huella = huella
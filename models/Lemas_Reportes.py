@@ -0,0 +1,23 @@
+from config.config import db
+from datetime import datetime
+
+class LemasReporte(db.Model):
+    __tablename__ = 'reportes_lemas_cache'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    reporte_id = db.Column(db.Integer, nullable=False) # reportes_finales.id
+    seccion = db.Column(db.String(50), nullable=False)
+    texto_hash = db.Column(db.String(64), nullable=False) # sha256 del texto crudo
+    lemas = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('reporte_id', 'seccion', name='uk_reporte_seccion'),
+    )
+
+    def __init__(self, reporte_id, seccion, texto_hash, lemas):
+        self.reporte_id = reporte_id
+        self.seccion = seccion
+        self.texto_hash = texto_hash
+        self.lemas = lemas
@@ -0,0 +1,25 @@
+from config.config import db
+from datetime import datetime
+
+class ResumenProyecto(db.Model):
+    __tablename__ = 'resumen_proyectos'
+
+    # Una fila por proyecto con reportes; se actualiza al guardar en 'comparacion_similitud'
+    project_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    id_thematic = db.Column(db.Integer, nullable=False)
+    num_integrantes = db.Column(db.Integer, nullable=False, default=0)
+    integrantes_con_similitud = db.Column(db.Integer, nullable=False, default=0)
+    analizado = db.Column(db.Integer, nullable=False, default=0) # 1 si todas sus comparaciones están analizadas
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Listado por temática con paginación por clave (id_thematic, project_id > último visto)
+    __table_args__ = (
+        db.Index('idx_resumen_tematica_proyecto', 'id_thematic', 'project_id'),
+    )
+
+    def __init__(self, project_id, id_thematic, num_integrantes=0, integrantes_con_similitud=0, analizado=0):
+        self.project_id = project_id
+        self.id_thematic = id_thematic
+        self.num_integrantes = num_integrantes
+        self.integrantes_con_similitud = integrantes_con_similitud
+        self.analizado = analizado
@@ -0,0 +1,12 @@
+from config.config import db
+from datetime import datetime
+
+class UsuarioMarcado(db.Model):
+    __tablename__ = 'usuarios_marcados'
+
+    # Usuarios con al menos una comparación con similitud detectada en 'comparacion_similitud'
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, user_id):
+        self.user_id = user_id
@@ -39,4 +39,18 @@ class ReportesFinalesAnalisis(db.Model):
         if nombre_reporte: # Solo asignar si se provee
             self.nombre_reporte = nombre_reporte
         if status is not None:
-            self.status = status
\ No newline at end of file
+            self.status = status
+
+class ReporteAnalisisId(db.Model):
+    __tablename__ = 'reportes_finales_analisis_ids'
+
+    # Destino del filtro en modo 'ids': solo la referencia al reporte, sin copiar sus textos
+    reporte_id = db.Column(db.Integer, primary_key=True, autoincrement=False) # reportes_finales.id
+    user_id = db.Column(db.Integer, nullable=False)
+    project_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, reporte_id, user_id, project_id):
+        self.reporte_id = reporte_id
+        self.user_id = user_id
+        self.project_id = project_id
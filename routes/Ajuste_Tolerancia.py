@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, request, url_for, flash, jsonify 
+from flask import Blueprint, render_template, request, url_for, flash, jsonify, current_app
 from config.config import db
 from models.Tolerancia_Porcentajes import ToleranciasPorcentajes
+from services.Recalculo_Umbrales import recalcular_umbrales
 
 tolerancia = Blueprint('tolerancia', __name__)
 
@@ -63,11 +64,15 @@ def update_tolerancia():
             seccion_obj.tolerancia = tolerancia_float
             db.session.commit()
 
+            # Las banderas de las comparaciones guardadas se recalculan con el nuevo umbral
+            recalculo = recalcular_umbrales()
+
             return jsonify({
                 'status': 'success', 
                 'message': 'Sección actualizada correctamente.',
                 'seccion_id': seccion_obj.id,
-                'nueva_tolerancia': seccion_obj.tolerancia
+                'nueva_tolerancia': seccion_obj.tolerancia,
+                'recalculo_umbrales': recalculo
             })
 
         except ValueError: # Error al convertir a float
@@ -79,3 +84,11 @@ def update_tolerancia():
             return jsonify({'status': 'error', 'message': f'Error al actualizar: {str(e)}'}), 500
     
     return jsonify({'status': 'error', 'message': 'Método no permitido.'}), 405
+
+@tolerancia.route('/ajuste-tolerancia/recalcular', methods=['POST'])
+def recalcular_umbrales_route():
+    """Vuelve a aplicar las tolerancias actuales a todas las comparaciones guardadas."""
+    resultado = recalcular_umbrales()
+    if resultado.get("estado") == "error":
+        return jsonify(resultado), 500
+    return jsonify(resultado), 200
@@ -13,15 +13,86 @@ from services.Procesamiento_Similitud import (
 from services.Procesamiento_Semantico import ( # Importar el nuevo servicio SEMÁNTICO
     analizar_todos_los_proyectos_semantico_service,
     analizar_proyecto_semantico as analizar_proyecto_semantico_individual_service,
-    obtener_tolerancias_semantico
+    obtener_tolerancias_semantico,
+    buscar_secciones_similares
 )
 from services.Procesamiento_Completo import realizar_analisis_completo_sse
 from sqlalchemy import text
-import math
 from services.Procesamiento_Filtro import filtrar_y_guardar_reportes_service
+from services.Trabajos import encolar_trabajo, TrabajoDuplicadoError
+from services.Modelos_NLP import precargar_modelos, modelos_cargados
+from services.Duplicados_Proyectos import detectar_duplicados_entre_proyectos
+from services.Motores_Lexicos import MOTORES, MOTOR_CONTEO
 
 analisis = Blueprint('analisis', __name__)
 
+# Consultas de las páginas de resultados (también las revisa migraciones/Verificar_Planes.py)
+# Página del listado de proyectos por temática desde 'resumen_proyectos', paginada por clave:
+# los proyectos después del último id mostrado (o antes del primero, para la página anterior)
+SQL_PROYECTOS_TEMATICA = text("""
+    SELECT
+        rp.project_id AS id,
+        p.name AS nombre_proyecto,
+        rp.num_integrantes,
+        rp.integrantes_con_similitud,
+        CASE WHEN rp.analizado = 1 THEN '✅' ELSE '❌' END AS analizado
+    FROM resumen_proyectos rp
+    JOIN project p ON p.id = rp.project_id
+    WHERE rp.id_thematic = :tematica_id
+      AND rp.project_id > :despues
+    ORDER BY rp.project_id
+    LIMIT :limit
+""")
+
+SQL_PROYECTOS_TEMATICA_ANTERIORES = text("""
+    SELECT
+        rp.project_id AS id,
+        p.name AS nombre_proyecto,
+        rp.num_integrantes,
+        rp.integrantes_con_similitud,
+        CASE WHEN rp.analizado = 1 THEN '✅' ELSE '❌' END AS analizado
+    FROM resumen_proyectos rp
+    JOIN project p ON p.id = rp.project_id
+    WHERE rp.id_thematic = :tematica_id
+      AND rp.project_id < :antes
+    ORDER BY rp.project_id DESC
+    LIMIT :limit
+""")
+
+# Comparaciones sintácticas de un proyecto
+SQL_DETALLES_SINTACTICO = text("""
+    SELECT
+        CONCAT(cs1.usuario_1_id, ' vs ', cs1.usuario_2_id) AS usuarios_analizados,
+        cs1.introduccion,
+        cs1.marcoteorico,
+        cs1.metodo,
+        cs1.resultados,
+        cs1.discusion,
+        cs1.conclusiones,
+        cs1.secciones_similares,
+        cs1.status_analisis
+    FROM comparacion_similitud cs1
+    WHERE cs1.project_id = :proyecto_id
+    ORDER BY cs1.id
+""")
+
+# Comparaciones semánticas de un proyecto con los nombres de los integrantes
+SQL_DETALLES_SEMANTICO = text("""
+    SELECT
+        CONCAT(u1.name, ' ', u1.falastname, ' ', u1.molastname,
+                ' (ID: ', u1.id, ')',
+                '\nvs\n',
+                u2.name, ' ', u2.falastname, ' ', u2.molastname,
+                ' (ID: ', u2.id, ')') AS usuarios_analizados,
+        cs.introduccion, cs.marcoteorico, cs.metodo, cs.resultados,
+        cs.discusion, cs.conclusiones, cs.secciones_similares, cs.status_analisis
+    FROM comparacion_similitud2 cs
+    JOIN user u1 ON cs.usuario_1_id = u1.id
+    JOIN user u2 ON cs.usuario_2_id = u2.id
+    WHERE cs.project_id = :proyecto_id
+    ORDER BY cs.id
+""")
+
 @analisis.route('/')
 def index():
     # Redirigir a la vista principal de análisis de similitud o cargarla directamente
@@ -34,103 +105,47 @@ def mostrar_tematicas_base():
                         tematicas=tematicas_activas, 
                         tematica_actual=None, 
                         proyectos=None,
-                        total_paginas=0,
-                        pagina_actual=1)
+                        hay_anterior=False,
+                        hay_siguiente=False)
 
 @analisis.route('/analisis-similitud/<int:tematica_id>')
 def mostrar_proyectos_por_tematica(tematica_id):
     # Obtenemos las temáticas para el menú
     tematicas = Tematicas.query.filter_by(status=1).all()
-    
-    # Parámetros de paginación
-    pagina = request.args.get('pagina', 1, type=int)
+
+    # Paginación por clave: ?despues=<último id de la página> o ?antes=<primer id de la página>
+    despues = request.args.get('despues', 0, type=int)
+    antes = request.args.get('antes', None, type=int)
     registros_por_pagina = 10
-    
-    # Corregimos la consulta de conteo para reflejar la agrupación correcta
-    count_query = text("""
-        SELECT COUNT(*) as total
-        FROM (
-            SELECT p.id
-            FROM project p
-            JOIN reportes_finales rf ON rf.project_id = p.id
-            WHERE p.id_thematic = :tematica_id
-            GROUP BY p.id, p.name
-        ) as proyecto_count
-    """)
-    
-    result = db.session.execute(count_query, {"tematica_id": tematica_id}).fetchone()
-    total_registros = result[0] if result else 0
-    total_paginas = math.ceil(total_registros / registros_por_pagina)
-    
-    # Si la página solicitada es mayor que el total de páginas, redireccionamos a la última página
-    if pagina > total_paginas and total_paginas > 0:
-        return redirect(f'/analisis-similitud/{tematica_id}?pagina={total_paginas}')
-    
-    # Calculamos el offset para la paginación
-    offset = (pagina - 1) * registros_por_pagina
-    
-    # Consulta paginada
-    sql_query = text("""
-        SELECT
-            p.id,
-            p.name AS nombre_proyecto,
-            COUNT(DISTINCT rf.user_id) AS num_integrantes,
-            
-            -- Se usa COALESCE para mostrar 0 si un proyecto no tiene similitudes
-            COALESCE(sc.count_integrantes_con_similitud, 0) AS integrantes_con_similitud,
-            
-            -- Se mantiene la lógica del CASE, que ahora opera sobre el LEFT JOIN principal
-            CASE
-                WHEN COUNT(cs.id) = 0 THEN '❌' -- No hay análisis si no hay registros en comparacion_similitud
-                WHEN MIN(cs.status_analisis) = 0 THEN '❌' -- Algún análisis está pendiente
-                ELSE '✅' -- Todos los análisis están completos
-            END AS analizado
-            
-        FROM project p
-        JOIN reportes_finales rf ON rf.project_id = p.id
-        LEFT JOIN comparacion_similitud cs ON cs.project_id = p.id
-        
-        -- Subconsulta en el FROM (tabla derivada) para precalcular los conteos de similitud
-        LEFT JOIN (
-            SELECT
-                project_id,
-                COUNT(DISTINCT user_id_similitud) AS count_integrantes_con_similitud
-            FROM (
-                SELECT project_id, usuario_1_id AS user_id_similitud
-                FROM comparacion_similitud
-                WHERE similitud_detectada = 1
-                
-                UNION -- UNION ya obtiene valores únicos de (project_id, user_id_similitud)
-                
-                SELECT project_id, usuario_2_id AS user_id_similitud
-                FROM comparacion_similitud
-                WHERE similitud_detectada = 1
-            ) AS all_users_with_similarity
-            GROUP BY project_id
-        ) AS sc ON sc.project_id = p.id
 
-        WHERE p.id_thematic = :tematica_id
-        -- Agrupar por todas las columnas no agregadas del SELECT principal
-        GROUP BY p.id, p.name, sc.count_integrantes_con_similitud
-        ORDER BY p.id -- Añadir un ORDER BY para resultados consistentes en la paginación
-        LIMIT :limit OFFSET :offset
-    """)
-    
-    proyectos = db.session.execute(
-        sql_query, 
-        {
-            "tematica_id": tematica_id,
-            "limit": registros_por_pagina,
-            "offset": offset
-        }
-    ).fetchall()
-    
-    return render_template('AnalisisSimilitud.html', 
-                            tematicas=tematicas, 
+    # Se pide un registro de más para saber si hay otra página en esa dirección
+    if antes is not None:
+        proyectos = db.session.execute(
+            SQL_PROYECTOS_TEMATICA_ANTERIORES,
+            {"tematica_id": tematica_id, "antes": antes, "limit": registros_por_pagina + 1}
+        ).fetchall()
+        hay_anterior = len(proyectos) > registros_por_pagina
+        proyectos = list(reversed(proyectos[:registros_por_pagina]))
+        hay_siguiente = True
+        if not proyectos:
+            return redirect(url_for('analisis.mostrar_proyectos_por_tematica', tematica_id=tematica_id))
+    else:
+        proyectos = db.session.execute(
+            SQL_PROYECTOS_TEMATICA,
+            {"tematica_id": tematica_id, "despues": despues, "limit": registros_por_pagina + 1}
+        ).fetchall()
+        hay_siguiente = len(proyectos) > registros_por_pagina
+        proyectos = proyectos[:registros_por_pagina]
+        hay_anterior = despues > 0
+        if not proyectos and despues > 0:
+            return redirect(url_for('analisis.mostrar_proyectos_por_tematica', tematica_id=tematica_id))
+
+    return render_template('AnalisisSimilitud.html',
+                            tematicas=tematicas,
                             proyectos=proyectos,
                             tematica_actual=tematica_id,
-                            pagina_actual=pagina,
-                            total_paginas=total_paginas)
+                            hay_anterior=hay_anterior,
+                            hay_siguiente=hay_siguiente)
 
 @analisis.route('/proyecto/<int:proyecto_id>/analisis')
 def mostrar_detalles_proyecto(proyecto_id):
@@ -142,27 +157,8 @@ def mostrar_detalles_proyecto(proyecto_id):
         flash(f"Proyecto con ID {proyecto_id} no encontrado.", "warning")
         return redirect('/analisis-similitud-base') # Redirigir a la página base
     
-    # --- CONSULTA CORREGIDA ---
-    # Se ha simplificado para seleccionar solo de 'comparacion_similitud'
-    # y se han eliminado los alias para que los nombres de columna coincidan con la plantilla.
-    sql_detalles = text("""
-    SELECT
-        CONCAT(cs1.usuario_1_id, ' vs ', cs1.usuario_2_id) AS usuarios_analizados,
-        cs1.introduccion,
-        cs1.marcoteorico,
-        cs1.metodo,
-        cs1.resultados,
-        cs1.discusion,
-        cs1.conclusiones,
-        cs1.secciones_similares,
-        cs1.status_analisis
-    FROM comparacion_similitud cs1
-    WHERE cs1.project_id = :proyecto_id
-    ORDER BY cs1.id
-""")
-
-    
-    detalles = db.session.execute(sql_detalles, {"proyecto_id": proyecto_id}).fetchall()
+    # Solo 'comparacion_similitud', sin alias en las columnas para que coincidan con la plantilla
+    detalles = db.session.execute(SQL_DETALLES_SINTACTICO, {"proyecto_id": proyecto_id}).fetchall()
     
     # Crear un diccionario con las tolerancias por sección
     tolerancias = {}
@@ -188,23 +184,8 @@ def mostrar_detalles_proyecto_semantico(proyecto_id):
         flash(f"Proyecto con ID {proyecto_id} no encontrado.", "warning")
         return redirect(url_for('analisis.mostrar_tematicas_base'))
         
-    # Asumiendo que 'comparacion_similitud2' es tu tabla para análisis semántico
-    sql_detalles_semantico = text("""
-        SELECT
-            CONCAT(u1.name, ' ', u1.falastname, ' ', u1.molastname,
-                    ' (ID: ', u1.id, ')',
-                    '\nvs\n',
-                    u2.name, ' ', u2.falastname, ' ', u2.molastname,
-                    ' (ID: ', u2.id, ')') AS usuarios_analizados,
-            cs.introduccion, cs.marcoteorico, cs.metodo, cs.resultados,
-            cs.discusion, cs.conclusiones, cs.secciones_similares, cs.status_analisis
-        FROM comparacion_similitud2 cs 
-        JOIN user u1 ON cs.usuario_1_id = u1.id
-        JOIN user u2 ON cs.usuario_2_id = u2.id
-        WHERE cs.project_id = :proyecto_id
-        ORDER BY cs.id
-    """)
-    detalles = db.session.execute(sql_detalles_semantico, {"proyecto_id": proyecto_id}).fetchall()
+    # 'comparacion_similitud2' es la tabla del análisis semántico
+    detalles = db.session.execute(SQL_DETALLES_SEMANTICO, {"proyecto_id": proyecto_id}).fetchall()
     tolerancias_db = ToleranciasPorcentajes.query.all()
     tolerancias_dict = {t.seccion.strip().lower(): t.tolerancia for t in tolerancias_db}
 
@@ -220,37 +201,90 @@ def mostrar_detalles_proyecto_semantico(proyecto_id):
 def iniciar_analisis_global_sintactico_route():
     """
     Ruta para iniciar el análisis de similitud para todos los proyectos.
+    El análisis se encola como trabajo en segundo plano; su estado se consulta en /jobs/<id>.
     """
     current_app.logger.info("Solicitud POST recibida en /iniciar-analisis-global")
-    try:
-        # En producción, considera tareas en segundo plano (Celery, RQ) para no bloquear.
-        resultado_analisis = analizar_todos_los_proyectos_service()
-        current_app.logger.info(f"Resultado del análisis global: {resultado_analisis}")
-        
-        if resultado_analisis.get("estado") == "error":
-            return jsonify(resultado_analisis), 500 
-        return jsonify(resultado_analisis), 200
-        
-    except Exception as e:
-        current_app.logger.error(f"Excepción no controlada en iniciar_analisis_global_route: {str(e)}", exc_info=True)
-        return jsonify({"estado": "error", "mensaje": "Error inesperado en el servidor al procesar la solicitud."}), 500
+    # ?incremental=1 solo reanaliza proyectos cuyos integrantes o textos cambiaron
+    incremental = request.args.get('incremental', default=0, type=int) == 1
+    # ?motor=conteo|tfidf|bm25 elige la ponderación léxica
+    motor = request.args.get('motor', default=MOTOR_CONTEO)
+    if motor not in MOTORES:
+        return jsonify({"estado": "error", "mensaje": f"Motor léxico desconocido '{motor}'. Opciones: {', '.join(MOTORES)}."}), 400
+    # ?multingrama=1 calcula los n-gramas 1 a 4 en una sola pasada y llena las tablas comparacion_tm*
+    if request.args.get('multingrama', default=0, type=int) == 1:
+        return encolar_analisis_global("sintactico_multingrama", analizar_todos_los_proyectos_service,
+                                    incremental=incremental, multingrama=True, motor=motor)
+    return encolar_analisis_global("sintactico", analizar_todos_los_proyectos_service, incremental=incremental,
+                                motor=motor)
     
 @analisis.route('/iniciar-analisis-global-semantico', methods=['POST'])
 def iniciar_analisis_global_semantico_route():
     current_app.logger.info("Solicitud POST recibida en /iniciar-analisis-global-semantico")
+    incremental = request.args.get('incremental', default=0, type=int) == 1
+    return encolar_analisis_global("semantico", analizar_todos_los_proyectos_semantico_service, incremental=incremental)
+
+@analisis.route('/vecinos-semanticos/<int:reporte_id>/<seccion>')
+def vecinos_semanticos_route(reporte_id, seccion):
+    """
+    Secciones más similares semánticamente en todo el corpus (índice de vecinos aproximados).
+    Parámetros opcionales: ?k=10&otros_proyectos=1 (0 para incluir el mismo proyecto).
+    """
+    k = max(1, min(request.args.get('k', default=10, type=int), 100))
+    solo_otros_proyectos = request.args.get('otros_proyectos', default=1, type=int) == 1
     try:
-        # Llama a la función de servicio para el análisis semántico global
-        resultado_analisis = analizar_todos_los_proyectos_semantico_service() 
-        current_app.logger.info(f"Resultado del análisis SEMÁNTICO global: {resultado_analisis}")
-        
-        if resultado_analisis.get("estado") == "error":
-            return jsonify(resultado_analisis), 500 # Error interno del servidor
-        
-        return jsonify(resultado_analisis), 200 # Éxito
-        
+        resultado = buscar_secciones_similares(reporte_id, seccion, k=k, solo_otros_proyectos=solo_otros_proyectos)
     except Exception as e:
-        current_app.logger.error(f"Excepción no controlada en iniciar_analisis_global_semantico_route: {str(e)}", exc_info=True)
-        return jsonify({"estado": "error", "mensaje": "Error inesperado en el servidor al procesar la solicitud de análisis semántico."}), 500
+        current_app.logger.error(f"Error buscando vecinos semánticos de {reporte_id}/{seccion}: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": "Error inesperado en el servidor al buscar vecinos."}), 500
+    if resultado["status"] in ("error_seccion", "error_reporte"):
+        return jsonify(resultado), 404
+    return jsonify(resultado), 200
+
+@analisis.route('/iniciar-deteccion-duplicados', methods=['POST'])
+def iniciar_deteccion_duplicados_route():
+    """
+    Encola la detección de secciones casi duplicadas entre proyectos (índice MinHash/LSH).
+    Parámetros opcionales: ?umbral_jaccard=0.5&umbral_coseno=0.8&ngram=1; sin 'umbral_coseno'
+    se usa la tolerancia de cada sección. El resultado se consulta en /jobs/<id>.
+    """
+    current_app.logger.info("Solicitud POST recibida en /iniciar-deteccion-duplicados")
+    return encolar_analisis_global("duplicados", detectar_duplicados_entre_proyectos,
+                                umbral_jaccard=request.args.get('umbral_jaccard', default=0.5, type=float),
+                                umbral_coseno=request.args.get('umbral_coseno', default=None, type=float),
+                                ngrama_value=request.args.get('ngram', default=1, type=int))
+
+def encolar_analisis_global(tipo, servicio, **parametros):
+    """Encola un análisis global y responde 202 con el id del trabajo, o 409 si ya hay uno activo."""
+    try:
+        trabajo = encolar_trabajo(current_app._get_current_object(), tipo, servicio, **parametros)
+        current_app.logger.info(f"Análisis global '{tipo}' encolado como trabajo {trabajo['id']}")
+        return jsonify({"estado": trabajo["estado"], "trabajo_id": trabajo["id"],
+                        "url_estado": url_for('trabajos.estado_trabajo', trabajo_id=trabajo["id"])}), 202
+    except TrabajoDuplicadoError as e:
+        return jsonify({"estado": "error", "mensaje": f"Ya hay un análisis global '{tipo}' en curso.",
+                        "trabajo_id": e.trabajo_id,
+                        "url_estado": url_for('trabajos.estado_trabajo', trabajo_id=e.trabajo_id)}), 409
+    except Exception as e:
+        current_app.logger.error(f"Excepción no controlada al encolar el análisis global '{tipo}': {str(e)}", exc_info=True)
+        return jsonify({"estado": "error", "mensaje": "Error inesperado en el servidor al procesar la solicitud."}), 500
+
+@analisis.route('/precargar-modelos', methods=['POST'])
+def precargar_modelos_route():
+    """
+    Carga por adelantado los modelos NLP (por defecto ambos; ?tipo=sintactico o ?tipo=semantico
+    para uno solo), para que el primer análisis no pague el tiempo de carga.
+    """
+    tipo = request.args.get('tipo', default='todos')
+    if tipo not in ('todos', 'sintactico', 'semantico'):
+        return jsonify({"estado": "error", "mensaje": f"Tipo de modelo no válido: '{tipo}'."}), 400
+    modelos = precargar_modelos(sintactico=tipo in ('todos', 'sintactico'),
+                                semantico=tipo in ('todos', 'semantico'))
+    estado_http = 200 if all(modelos.values()) else 500
+    return jsonify({"estado": "completado" if estado_http == 200 else "error", "modelos": modelos}), estado_http
+
+@analisis.route('/modelos-cargados')
+def modelos_cargados_route():
+    return jsonify({"modelos": modelos_cargados()}), 200
 
 @analisis.route('/iniciar-analisis-individual-sintactico/<int:proyecto_id>', methods=['POST'])
 def iniciar_analisis_individual_sintactico_route(proyecto_id):
@@ -266,7 +300,12 @@ def iniciar_analisis_individual_sintactico_route(proyecto_id):
             flash("Error crítico: No se pudieron obtener las configuraciones de tolerancia. El análisis no pudo iniciar.", "danger")
             return redirect(request.referrer or url_for('analisis.mostrar_tematicas_base'))
 
-        analizar_proyecto_individual_service(proyecto_id, tolerancias) 
+        motor = request.args.get('motor', default=MOTOR_CONTEO)
+        if motor not in MOTORES:
+            flash(f"Motor léxico desconocido '{motor}'. Opciones: {', '.join(MOTORES)}.", "danger")
+            return redirect(request.referrer or url_for('analisis.mostrar_tematicas_base'))
+
+        analizar_proyecto_individual_service(proyecto_id, tolerancias, motor=motor)
         
         flash(f"Análisis para el proyecto ID {proyecto_id} ha sido procesado. Revisa los detalles o la tabla para ver el estado actualizado.", "success")
         current_app.logger.info(f"Análisis para el proyecto {proyecto_id} procesado.")
@@ -314,10 +353,15 @@ def analisis_completo_stream():
     #    donde el contexto de la aplicación está activo.
 
     ngram_value = request.args.get('ngram', default=1, type=int)
-    current_app.logger.info(f"Análisis solicitado con n-gramas de tamaño: {ngram_value}")
+    # 'combinado' ejecuta también el análisis semántico leyendo cada proyecto una sola vez
+    modo = request.args.get('modo', default='sintactico')
+    motor = request.args.get('motor', default=MOTOR_CONTEO)
+    if motor not in MOTORES:
+        motor = MOTOR_CONTEO
+    current_app.logger.info(f"Análisis solicitado con n-gramas de tamaño: {ngram_value}, modo: {modo}, motor: {motor}")
 
     app_instance = current_app._get_current_object()
     
     # 2. Pasar la instancia de la aplicación al generador.
     #    Esta es la línea que soluciona el TypeError.
-    return Response(realizar_analisis_completo_sse(app_instance, ngram_value=ngram_value), mimetype='text/event-stream')
+    return Response(realizar_analisis_completo_sse(app_instance, ngram_value=ngram_value, modo=modo, motor=motor), mimetype='text/event-stream')
@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from services.Metricas import generar_texto_prometheus
+
+metricas = Blueprint('metricas', __name__)
+
+@metricas.route('/metrics')
+def metricas_prometheus():
+    """Histogramas por etapa y contadores de los análisis en el formato de texto de Prometheus."""
+    return Response(generar_texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,12 @@
+from flask import Blueprint, jsonify
+from services.Trabajos import obtener_trabajo
+
+trabajos = Blueprint('trabajos', __name__)
+
+@trabajos.route('/jobs/<trabajo_id>')
+def estado_trabajo(trabajo_id):
+    """Estado, progreso, tiempo transcurrido y resultado final de un trabajo en segundo plano."""
+    trabajo = obtener_trabajo(trabajo_id)
+    if trabajo is None:
+        return jsonify({"estado": "error", "mensaje": f"No existe el trabajo {trabajo_id}."}), 404
+    return jsonify(trabajo), 200
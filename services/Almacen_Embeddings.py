@@ -0,0 +1,203 @@
+import logging
+import os
+import json
+import threading
+import numpy as np
+
+from services.Cache_Lemas import calcular_hash_texto
+
+logger = logging.getLogger(__name__)
+
+def leer_indice_jsonl(ruta):
+    """
+    Líneas decodificadas de un índice JSONL de solo anexado. Una última línea sin salto de línea
+    (escritura interrumpida) se descarta y se recorta del archivo, para que las líneas que se
+    anexen después no queden pegadas a ella.
+    """
+    with open(ruta, "rb") as f:
+        lineas = f.readlines()
+    if lineas and not lineas[-1].endswith(b"\n"):
+        logger.warning(f"Línea incompleta al final de '{ruta}' (escritura interrumpida); se recorta.")
+        lineas.pop()
+        with open(ruta, "r+b") as f:
+            f.truncate(sum(len(linea) for linea in lineas))
+    return [json.loads(linea) for linea in lineas if linea.strip()]
+
+class AlmacenEmbeddings:
+    """
+    Almacén en disco de embeddings por (reporte_id, sección), invalidado por hash del texto.
+
+    Se compone de dos archivos dentro de 'directorio':
+    - 'embeddings.bin': matriz (filas x dimensión) en float32 o float16, leída con np.memmap.
+    - 'indice.jsonl': cabecera con el modelo, la dimensión y el tipo, seguida de una línea por
+    embedding añadido ({"r": reporte_id, "s": seccion, "h": hash, "f": fila}). Es de solo
+    anexado; si una sección se edita, la nueva línea reemplaza a la anterior al cargar.
+
+    Si el nombre del modelo guardado no coincide con el actual, el almacén se vacía.
+    """
+
+    ARCHIVO_MATRIZ = "embeddings.bin"
+    ARCHIVO_INDICE = "indice.jsonl"
+
+    def __init__(self, directorio, nombre_modelo, dtype="float32"):
+        self.directorio = directorio
+        self.nombre_modelo = nombre_modelo
+        self.dtype = np.dtype(dtype)
+        self.dimension = None
+        self.filas = 0
+        self.entradas = {} # (reporte_id, seccion) -> (hash, fila)
+        self._claves_fila = [] # fila -> (reporte_id, seccion), incluidas las reemplazadas
+        self._matriz = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+        self._cargar()
+
+    @property
+    def ruta_matriz(self):
+        return os.path.join(self.directorio, self.ARCHIVO_MATRIZ)
+
+    @property
+    def ruta_indice(self):
+        return os.path.join(self.directorio, self.ARCHIVO_INDICE)
+
+    def _cargar(self):
+        if not os.path.exists(self.ruta_indice):
+            return
+        lineas = leer_indice_jsonl(self.ruta_indice)
+
+        cabecera = lineas[0] if lineas else {}
+        if (cabecera.get("modelo") != self.nombre_modelo
+                or np.dtype(cabecera.get("dtype", "float32")) != self.dtype):
+            logger.info(f"Almacén de embeddings generado con '{cabecera.get('modelo')}' "
+                f"({cabecera.get('dtype')}); se invalida para '{self.nombre_modelo}'.")
+            self.invalidar()
+            return
+
+        self.dimension = cabecera.get("dimension")
+        claves_fila = {}
+        for entrada in lineas[1:]:
+            self.entradas[(entrada["r"], entrada["s"])] = (entrada["h"], entrada["f"])
+            claves_fila[entrada["f"]] = (entrada["r"], entrada["s"])
+
+        # Filas realmente escritas; ignora entradas del índice sin datos (escritura interrumpida)
+        # y recorta la fila parcial final para que los siguientes anexados queden alineados
+        if self.dimension and os.path.exists(self.ruta_matriz):
+            bytes_fila = self.dimension * self.dtype.itemsize
+            self.filas = os.path.getsize(self.ruta_matriz) // bytes_fila
+            if os.path.getsize(self.ruta_matriz) > self.filas * bytes_fila:
+                logger.warning(f"Fila parcial al final de '{self.ruta_matriz}' (escritura interrumpida); se recorta.")
+                os.truncate(self.ruta_matriz, self.filas * bytes_fila)
+        self.entradas = {clave: valor for clave, valor in self.entradas.items() if valor[1] < self.filas}
+        self._claves_fila = [claves_fila.get(fila) for fila in range(self.filas)]
+
+    def _escribir_cabecera(self):
+        with open(self.ruta_indice, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"modelo": self.nombre_modelo, "dimension": self.dimension,
+                                "dtype": self.dtype.name}) + "\n")
+
+    def _matriz_memmap(self):
+        if self._matriz is None and self.filas > 0:
+            self._matriz = np.memmap(self.ruta_matriz, dtype=self.dtype, mode="r",
+                                    shape=(self.filas, self.dimension))
+        return self._matriz
+
+    def invalidar(self):
+        """Elimina todos los embeddings guardados (por ejemplo, al cambiar de modelo)."""
+        with self._lock:
+            self._matriz = None
+            for ruta in (self.ruta_matriz, self.ruta_indice):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            self.entradas = {}
+            self._claves_fila = []
+            self.filas = 0
+            self.dimension = None
+
+    def buscar(self, entradas):
+        """
+        Busca los embeddings de una lista de (reporte_id, seccion, texto).
+
+        Retorna (embeddings, pendientes): una matriz float32 (len(entradas) x dimensión) con las
+        filas vigentes ya copiadas (las demás quedan en cero) y la lista de índices de las
+        entradas nuevas o cuyo texto cambió. Si el almacén está vacío la matriz es None.
+        """
+        with self._lock:
+            pendientes = []
+            encontrados = []
+            for i, (reporte_id, seccion, texto) in enumerate(entradas):
+                guardado = self.entradas.get((reporte_id, seccion))
+                if guardado is None or guardado[0] != calcular_hash_texto(texto):
+                    pendientes.append(i)
+                else:
+                    encontrados.append((i, guardado[1]))
+
+            matriz = self._matriz_memmap()
+            if matriz is None:
+                return None, pendientes
+            embeddings = np.zeros((len(entradas), self.dimension), dtype=np.float32)
+            if encontrados:
+                indices, filas = zip(*encontrados)
+                embeddings[list(indices)] = matriz[list(filas)]
+            return embeddings, pendientes
+
+    def leer_filas(self, filas):
+        """Copia float32 de las filas indicadas de la matriz (lista o slice)."""
+        with self._lock:
+            matriz = self._matriz_memmap()
+            if matriz is None:
+                return np.empty((0, self.dimension or 0), dtype=np.float32)
+            return np.asarray(matriz[filas], dtype=np.float32)
+
+    def claves_vigentes(self):
+        """{fila: (reporte_id, seccion)} de las filas que no fueron reemplazadas por una edición."""
+        with self._lock:
+            return {fila: clave for clave, (_, fila) in self.entradas.items()}
+
+    def claves_de_filas(self, inicio, fin):
+        """Lista de (reporte_id, seccion) de las filas [inicio, fin), vigentes o reemplazadas."""
+        with self._lock:
+            return self._claves_fila[inicio:fin]
+
+    def agregar(self, entradas, embeddings):
+        """Añade al almacén los embeddings (matriz numpy) de una lista de (reporte_id, seccion, texto)."""
+        if not entradas:
+            return
+        with self._lock:
+            self._anexar([entrada[:2] for entrada in entradas],
+                        [calcular_hash_texto(entrada[2]) for entrada in entradas],
+                        np.asarray(embeddings, dtype=np.float32))
+
+    def obtener_o_calcular(self, entradas, codificar_lote):
+        """
+        Devuelve una matriz float32 (len(entradas) x dimensión) con el embedding de cada entrada
+        (reporte_id, seccion, texto), en el mismo orden. Solo las entradas nuevas o cuyo texto
+        cambió se envían a 'codificar_lote', que recibe una lista de textos y devuelve una
+        matriz numpy; sus resultados se añaden al almacén.
+        """
+        embeddings, pendientes = self.buscar(entradas)
+        if not pendientes:
+            return embeddings
+
+        nuevos = np.asarray(codificar_lote([str(entradas[i][2]) for i in pendientes]), dtype=np.float32)
+        self.agregar([entradas[i] for i in pendientes], nuevos)
+        if embeddings is None:
+            embeddings = np.zeros((len(entradas), nuevos.shape[1]), dtype=np.float32)
+        embeddings[pendientes] = nuevos
+        return embeddings
+
+    def _anexar(self, claves, hashes, embeddings):
+        if self.dimension is None:
+            self.dimension = int(embeddings.shape[1])
+            self._escribir_cabecera()
+
+        # Primero los datos y luego el índice: un índice sin datos se descarta al cargar
+        with open(self.ruta_matriz, "ab") as f:
+            f.write(np.ascontiguousarray(embeddings, dtype=self.dtype).tobytes())
+        with open(self.ruta_indice, "a", encoding="utf-8") as f:
+            for j, ((reporte_id, seccion), texto_hash) in enumerate(zip(claves, hashes)):
+                fila = self.filas + j
+                self.entradas[(reporte_id, seccion)] = (texto_hash, fila)
+                self._claves_fila.append((reporte_id, seccion))
+                f.write(json.dumps({"r": reporte_id, "s": seccion, "h": texto_hash, "f": fila}) + "\n")
+        self.filas += len(claves)
+        self._matriz = None # Reabrir el memmap con el nuevo tamaño
@@ -0,0 +1,107 @@
+import logging
+import hashlib
+from datetime import datetime
+
+from models.Huellas_Analisis import HuellaAnalisis
+from services.Cache_Lemas import calcular_hash_texto
+from services.Usuarios_Marcados import TABLA_ORIGEN_MARCADOS, sincronizar_usuarios_marcados, usuarios_de_filas
+from services.Resumen_Proyectos import TABLA_ORIGEN_RESUMEN, actualizar_resumen_proyectos
+from config.config import db
+
+logger = logging.getLogger(__name__)
+
+TIPO_SINTACTICO = "sintactico"
+TIPO_SEMANTICO = "semantico"
+TIPO_MULTINGRAMA = "multingrama" # Sintáctico con los n-gramas 1 a 4 en las tablas comparacion_tm*
+
+# Decisiones posibles para un proyecto en un análisis incremental
+PLAN_OMITIR = "omitir"       # Ni los integrantes ni sus textos cambiaron
+PLAN_COMPLETO = "completo"   # Cambió la membresía (o no hay huellas previas): se analizan todos los pares
+PLAN_PARCIAL = "parcial"     # Misma membresía: solo los pares que tocan un reporte modificado
+
+def calcular_huella_reporte(reporte, columnas_secciones, firma=None):
+    """
+    Huella del contenido analizado de un reporte: su id y el hash de cada sección. 'firma' añade
+    lo que, además del texto, cambia el resultado (las frecuencias del corpus de un motor con IDF).
+    """
+    partes = [str(reporte.id)] + [calcular_hash_texto(getattr(reporte, seccion, "")) for seccion in columnas_secciones]
+    if firma:
+        partes.append(firma)
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+def calcular_huellas_proyecto(reportes_por_usuario, columnas_secciones, firma=None):
+    """{user_id: (reporte_id, huella)} del primer reporte de cada integrante."""
+    return {user_id: (reporte.id, calcular_huella_reporte(reporte, columnas_secciones, firma))
+            for user_id, reporte in reportes_por_usuario.items()}
+
+def cargar_huellas(tipo_analisis, ngrama=0):
+    """Huellas guardadas del último análisis: {project_id: {user_id: (reporte_id, huella)}}."""
+    huellas = {}
+    filas = db.session.query(HuellaAnalisis.project_id, HuellaAnalisis.user_id,
+                            HuellaAnalisis.reporte_id, HuellaAnalisis.huella) \
+        .filter(HuellaAnalisis.tipo_analisis == tipo_analisis, HuellaAnalisis.ngrama == ngrama).all()
+    for project_id, user_id, reporte_id, huella in filas:
+        huellas.setdefault(project_id, {})[user_id] = (reporte_id, huella)
+    return huellas
+
+def planificar_proyecto(huellas_actuales, huellas_guardadas):
+    """
+    Compara las huellas actuales de un proyecto con las del último análisis.
+    Retorna (plan, usuarios_cambiados); usuarios_cambiados solo aplica al plan parcial.
+    """
+    if not huellas_guardadas or set(huellas_actuales) != set(huellas_guardadas):
+        return PLAN_COMPLETO, None
+    usuarios_cambiados = {user_id for user_id, valor in huellas_actuales.items()
+                        if huellas_guardadas.get(user_id) != valor}
+    if not usuarios_cambiados:
+        return PLAN_OMITIR, set()
+    return PLAN_PARCIAL, usuarios_cambiados
+
+def contar_pares(num_integrantes):
+    return num_integrantes * (num_integrantes - 1) // 2 if num_integrantes > 1 else 0
+
+def guardar_huellas_proyecto(tipo_analisis, ngrama, project_id, huellas_actuales):
+    """Reemplaza las huellas guardadas del proyecto por las actuales."""
+    try:
+        HuellaAnalisis.query.filter_by(tipo_analisis=tipo_analisis, ngrama=ngrama, project_id=project_id) \
+            .delete(synchronize_session=False)
+        ahora = datetime.utcnow()
+        db.session.bulk_insert_mappings(HuellaAnalisis, [
+            {"tipo_analisis": tipo_analisis, "ngrama": ngrama, "project_id": project_id,
+            "user_id": user_id, "reporte_id": reporte_id, "huella": huella, "updated_at": ahora}
+            for user_id, (reporte_id, huella) in huellas_actuales.items()
+        ])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"No se pudieron guardar las huellas del proyecto {project_id} ({tipo_analisis}): {e}", exc_info=True)
+
+def eliminar_comparaciones_obsoletas(modelo, project_id, usuarios_actuales):
+    """
+    Elimina las comparaciones del proyecto que involucran a usuarios que ya no son integrantes
+    (incluido el registro (usuario, 0) de un proyecto que antes tenía un solo integrante).
+    """
+    usuarios = list(usuarios_actuales)
+    try:
+        consulta = modelo.query.filter(modelo.project_id == project_id)
+        if len(usuarios) > 1:
+            consulta = consulta.filter((~modelo.usuario_1_id.in_(usuarios)) | (~modelo.usuario_2_id.in_(usuarios)))
+        else:
+            consulta = consulta.filter((~modelo.usuario_1_id.in_(usuarios)) | (modelo.usuario_2_id != 0))
+        afectados = None
+        if modelo.__tablename__ == TABLA_ORIGEN_MARCADOS:
+            # Los usuarios de las filas borradas pueden dejar de estar marcados
+            afectados = usuarios_de_filas(
+                {"usuario_1_id": u1, "usuario_2_id": u2}
+                for u1, u2 in consulta.with_entities(modelo.usuario_1_id, modelo.usuario_2_id))
+        eliminadas = consulta.delete(synchronize_session=False)
+        if afectados:
+            sincronizar_usuarios_marcados(afectados)
+        if eliminadas and modelo.__tablename__ == TABLA_ORIGEN_RESUMEN:
+            actualizar_resumen_proyectos([project_id])
+        db.session.commit()
+        return eliminadas
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"No se pudieron eliminar comparaciones obsoletas del proyecto {project_id}: {e}", exc_info=True)
+        return 0
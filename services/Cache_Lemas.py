@@ -0,0 +1,115 @@
+import logging
+import hashlib
+import pandas as pd
+from datetime import datetime
+
+from models.Lemas_Reportes import LemasReporte
+from services.Guardado_Comparaciones import construir_sentencia_upsert
+from config.config import db
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo de la lista de IDs en cada consulta IN (...)
+TAMANO_BLOQUE_CONSULTA = 1000
+
+def calcular_hash_texto(texto):
+    """Hash sha256 del texto crudo de una sección. Cadena vacía si no hay texto."""
+    if texto is None or pd.isna(texto) or not texto:
+        return ""
+    return hashlib.sha256(str(texto).encode("utf-8")).hexdigest()
+
+def buscar_lemas_en_cache(reportes, columnas_secciones):
+    """
+    Busca en 'reportes_lemas_cache' los textos lematizados de las secciones de los reportes.
+
+    Retorna (lemas, pendientes):
+    - lemas: {(reporte_id, seccion): texto_lematizado} de las secciones vacías o vigentes en caché.
+    - pendientes: {(reporte_id, seccion): (hash, texto_crudo)} de las secciones nuevas o cuyo
+    texto cambió (hash distinto), que deben lematizarse.
+    """
+    lemas = {}
+    hashes = {} # (reporte_id, seccion) -> (hash, texto crudo)
+
+    for reporte in reportes:
+        for seccion in columnas_secciones:
+            texto = getattr(reporte, seccion, "")
+            texto_hash = calcular_hash_texto(texto)
+            if not texto_hash:
+                lemas[(reporte.id, seccion)] = ""
+            else:
+                hashes[(reporte.id, seccion)] = (texto_hash, texto)
+
+    if not hashes:
+        return lemas, {}
+
+    # Registros existentes en la caché para estos reportes
+    ids_reportes = sorted({clave[0] for clave in hashes})
+    registros_cache = {}
+    try:
+        for i in range(0, len(ids_reportes), TAMANO_BLOQUE_CONSULTA):
+            bloque = ids_reportes[i:i + TAMANO_BLOQUE_CONSULTA]
+            filas = db.session.query(LemasReporte.reporte_id, LemasReporte.seccion,
+                                    LemasReporte.texto_hash, LemasReporte.lemas) \
+                .filter(LemasReporte.reporte_id.in_(bloque)).all()
+            for reporte_id, seccion, texto_hash, lemas_guardados in filas:
+                registros_cache[(reporte_id, seccion)] = (texto_hash, lemas_guardados)
+    except Exception as e:
+        logger.warning(f"No se pudo leer la caché de lemas, se lematizará todo de nuevo: {e}")
+        registros_cache = {}
+
+    pendientes = {}
+    for clave, (texto_hash, texto) in hashes.items():
+        registro = registros_cache.get(clave)
+        if registro is not None and registro[0] == texto_hash:
+            lemas[clave] = registro[1] or ""
+        else:
+            pendientes[clave] = (texto_hash, texto)
+
+    return lemas, pendientes
+
+def guardar_lemas_en_cache(nuevos):
+    """
+    Guarda en la caché los lemas recién calculados, {(reporte_id, seccion): (hash, lemas)},
+    con un INSERT ... ON DUPLICATE KEY UPDATE por bloque y un único commit.
+    """
+    if not nuevos:
+        return
+    ahora = datetime.utcnow()
+    filas = [{"reporte_id": reporte_id, "seccion": seccion, "texto_hash": texto_hash, "lemas": lemas,
+            "created_at": ahora, "updated_at": ahora}
+            for (reporte_id, seccion), (texto_hash, lemas) in nuevos.items()]
+    try:
+        for i in range(0, len(filas), TAMANO_BLOQUE_CONSULTA):
+            db.session.execute(construir_sentencia_upsert(
+                LemasReporte.__table__, filas[i:i + TAMANO_BLOQUE_CONSULTA],
+                ['texto_hash', 'lemas', 'updated_at'], ['reporte_id', 'seccion']))
+        db.session.commit()
+    except Exception as e:
+        # La caché es una optimización: si falla el guardado el análisis continúa
+        db.session.rollback()
+        logger.warning(f"No se pudo guardar la caché de lemas: {e}", exc_info=True)
+
+def obtener_lemas_reportes(reportes, columnas_secciones, preprocesar_lote):
+    """
+    Devuelve un diccionario {(reporte_id, seccion): texto_lematizado} para los reportes dados.
+
+    Los textos ya lematizados se leen de la tabla 'reportes_lemas_cache'. Solo las secciones
+    nuevas o cuyo texto cambió (hash distinto) se envían a 'preprocesar_lote', que recibe una
+    lista de textos crudos y devuelve la lista de textos lematizados en el mismo orden.
+    Los resultados nuevos se guardan en la caché.
+    """
+    lemas, pendientes = buscar_lemas_en_cache(reportes, columnas_secciones)
+    if not pendientes:
+        return lemas
+
+    logger.debug("Caché de lemas: %d secciones reutilizadas o vacías, %d por lematizar.", len(lemas), len(pendientes))
+    claves = list(pendientes.keys())
+    lemas_nuevos = preprocesar_lote([pendientes[clave][1] for clave in claves])
+
+    nuevos = {}
+    for clave, lemas_clave in zip(claves, lemas_nuevos):
+        lemas[clave] = lemas_clave
+        nuevos[clave] = (pendientes[clave][0], lemas_clave)
+    guardar_lemas_en_cache(nuevos)
+
+    return lemas
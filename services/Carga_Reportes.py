@@ -0,0 +1,82 @@
+from sqlalchemy import select, func
+
+from models.Reportes_Finales import ReportesFinales
+from services.Metricas import medir, ETAPA_CARGA
+from config.config import db, CARGA_REPORTES_TAMANO_LOTE
+
+# Secciones de los reportes que se comparan
+COLUMNAS_SECCIONES = ['introduccion', 'marcoteorico', 'metodo', 'resultados', 'discusion', 'conclusiones']
+
+# Únicas columnas que leen los análisis (sin nombre_reporte ni metadatos)
+COLUMNAS_CARGA = [ReportesFinales.id, ReportesFinales.user_id, ReportesFinales.project_id] + \
+    [getattr(ReportesFinales, seccion) for seccion in COLUMNAS_SECCIONES]
+
+def contar_proyectos():
+    """Número de proyectos con al menos un reporte."""
+    return db.session.query(func.count(func.distinct(ReportesFinales.project_id))) \
+        .filter(ReportesFinales.project_id.isnot(None)).scalar() or 0
+
+def construir_consulta_reportes(ordenar_por_tamano=False, project_ids=None):
+    """
+    SELECT de las columnas de carga ordenado por proyecto (y por id dentro del proyecto, para que
+    el primer reporte de cada usuario sea el de menor id). Con 'ordenar_por_tamano', los
+    proyectos con más integrantes van primero.
+    """
+    consulta = select(*COLUMNAS_CARGA).where(ReportesFinales.project_id.isnot(None))
+    if project_ids is not None:
+        consulta = consulta.where(ReportesFinales.project_id.in_(list(project_ids)))
+    if ordenar_por_tamano:
+        conteos = select(ReportesFinales.project_id.label("project_id"),
+                        func.count(func.distinct(ReportesFinales.user_id)).label("integrantes")) \
+            .group_by(ReportesFinales.project_id).subquery()
+        consulta = consulta.join(conteos, conteos.c.project_id == ReportesFinales.project_id) \
+            .order_by(conteos.c.integrantes.desc(), ReportesFinales.project_id, ReportesFinales.id)
+    else:
+        consulta = consulta.order_by(ReportesFinales.project_id, ReportesFinales.id)
+    return consulta
+
+def iterar_reportes_por_proyecto(ordenar_por_tamano=False, project_ids=None, tamano_lote=None):
+    """
+    Recorre 'reportes_finales' con una sola consulta y un cursor del lado del servidor, y produce
+    (project_id, {user_id: reporte}) por proyecto, con el primer reporte de cada usuario.
+    Cada reporte es una fila ligera (id, user_id, project_id y las seis secciones) con acceso
+    por atributo, como los objetos ReportesFinales.
+
+    La consulta usa su propia conexión, de modo que la sesión puede seguir leyendo y haciendo
+    commit mientras se consume el flujo. En memoria solo hay un lote de filas y un proyecto.
+    La lectura de cada lote se registra en la métrica de la etapa de carga.
+    """
+    tamano_lote = tamano_lote or CARGA_REPORTES_TAMANO_LOTE
+    with db.engine.connect() as conexion:
+        with medir(ETAPA_CARGA):
+            resultado = conexion.execution_options(stream_results=True, yield_per=tamano_lote) \
+                .execute(construir_consulta_reportes(ordenar_por_tamano, project_ids))
+            lotes = resultado.partitions(tamano_lote)
+        proyecto_actual = None
+        reportes_por_usuario = {}
+        while True:
+            with medir(ETAPA_CARGA):
+                lote = next(lotes, None)
+            if lote is None:
+                break
+            for fila in lote:
+                if fila.project_id != proyecto_actual:
+                    if proyecto_actual is not None:
+                        yield proyecto_actual, reportes_por_usuario
+                    proyecto_actual = fila.project_id
+                    reportes_por_usuario = {}
+                if fila.user_id not in reportes_por_usuario: # Tomar el primer reporte por usuario
+                    reportes_por_usuario[fila.user_id] = fila
+        if proyecto_actual is not None:
+            yield proyecto_actual, reportes_por_usuario
+
+def iterar_reportes_analizados(tamano_bloque, project_ids=None):
+    """Bloques de hasta 'tamano_bloque' reportes analizados (el primero de cada usuario por proyecto)."""
+    bloque = []
+    for _, reportes_por_usuario in iterar_reportes_por_proyecto(project_ids=project_ids):
+        bloque.extend(reportes_por_usuario.values())
+        if len(bloque) >= tamano_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
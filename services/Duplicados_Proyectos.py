@@ -0,0 +1,114 @@
+import logging
+import time
+
+from models.Reportes_Finales import ReportesFinales
+from services.Indice_MinHash import IndiceMinHash
+from services.Cache_Lemas import obtener_lemas_reportes, calcular_hash_texto
+from services.Procesamiento_Similitud import (
+    COLUMNAS_SECCIONES, preprocesar_textos, calcular_matriz_similitud, obtener_tolerancias
+)
+from services.Carga_Reportes import iterar_reportes_analizados
+from config.config import (SPACY_BLOQUE_REPORTES, MINHASH_DIRECTORIO, MINHASH_PERMUTACIONES,
+                        MINHASH_BANDAS, MINHASH_TAMANO_SHINGLE)
+
+logger = logging.getLogger(__name__)
+
+# Índice persistente de firmas MinHash; se crea al primer uso
+indice_minhash = None
+
+def obtener_indice_minhash():
+    global indice_minhash
+    if indice_minhash is None:
+        indice_minhash = IndiceMinHash(MINHASH_DIRECTORIO, num_permutaciones=MINHASH_PERMUTACIONES,
+                                    bandas=MINHASH_BANDAS, tamano_shingle=MINHASH_TAMANO_SHINGLE)
+    return indice_minhash
+
+def actualizar_indice_minhash(tamano_bloque=None):
+    """
+    Añade al índice las secciones de los reportes analizados (el primero de cada usuario por
+    proyecto) que son nuevas o cuyo texto cambió. Los lemas salen de la caché de lemas.
+    Retorna el número de entradas modificadas.
+    """
+    tamano_bloque = tamano_bloque or SPACY_BLOQUE_REPORTES
+    indice = obtener_indice_minhash()
+    modificadas = 0
+    for reportes in iterar_reportes_analizados(tamano_bloque):
+        lemas = obtener_lemas_reportes(reportes, COLUMNAS_SECCIONES, preprocesar_textos)
+        modificadas += indice.actualizar([
+            (reporte.id, seccion, reporte.project_id, calcular_hash_texto(getattr(reporte, seccion, "")),
+            lemas.get((reporte.id, seccion), ""))
+            for reporte in reportes for seccion in COLUMNAS_SECCIONES
+        ])
+    logger.info(f"Índice MinHash actualizado: {modificadas} entradas modificadas, {len(indice.entradas)} vigentes.")
+    return modificadas
+
+def verificar_candidatos(candidatos, umbrales, ngrama_value=1):
+    """
+    Calcula la similitud coseno (la misma del análisis sintáctico) de cada par candidato y
+    conserva los que superan el umbral de su sección.
+    """
+    ids_reportes = {c["reporte_1_id"] for c in candidatos} | {c["reporte_2_id"] for c in candidatos}
+    reportes = ReportesFinales.query.filter(ReportesFinales.id.in_(ids_reportes)).all() if ids_reportes else []
+    usuarios = {reporte.id: reporte.user_id for reporte in reportes}
+    lemas = obtener_lemas_reportes(reportes, COLUMNAS_SECCIONES, preprocesar_textos)
+
+    duplicados = []
+    for candidato in candidatos:
+        seccion = candidato["seccion"]
+        textos = [lemas.get((candidato["reporte_1_id"], seccion), ""), lemas.get((candidato["reporte_2_id"], seccion), "")]
+        similitud = round(float(calcular_matriz_similitud(textos, ngrama_value)[0, 1]), 4)
+        if similitud > umbrales.get(seccion, 0.0):
+            duplicados.append(dict(candidato, similitud=similitud,
+                                usuario_1_id=usuarios.get(candidato["reporte_1_id"]),
+                                usuario_2_id=usuarios.get(candidato["reporte_2_id"])))
+    duplicados.sort(key=lambda d: d["similitud"], reverse=True)
+    return duplicados
+
+def detectar_duplicados_entre_proyectos(umbral_jaccard=0.5, umbral_coseno=None, ngrama_value=1, progreso=None):
+    """
+    Detecta secciones casi duplicadas entre reportes de proyectos distintos:
+    1. Actualiza el índice MinHash con las secciones nuevas o modificadas.
+    2. Obtiene por LSH los pares candidatos con Jaccard estimado >= 'umbral_jaccard'.
+    3. Verifica cada candidato con la similitud coseno; el umbral es 'umbral_coseno' o, si no se
+    indica, la tolerancia configurada para la sección.
+    'progreso(completados, total)' es opcional y avanza por etapa.
+    """
+    logger.info("Iniciando la detección de duplicados entre proyectos...")
+    tiempo_inicio = time.time()
+    try:
+        if umbral_coseno is None:
+            umbrales = obtener_tolerancias()
+            if umbrales is None:
+                msg = "Error: No se pudieron obtener las tolerancias para verificar los candidatos."
+                logger.error(msg)
+                return {"estado": "error", "mensaje": msg}
+        else:
+            umbrales = {seccion: umbral_coseno for seccion in COLUMNAS_SECCIONES}
+
+        entradas_modificadas = actualizar_indice_minhash()
+        if progreso is not None:
+            progreso(1, 3)
+        candidatos = obtener_indice_minhash().candidatos_entre_proyectos(umbral_jaccard)
+        logger.info(f"Candidatos LSH entre proyectos (Jaccard estimado >= {umbral_jaccard}): {len(candidatos)}")
+        if progreso is not None:
+            progreso(2, 3)
+        duplicados = verificar_candidatos(candidatos, umbrales, ngrama_value)
+        if progreso is not None:
+            progreso(3, 3)
+
+        tiempo_total_segundos = time.time() - tiempo_inicio
+        msg_final = (f"Detección de duplicados entre proyectos completada: {len(duplicados)} de "
+                    f"{len(candidatos)} candidatos confirmados en {tiempo_total_segundos:.2f}s.")
+        logger.info(msg_final)
+        return {
+            "estado": "completado",
+            "mensaje": msg_final,
+            "entradas_indice_modificadas": entradas_modificadas,
+            "candidatos": len(candidatos),
+            "duplicados": duplicados,
+            "tiempo_total_segundos": round(tiempo_total_segundos, 2)
+        }
+    except Exception as e:
+        error_msg = f"Error durante la detección de duplicados entre proyectos: {str(e)}"
+        logger.exception(error_msg)
+        return {"estado": "error", "mensaje": error_msg}
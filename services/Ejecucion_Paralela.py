@@ -0,0 +1,74 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+def ejecutar_proyectos_en_paralelo(proyectos, total_proyectos, preparar_tarea, procesar_tarea, guardar_resultado,
+                                inicializador, num_procesos, progreso=None):
+    """
+    Reparte proyectos completos entre 'num_procesos' procesos trabajadores.
+
+    - proyectos: iterable de (project_id, reportes_por_usuario), por ejemplo el flujo de
+    iterar_reportes_por_proyecto; se consume a medida que se envían tareas.
+    - preparar_tarea(project_id, reportes_por_usuario): en el proceso principal, lee la caché y
+    devuelve la tarea (datos simples serializables) o None si el proyecto se resolvió sin trabajador.
+    - procesar_tarea(tarea): en el trabajador, sin acceso a la BD; devuelve el resultado.
+    - guardar_resultado(resultado): en el proceso principal, que es el único escritor.
+    - inicializador(): se ejecuta una vez por trabajador (carga del modelo NLP).
+    - progreso(completados, total): opcional, se llama cada vez que un proyecto termina.
+
+    Los proyectos se envían en el orden recibido (se espera de mayor a menor) y como máximo
+    hay dos tareas por trabajador en vuelo, para no cargar todos los textos en memoria.
+    Retorna {"procesados": n, "errores": n}.
+    """
+    # 'spawn' evita heredar por fork las conexiones a la BD y los hilos de torch del proceso web
+    contexto = multiprocessing.get_context("spawn")
+    max_en_vuelo = num_procesos * 2
+    procesados = 0
+    errores = 0
+    pendientes_por_enviar = iter(proyectos)
+    en_vuelo = {}
+
+    def notificar_progreso():
+        if progreso is not None:
+            progreso(procesados + errores, total_proyectos)
+
+    with ProcessPoolExecutor(max_workers=num_procesos, mp_context=contexto, initializer=inicializador) as ejecutor:
+
+        def enviar_siguientes():
+            nonlocal procesados, errores
+            while len(en_vuelo) < max_en_vuelo:
+                proyecto = next(pendientes_por_enviar, None)
+                if proyecto is None:
+                    return
+                project_id, reportes_por_usuario = proyecto
+                try:
+                    tarea = preparar_tarea(project_id, reportes_por_usuario)
+                except Exception as e:
+                    errores += 1
+                    logger.exception(f"Error preparando el proyecto {project_id}: {e}")
+                    notificar_progreso()
+                    continue
+                if tarea is None:
+                    procesados += 1
+                    notificar_progreso()
+                    continue
+                en_vuelo[ejecutor.submit(procesar_tarea, tarea)] = project_id
+
+        enviar_siguientes()
+        while en_vuelo:
+            terminados, _ = wait(list(en_vuelo.keys()), return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                project_id = en_vuelo.pop(futuro)
+                try:
+                    guardar_resultado(futuro.result())
+                    procesados += 1
+                    logger.debug("Proyecto %s procesado en paralelo (%d completados).", project_id, procesados)
+                except Exception as e:
+                    errores += 1
+                    logger.exception(f"Error procesando el proyecto {project_id} en paralelo: {e}")
+                notificar_progreso()
+            enviar_siguientes()
+
+    return {"procesados": procesados, "errores": errores}
@@ -0,0 +1,234 @@
+import logging
+import numpy as np
+from datetime import datetime
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from services.Metricas import medir, ETAPA_ESCRITURA, ETAPA_PUNTUACION
+from services.Registro import NOMBRE_TRAZA_PARES
+from services.Usuarios_Marcados import TABLA_ORIGEN_MARCADOS, sincronizar_usuarios_marcados, usuarios_de_filas
+from services.Resumen_Proyectos import TABLA_ORIGEN_RESUMEN, actualizar_resumen_proyectos
+from services.Migraciones import clave_unica_disponible
+from config.config import db
+
+logger = logging.getLogger(__name__)
+logger_traza = logging.getLogger(NOMBRE_TRAZA_PARES)
+
+# Secciones sin tolerancia configurada ya advertidas en este proceso (se avisa una vez, no por proyecto)
+_secciones_sin_tolerancia = set()
+
+# Tablas sin la clave única ya advertidas en este proceso
+_tablas_sin_clave = set()
+
+COLUMNAS_SIMILITUD = ['introduccion', 'marcoteorico', 'metodo', 'resultados', 'discusion', 'conclusiones']
+
+# Columnas que se reescriben cuando el par (project_id, usuario_1_id, usuario_2_id) ya existe
+COLUMNAS_ACTUALIZABLES = COLUMNAS_SIMILITUD + ['secciones_similares', 'similitud_detectada', 'status_analisis', 'updated_at']
+
+# Clave natural de las tablas de comparación
+COLUMNAS_CLAVE = ['project_id', 'usuario_1_id', 'usuario_2_id']
+
+# Tablas de comparación: guardadas por lotes con esa clave, migradas y recalculadas por umbral
+TABLAS_COMPARACION = [
+    'comparacion_similitud', 'comparacion_similitud2', 'comparacion_similitud_3', 'comparacion_similitud_4',
+    'comparacion_similitud_5', 'comparacion_similitud_6', 'comparacion_tm', 'comparacion_tm_bigrama',
+    'comparacion_tm_trigrama', 'comparacion_tm_4grama',
+]
+
+# Filas por sentencia INSERT ... ON DUPLICATE KEY UPDATE (y por commit)
+TAMANO_LOTE_GUARDADO = 500
+
+def construir_sentencia_upsert(tabla, filas, columnas_actualizables, columnas_clave):
+    """
+    INSERT de varias filas que actualiza 'columnas_actualizables' si la clave única ya existe:
+    ON DUPLICATE KEY UPDATE en MySQL y ON CONFLICT (...) DO UPDATE en SQLite (benchmarks y
+    bases locales).
+    """
+    if db.engine.dialect.name == "sqlite":
+        sentencia = sqlite_insert(tabla).values(filas)
+        return sentencia.on_conflict_do_update(
+            index_elements=columnas_clave,
+            set_={columna: sentencia.excluded[columna] for columna in columnas_actualizables})
+    sentencia = mysql_insert(tabla).values(filas)
+    return sentencia.on_duplicate_key_update(
+        {columna: sentencia.inserted[columna] for columna in columnas_actualizables})
+
+def normalizar_par_usuarios(usuario_1_id, usuario_2_id):
+    """
+    Devuelve (id_menor, id_mayor). Los proyectos de un solo integrante se guardan
+    como (usuario, 0).
+    """
+    u1_id = int(usuario_1_id)
+    u2_id = int(usuario_2_id)
+    if u2_id == 0:
+        return u1_id, 0
+    return min(u1_id, u2_id), max(u1_id, u2_id)
+
+def construir_fila_comparacion(usuario_1_id, usuario_2_id, project_id,
+                            similitudes_dict, secciones_similares_count):
+    """Construye el diccionario de columnas de una comparación lista para el guardado por lotes."""
+    id_menor, id_mayor = normalizar_par_usuarios(usuario_1_id, usuario_2_id)
+    num_secciones_similares = int(secciones_similares_count)
+    ahora = datetime.utcnow()
+
+    fila = {
+        'usuario_1_id': id_menor,
+        'usuario_2_id': id_mayor,
+        'project_id': int(project_id),
+        'secciones_similares': num_secciones_similares,
+        'similitud_detectada': 1 if num_secciones_similares > 0 else 0,
+        'status_analisis': 1,
+        'created_at': ahora,
+        'updated_at': ahora,
+    }
+    for columna in COLUMNAS_SIMILITUD:
+        fila[columna] = float(similitudes_dict.get(columna, 0.0))
+    return fila
+
+def mensaje_sin_clave_unica(tablas):
+    return (f"Tablas de comparación sin la clave única ({', '.join(COLUMNAS_CLAVE)}): {', '.join(tablas)}. No se "
+            "guardan comparaciones en ellas; aplicar las migraciones: python -m migraciones.Ejecutar_Migraciones")
+
+def comprobar_claves_unicas(modelos):
+    """
+    Comprueba una vez, al iniciar un análisis global, que las tablas de destino tienen la clave
+    única que requiere el guardado por lotes. Retorna None o el mensaje de error para abortar.
+    """
+    faltantes = [modelo.__tablename__ for modelo in modelos
+                if not clave_unica_disponible(modelo.__tablename__, COLUMNAS_CLAVE, revisar=True)]
+    return mensaje_sin_clave_unica(faltantes) if faltantes else None
+
+def guardar_comparaciones_lote(modelo, filas, tamano_lote=TAMANO_LOTE_GUARDADO):
+    """
+    Inserta o actualiza las filas en la tabla del modelo con una sentencia
+    INSERT ... ON DUPLICATE KEY UPDATE por lote y un commit por lote.
+    'filas' es una lista de diccionarios o un ResultadosComparacion, que se convierte lote a lote.
+    Requiere la clave única (project_id, usuario_1_id, usuario_2_id): si la tabla no la tiene
+    no escribe nada, porque cada análisis añadiría otra copia de todos los pares.
+    En 'comparacion_similitud' también actualiza 'usuarios_marcados' y 'resumen_proyectos'
+    para los usuarios y proyectos del lote, dentro del mismo commit.
+
+    Retorna el número de filas enviadas, o None si ocurrió un error.
+    """
+    if not filas:
+        return 0
+
+    tabla = modelo.__table__
+    if not clave_unica_disponible(tabla.name, COLUMNAS_CLAVE):
+        if tabla.name not in _tablas_sin_clave:
+            _tablas_sin_clave.add(tabla.name)
+            logger.error(mensaje_sin_clave_unica([tabla.name]))
+        return None
+    guardadas = 0
+    try:
+        with medir(ETAPA_ESCRITURA):
+            for i in range(0, len(filas), tamano_lote):
+                if isinstance(filas, ResultadosComparacion):
+                    lote = filas.a_filas(i, i + tamano_lote)
+                else:
+                    lote = filas[i:i + tamano_lote]
+                db.session.execute(construir_sentencia_upsert(tabla, lote, COLUMNAS_ACTUALIZABLES, COLUMNAS_CLAVE))
+                if tabla.name == TABLA_ORIGEN_MARCADOS:
+                    sincronizar_usuarios_marcados(usuarios_de_filas(lote))
+                if tabla.name == TABLA_ORIGEN_RESUMEN:
+                    actualizar_resumen_proyectos({fila['project_id'] for fila in lote})
+                db.session.commit()
+                guardadas += len(lote)
+        return guardadas
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"Error al guardar el lote de comparaciones en '{tabla.name}': {e}")
+        return None
+
+class ResultadosComparacion:
+    """
+    Resultados de un proyecto en arreglos compactos, uno por columna, en lugar de un
+    diccionario por par:
+    - usuarios: (pares, 2) con (id_menor, id_mayor) de cada par.
+    - similitudes: (pares, 6) en el orden de COLUMNAS_SIMILITUD, redondeadas a 4 decimales.
+    - secciones_similares: (pares,) secciones que superan su umbral.
+    Se envía tal cual entre procesos y guardar_comparaciones_lote lo convierte en filas por lote.
+    """
+
+    def __init__(self, project_id, usuarios, similitudes, secciones_similares):
+        self.project_id = int(project_id)
+        self.usuarios = usuarios
+        self.similitudes = similitudes
+        self.secciones_similares = secciones_similares
+
+    def __len__(self):
+        return len(self.secciones_similares)
+
+    @classmethod
+    def desde_matrices(cls, project_id, usuarios, matrices_por_seccion, tolerancias, etiqueta=""):
+        """
+        Toma todos los pares de 'usuarios' de una matriz n x n de similitud por sección (en el
+        orden de 'usuarios') y cuenta, con una sola comparación vectorizada, las secciones que
+        superan el umbral de tolerancia de cada una.
+        """
+        with medir(ETAPA_PUNTUACION):
+            indices_1, indices_2 = np.triu_indices(len(usuarios), k=1)
+            similitudes = np.zeros((len(indices_1), len(COLUMNAS_SIMILITUD)), dtype=np.float64)
+            umbrales = np.zeros(len(COLUMNAS_SIMILITUD), dtype=np.float64)
+            for k, columna in enumerate(COLUMNAS_SIMILITUD):
+                matriz = matrices_por_seccion.get(columna)
+                if matriz is not None:
+                    similitudes[:, k] = np.asarray(matriz)[indices_1, indices_2]
+                if columna not in tolerancias and columna not in _secciones_sin_tolerancia:
+                    _secciones_sin_tolerancia.add(columna)
+                    logger.warning(f"No existe config de tolerancia para '{columna}'. Usando umbral 0.0.")
+                umbrales[k] = tolerancias.get(columna, 0.0)
+            similitudes = np.round(similitudes, 4)
+
+            ids = np.asarray([int(user_id) for user_id in usuarios], dtype=np.int64)
+            ids_1, ids_2 = ids[indices_1], ids[indices_2]
+            pares = np.column_stack((np.minimum(ids_1, ids_2), np.maximum(ids_1, ids_2)))
+            secciones_similares = (similitudes > umbrales).sum(axis=1).astype(np.int8)
+
+        logger.debug("Proyecto %s%s: %d pares calculados, %d con al menos una sección por encima del umbral.",
+                    project_id, etiqueta, len(pares), int(np.count_nonzero(secciones_similares)))
+        resultados = cls(project_id, pares, similitudes, secciones_similares)
+        if logger_traza.isEnabledFor(logging.DEBUG):
+            resultados.trazar(etiqueta)
+        return resultados
+
+    def contar_con_similitud(self):
+        """Pares con al menos una sección por encima de su umbral."""
+        return int(np.count_nonzero(self.secciones_similares))
+
+    def trazar(self, etiqueta=""):
+        """Una línea por par con la similitud de cada sección (traza de diagnóstico, LOG_TRAZA_PARES)."""
+        for (usuario_1_id, usuario_2_id), similitudes, num_secciones in zip(
+                self.usuarios.tolist(), self.similitudes.tolist(), self.secciones_similares.tolist()):
+            logger_traza.debug("Proyecto %s%s: par (%s, %s) %s -> %d secciones similares", self.project_id, etiqueta,
+                            usuario_1_id, usuario_2_id,
+                            ", ".join(f"{columna}={valor:.4f}" for columna, valor in zip(COLUMNAS_SIMILITUD, similitudes)),
+                            num_secciones)
+
+    def filtrar_por_usuarios(self, usuarios_cambiados):
+        """Conserva solo los pares que incluyen a un usuario cambiado."""
+        cambiados = np.asarray(list(usuarios_cambiados), dtype=np.int64)
+        mascara = np.isin(self.usuarios, cambiados).any(axis=1)
+        return ResultadosComparacion(self.project_id, self.usuarios[mascara], self.similitudes[mascara],
+                                    self.secciones_similares[mascara])
+
+    def a_filas(self, inicio=0, fin=None):
+        """Diccionarios de columnas de los pares [inicio, fin) para el guardado por lotes."""
+        ahora = datetime.utcnow()
+        filas = []
+        for (usuario_1_id, usuario_2_id), similitudes, num_secciones in zip(
+                self.usuarios[inicio:fin].tolist(), self.similitudes[inicio:fin].tolist(),
+                self.secciones_similares[inicio:fin].tolist()):
+            fila = dict(zip(COLUMNAS_SIMILITUD, similitudes))
+            fila.update({
+                'usuario_1_id': usuario_1_id,
+                'usuario_2_id': usuario_2_id,
+                'project_id': self.project_id,
+                'secciones_similares': num_secciones,
+                'similitud_detectada': 1 if num_secciones > 0 else 0,
+                'status_analisis': 1,
+                'created_at': ahora,
+                'updated_at': ahora,
+            })
+            filas.append(fila)
+        return filas
@@ -0,0 +1,229 @@
+import logging
+import os
+import json
+import zlib
+import threading
+from itertools import combinations
+import numpy as np
+
+from services.Almacen_Embeddings import leer_indice_jsonl
+
+logger = logging.getLogger(__name__)
+
+# Primo de Mersenne 2^31 - 1: (a * x + b) mod P cabe en uint64 sin desbordarse
+PRIMO_MINHASH = (1 << 31) - 1
+
+class IndiceMinHash:
+    """
+    Índice MinHash/LSH en disco de los textos lematizados por (reporte_id, sección), para
+    encontrar textos casi duplicados entre proyectos sin comparar todos los pares.
+
+    Cada texto se reduce a su conjunto de shingles (n-gramas de 'tamano_shingle' lemas) y a una
+    firma de 'num_permutaciones' mínimos; la fracción de posiciones iguales entre dos firmas
+    estima su similitud de Jaccard. La firma se divide en 'bandas': dos textos son candidatos
+    si coinciden por completo en al menos una banda.
+
+    Se compone de dos archivos dentro de 'directorio':
+    - 'firmas.bin': matriz (filas x num_permutaciones) uint32, de solo anexado.
+    - 'indice.jsonl': cabecera con los parámetros, seguida de una línea por firma añadida
+    ({"r": reporte_id, "s": seccion, "p": project_id, "h": hash, "f": fila}); "f": -1 indica
+    que la sección quedó vacía y sale del índice. La última línea de cada clave manda.
+
+    Si los parámetros guardados no coinciden con los actuales, el índice se vacía.
+    """
+
+    ARCHIVO_FIRMAS = "firmas.bin"
+    ARCHIVO_INDICE = "indice.jsonl"
+
+    def __init__(self, directorio, num_permutaciones=128, bandas=32, tamano_shingle=3, semilla=1):
+        if num_permutaciones % bandas != 0:
+            raise ValueError("El número de permutaciones debe ser múltiplo del número de bandas.")
+        self.directorio = directorio
+        self.num_permutaciones = num_permutaciones
+        self.bandas = bandas
+        self.filas_por_banda = num_permutaciones // bandas
+        self.tamano_shingle = tamano_shingle
+        self.semilla = semilla
+
+        generador = np.random.RandomState(semilla)
+        self._a = generador.randint(1, PRIMO_MINHASH, size=num_permutaciones).astype(np.uint64)
+        self._b = generador.randint(0, PRIMO_MINHASH, size=num_permutaciones).astype(np.uint64)
+
+        self.entradas = {} # (reporte_id, seccion) -> (hash, fila, project_id)
+        self._claves_por_fila = {} # fila vigente -> (reporte_id, seccion)
+        self._firmas = np.empty((0, num_permutaciones), dtype=np.uint32)
+        self._cubetas = [{} for _ in range(bandas)] # por banda: bytes de la banda -> set(filas)
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+        self._cargar()
+
+    @property
+    def ruta_firmas(self):
+        return os.path.join(self.directorio, self.ARCHIVO_FIRMAS)
+
+    @property
+    def ruta_indice(self):
+        return os.path.join(self.directorio, self.ARCHIVO_INDICE)
+
+    def _parametros(self):
+        return {"permutaciones": self.num_permutaciones, "bandas": self.bandas,
+                "shingle": self.tamano_shingle, "semilla": self.semilla}
+
+    def _cargar(self):
+        if not os.path.exists(self.ruta_indice):
+            return
+        lineas = leer_indice_jsonl(self.ruta_indice)
+
+        cabecera = lineas[0] if lineas else {}
+        if cabecera != self._parametros():
+            logger.info(f"Índice MinHash generado con {cabecera}; se invalida para {self._parametros()}.")
+            self.invalidar()
+            return
+
+        if os.path.exists(self.ruta_firmas):
+            # Recorta una fila incompleta al final (escritura interrumpida) antes de leer, para que
+            # las firmas que se anexen después queden alineadas
+            bytes_fila = self.num_permutaciones * np.dtype(np.uint32).itemsize
+            filas = os.path.getsize(self.ruta_firmas) // bytes_fila
+            if os.path.getsize(self.ruta_firmas) > filas * bytes_fila:
+                logger.warning(f"Fila parcial al final de '{self.ruta_firmas}' (escritura interrumpida); se recorta.")
+                os.truncate(self.ruta_firmas, filas * bytes_fila)
+            datos = np.fromfile(self.ruta_firmas, dtype=np.uint32)
+            self._firmas = datos.reshape(filas, self.num_permutaciones)
+
+        for entrada in lineas[1:]:
+            clave = (entrada["r"], entrada["s"])
+            if entrada["f"] < 0:
+                self.entradas.pop(clave, None)
+            elif entrada["f"] < len(self._firmas):
+                self.entradas[clave] = (entrada["h"], entrada["f"], entrada["p"])
+
+        for clave, (_, fila, _) in self.entradas.items():
+            self._claves_por_fila[fila] = clave
+            self._indexar_fila(fila)
+
+    def _escribir_cabecera(self):
+        with open(self.ruta_indice, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self._parametros()) + "\n")
+
+    def invalidar(self):
+        """Elimina todas las firmas guardadas (por ejemplo, al cambiar los parámetros)."""
+        with self._lock:
+            for ruta in (self.ruta_firmas, self.ruta_indice):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            self.entradas = {}
+            self._claves_por_fila = {}
+            self._firmas = np.empty((0, self.num_permutaciones), dtype=np.uint32)
+            self._cubetas = [{} for _ in range(self.bandas)]
+
+    def calcular_firma(self, texto_lematizado):
+        """Firma MinHash (uint32) del conjunto de shingles del texto, o None si está vacío."""
+        lemas = str(texto_lematizado or "").split()
+        if not lemas:
+            return None
+        n = self.tamano_shingle
+        shingles = {" ".join(lemas[i:i + n]) for i in range(max(1, len(lemas) - n + 1))}
+        valores = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                            dtype=np.uint64, count=len(shingles)) % PRIMO_MINHASH
+        hashes = (np.outer(valores, self._a) + self._b) % PRIMO_MINHASH
+        return hashes.min(axis=0).astype(np.uint32)
+
+    def _claves_banda(self, firma):
+        r = self.filas_por_banda
+        return [firma[banda * r:(banda + 1) * r].tobytes() for banda in range(self.bandas)]
+
+    def _indexar_fila(self, fila):
+        for banda, clave_banda in enumerate(self._claves_banda(self._firmas[fila])):
+            self._cubetas[banda].setdefault(clave_banda, set()).add(fila)
+
+    def _desindexar_fila(self, fila):
+        for banda, clave_banda in enumerate(self._claves_banda(self._firmas[fila])):
+            cubeta = self._cubetas[banda].get(clave_banda)
+            if cubeta is not None:
+                cubeta.discard(fila)
+                if not cubeta:
+                    del self._cubetas[banda][clave_banda]
+        self._claves_por_fila.pop(fila, None)
+
+    def actualizar(self, documentos):
+        """
+        Añade o reemplaza las firmas de una lista de (reporte_id, seccion, project_id, hash, texto_lematizado).
+        Solo se recalculan las entradas nuevas o cuyo hash cambió. Retorna el número de entradas modificadas.
+        """
+        with self._lock:
+            nuevas_claves, nuevas_firmas, lineas = [], [], []
+            for reporte_id, seccion, project_id, texto_hash, texto_lematizado in documentos:
+                clave = (reporte_id, seccion)
+                guardada = self.entradas.get(clave)
+                if guardada is not None and guardada[0] == texto_hash and guardada[2] == project_id:
+                    continue
+                if guardada is not None:
+                    self._desindexar_fila(guardada[1])
+                    del self.entradas[clave]
+
+                firma = self.calcular_firma(texto_lematizado)
+                if firma is None:
+                    if guardada is not None:
+                        lineas.append({"r": reporte_id, "s": seccion, "p": project_id, "h": texto_hash, "f": -1})
+                    continue
+                nuevas_claves.append((clave, project_id, texto_hash))
+                nuevas_firmas.append(firma)
+
+            if not nuevas_firmas and not lineas:
+                return 0
+
+            if not os.path.exists(self.ruta_indice):
+                self._escribir_cabecera()
+            primera_fila = len(self._firmas)
+            if nuevas_firmas:
+                bloque = np.vstack(nuevas_firmas)
+                # Primero las firmas y luego el índice: un índice sin firmas se descarta al cargar
+                with open(self.ruta_firmas, "ab") as f:
+                    f.write(np.ascontiguousarray(bloque).tobytes())
+                self._firmas = np.vstack([self._firmas, bloque])
+
+            for j, (clave, project_id, texto_hash) in enumerate(nuevas_claves):
+                fila = primera_fila + j
+                self.entradas[clave] = (texto_hash, fila, project_id)
+                self._claves_por_fila[fila] = clave
+                self._indexar_fila(fila)
+                lineas.append({"r": clave[0], "s": clave[1], "p": project_id, "h": texto_hash, "f": fila})
+
+            with open(self.ruta_indice, "a", encoding="utf-8") as f:
+                for linea in lineas:
+                    f.write(json.dumps(linea) + "\n")
+            return len(lineas)
+
+    def estimar_jaccard(self, fila_1, fila_2):
+        return float(np.mean(self._firmas[fila_1] == self._firmas[fila_2]))
+
+    def candidatos_entre_proyectos(self, umbral_jaccard=0.5):
+        """
+        Pares de textos de la misma sección y de proyectos distintos que comparten al menos una
+        banda y cuya similitud de Jaccard estimada es >= 'umbral_jaccard'.
+        Retorna una lista de dicts ordenada de mayor a menor similitud estimada.
+        """
+        with self._lock:
+            pares = set()
+            for cubetas_banda in self._cubetas:
+                for filas in cubetas_banda.values():
+                    if len(filas) > 1:
+                        pares.update(combinations(sorted(filas), 2))
+
+            candidatos = []
+            for fila_1, fila_2 in pares:
+                clave_1, clave_2 = self._claves_por_fila[fila_1], self._claves_por_fila[fila_2]
+                project_1, project_2 = self.entradas[clave_1][2], self.entradas[clave_2][2]
+                if clave_1[1] != clave_2[1] or project_1 == project_2:
+                    continue
+                jaccard = self.estimar_jaccard(fila_1, fila_2)
+                if jaccard >= umbral_jaccard:
+                    candidatos.append({
+                        "seccion": clave_1[1],
+                        "reporte_1_id": clave_1[0], "project_1_id": project_1,
+                        "reporte_2_id": clave_2[0], "project_2_id": project_2,
+                        "jaccard_estimado": round(jaccard, 4),
+                    })
+        candidatos.sort(key=lambda c: c["jaccard_estimado"], reverse=True)
+        return candidatos
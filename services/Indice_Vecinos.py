@@ -0,0 +1,234 @@
+import logging
+import os
+import json
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class IndiceVecinosIVF:
+    """
+    Índice aproximado de vecinos más cercanos (estilo IVF) sobre los embeddings del
+    AlmacenEmbeddings, con similitud coseno.
+
+    Los embeddings se reparten en 'num_listas' listas invertidas según su centroide más
+    cercano (k-means esférico); una consulta solo recorre las 'num_sondeos' listas más
+    cercanas en lugar de todo el corpus. Los vectores no se duplican: se leen del memmap
+    del almacén.
+
+    Archivos dentro de 'directorio':
+    - 'centroides.npy': matriz (num_listas x dimensión) float32.
+    - 'asignaciones.bin': lista (int32) de cada fila del almacén, de solo anexado; las filas
+    nuevas del almacén se asignan al sincronizar.
+    - 'cabecera.json': modelo, dimensión y número de listas.
+
+    En memoria se guardan, además, las filas de cada lista y la clave y vigencia de cada fila
+    del almacén, actualizadas de forma incremental: una consulta solo lee las listas sondeadas.
+
+    Mientras no hay filas suficientes para entrenar los centroides, las consultas son exactas.
+    """
+
+    ARCHIVO_CENTROIDES = "centroides.npy"
+    ARCHIVO_ASIGNACIONES = "asignaciones.bin"
+    ARCHIVO_CABECERA = "cabecera.json"
+
+    # Filas por lista necesarias para entrenar y filas leídas por bloque al asignar
+    MINIMO_FILAS_POR_LISTA = 39
+    TAMANO_BLOQUE = 8192
+
+    def __init__(self, almacen, directorio, num_listas=0, num_sondeos=8):
+        self.almacen = almacen
+        self.directorio = directorio
+        self.num_listas_configurado = num_listas
+        self.num_sondeos = num_sondeos
+        self.centroides = None
+        self.asignaciones = np.empty(0, dtype=np.int32)
+        self._filas_por_lista = [] # lista -> arreglo de filas del almacén asignadas
+        self._claves_fila = [] # fila -> (reporte_id, seccion)
+        self._vigentes = np.empty(0, dtype=bool) # fila -> no fue reemplazada por una edición
+        self._fila_por_clave = {} # (reporte_id, seccion) -> fila vigente
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+        self._cargar()
+
+    def _ruta(self, archivo):
+        return os.path.join(self.directorio, archivo)
+
+    def _cargar(self):
+        if not os.path.exists(self._ruta(self.ARCHIVO_CABECERA)):
+            return
+        with open(self._ruta(self.ARCHIVO_CABECERA), "r", encoding="utf-8") as f:
+            cabecera = json.load(f)
+        if cabecera.get("modelo") != self.almacen.nombre_modelo or cabecera.get("dimension") != self.almacen.dimension:
+            logger.info(f"Índice de vecinos generado para '{cabecera.get('modelo')}'; se reconstruirá.")
+            self._borrar_archivos()
+            return
+        self.centroides = np.load(self._ruta(self.ARCHIVO_CENTROIDES))
+        if os.path.exists(self._ruta(self.ARCHIVO_ASIGNACIONES)):
+            self.asignaciones = np.fromfile(self._ruta(self.ARCHIVO_ASIGNACIONES), dtype=np.int32)
+        # Asignaciones de más filas que las del almacén: el almacén se invalidó y volvió a llenarse
+        if len(self.asignaciones) > self.almacen.filas:
+            self._borrar_archivos()
+            return
+        self._registrar_claves()
+        self._filas_por_lista = self._agrupar_por_lista(self.asignaciones, 0)
+
+    def _borrar_archivos(self):
+        for archivo in (self.ARCHIVO_CENTROIDES, self.ARCHIVO_ASIGNACIONES, self.ARCHIVO_CABECERA):
+            if os.path.exists(self._ruta(archivo)):
+                os.remove(self._ruta(archivo))
+        self.centroides = None
+        self.asignaciones = np.empty(0, dtype=np.int32)
+        self._filas_por_lista = []
+
+    def _agrupar_por_lista(self, asignaciones, primera_fila):
+        """
+        Filas (desde 'primera_fila') de cada lista, como un arreglo ordenado por lista. Se omiten
+        las que ya no son vigentes: las reemplazadas por una edición y las escritas sin línea en
+        el índice del almacén (escritura interrumpida), que no tienen clave.
+        """
+        orden = np.argsort(asignaciones, kind="stable")
+        limites = np.cumsum(np.bincount(asignaciones, minlength=len(self.centroides)))[:-1]
+        listas = [filas + primera_fila for filas in np.split(orden.astype(np.int64), limites)]
+        return [filas[self._vigentes[filas]] for filas in listas]
+
+    def _registrar_claves(self):
+        """
+        Lee del almacén las claves de las filas añadidas desde la última vez y marca como no
+        vigentes las filas anteriores de esas claves. Retorna el número de filas conocidas.
+        """
+        inicio = len(self._claves_fila)
+        if inicio > self.almacen.filas:
+            # El almacén se invalidó: las filas cambiaron de número
+            self._claves_fila, self._vigentes, self._fila_por_clave = [], np.empty(0, dtype=bool), {}
+            inicio = 0
+        claves = self.almacen.claves_de_filas(inicio, self.almacen.filas)
+        if not claves:
+            return inicio
+        vigentes = np.ones(len(claves), dtype=bool)
+        reemplazadas = []
+        for j, clave in enumerate(claves):
+            if clave is None:
+                # Fila sin línea en el índice del almacén: nunca es candidata
+                vigentes[j] = False
+                continue
+            anterior = self._fila_por_clave.get(clave)
+            if anterior is not None:
+                if anterior >= inicio:
+                    vigentes[anterior - inicio] = False
+                else:
+                    reemplazadas.append(anterior)
+            self._fila_por_clave[clave] = inicio + j
+        self._vigentes = np.concatenate([self._vigentes, vigentes])
+        self._vigentes[reemplazadas] = False
+        self._claves_fila.extend(claves)
+        return len(self._claves_fila)
+
+    @staticmethod
+    def _normalizar(vectores):
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        return vectores / normas
+
+    def _num_listas(self, num_filas):
+        if self.num_listas_configurado:
+            return self.num_listas_configurado
+        return max(1, int(np.sqrt(num_filas)))
+
+    def entrenar(self, iteraciones=20, max_muestra=50000, semilla=0):
+        """Calcula los centroides con k-means esférico sobre una muestra de las filas vigentes y reasigna todo."""
+        with self._lock:
+            filas_vigentes = sorted(self.almacen.claves_vigentes().keys())
+            num_listas = self._num_listas(len(filas_vigentes))
+            if len(filas_vigentes) < num_listas * self.MINIMO_FILAS_POR_LISTA:
+                return False
+
+            generador = np.random.RandomState(semilla)
+            muestra = filas_vigentes
+            if len(muestra) > max_muestra:
+                muestra = sorted(generador.choice(filas_vigentes, size=max_muestra, replace=False).tolist())
+            datos = self._normalizar(self.almacen.leer_filas(muestra))
+
+            centroides = datos[generador.choice(len(datos), size=num_listas, replace=False)]
+            for _ in range(iteraciones):
+                etiquetas = np.argmax(datos @ centroides.T, axis=1)
+                for lista in range(num_listas):
+                    miembros = datos[etiquetas == lista]
+                    if len(miembros):
+                        centroides[lista] = miembros.sum(axis=0)
+                centroides = self._normalizar(centroides)
+
+            self._borrar_archivos()
+            self.centroides = centroides.astype(np.float32)
+            np.save(self._ruta(self.ARCHIVO_CENTROIDES), self.centroides)
+            with open(self._ruta(self.ARCHIVO_CABECERA), "w", encoding="utf-8") as f:
+                json.dump({"modelo": self.almacen.nombre_modelo, "dimension": self.almacen.dimension,
+                        "listas": num_listas}, f)
+            self._asignar_pendientes()
+            logger.info(f"Índice de vecinos entrenado: {num_listas} listas sobre {len(filas_vigentes)} embeddings.")
+            return True
+
+    def _asignar_pendientes(self):
+        filas_conocidas = self._registrar_claves()
+        nuevas = []
+        for inicio in range(len(self.asignaciones), filas_conocidas, self.TAMANO_BLOQUE):
+            fin = min(inicio + self.TAMANO_BLOQUE, filas_conocidas)
+            bloque = self._normalizar(self.almacen.leer_filas(slice(inicio, fin)))
+            nuevas.append(np.argmax(bloque @ self.centroides.T, axis=1).astype(np.int32))
+        if not nuevas:
+            return 0
+        nuevas = np.concatenate(nuevas)
+        with open(self._ruta(self.ARCHIVO_ASIGNACIONES), "ab") as f:
+            f.write(nuevas.tobytes())
+        agrupadas = self._agrupar_por_lista(nuevas, len(self.asignaciones))
+        if self._filas_por_lista:
+            self._filas_por_lista = [np.concatenate(par) for par in zip(self._filas_por_lista, agrupadas)]
+        else:
+            self._filas_por_lista = agrupadas
+        self.asignaciones = np.concatenate([self.asignaciones, nuevas])
+        return len(nuevas)
+
+    def sincronizar(self):
+        """
+        Asigna a su lista las filas añadidas al almacén desde la última sincronización
+        (inserción incremental). Entrena el índice si aún no tiene centroides y ya hay
+        filas suficientes. Retorna el número de filas asignadas.
+        """
+        if self.centroides is None:
+            return len(self.asignaciones) if self.entrenar() else 0
+        with self._lock:
+            if len(self.asignaciones) > self.almacen.filas:
+                self._borrar_archivos()
+                return 0
+            return self._asignar_pendientes()
+
+    def buscar(self, vector, k=10, filtro=None):
+        """
+        Las 'k' filas vigentes más similares (coseno) al vector, como lista de
+        ((reporte_id, seccion), similitud) de mayor a menor. 'filtro(clave)' opcional
+        descarta claves (por ejemplo, las del mismo proyecto).
+        """
+        consulta = self._normalizar(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            filas_conocidas = self._registrar_claves()
+            if self.centroides is not None and len(self.asignaciones):
+                sondeos = min(self.num_sondeos, len(self.centroides))
+                listas = np.argsort(-(self.centroides @ consulta))[:sondeos]
+                # Filas aún sin asignar (añadidas tras la última sincronización): búsqueda exacta
+                partes = [self._filas_por_lista[lista] for lista in listas]
+                partes.append(np.arange(len(self.asignaciones), filas_conocidas))
+                candidatas = np.sort(np.concatenate(partes))
+            else:
+                candidatas = np.arange(filas_conocidas)
+            candidatas = candidatas[self._vigentes[candidatas]]
+            claves = [self._claves_fila[fila] for fila in candidatas]
+        if filtro is not None:
+            seleccion = [i for i, clave in enumerate(claves) if filtro(clave)]
+            candidatas = candidatas[seleccion]
+            claves = [claves[i] for i in seleccion]
+        if not len(candidatas):
+            return []
+
+        similitudes = self._normalizar(self.almacen.leer_filas(candidatas.tolist())) @ consulta
+        mejores = np.argsort(-similitudes)[:k]
+        return [(claves[i], round(float(similitudes[i]), 4)) for i in mejores]
@@ -0,0 +1,130 @@
+import bisect
+import multiprocessing
+import threading
+import time
+from contextlib import contextmanager
+
+# Etapas del análisis con histograma de duración
+ETAPA_CARGA = "carga_bd"            # Lectura de reportes de la BD
+ETAPA_SPACY = "spacy"               # Lematización con nlp.pipe
+ETAPA_VECTORIZACION = "vectorizacion"  # Conteos de n-gramas, ponderación y normalización
+ETAPA_CODIFICACION = "codificacion"    # SentenceTransformer.encode
+ETAPA_PUNTUACION = "puntuacion"        # Producto de similitudes y conteo de secciones sobre el umbral
+ETAPA_ESCRITURA = "escritura"          # INSERT ... ON DUPLICATE KEY UPDATE y filtrado de reportes
+ETAPAS = (ETAPA_CARGA, ETAPA_SPACY, ETAPA_VECTORIZACION, ETAPA_CODIFICACION, ETAPA_PUNTUACION, ETAPA_ESCRITURA)
+
+# Contadores por tipo de análisis ('sintactico', 'semantico', 'combinado', 'filtro')
+CONTADOR_PROYECTOS = "proyectos"
+CONTADOR_PARES = "pares"
+CONTADOR_SECCIONES = "secciones"
+CONTADOR_SECCIONES_VACIAS = "secciones_vacias"
+CONTADOR_ERRORES = "errores"
+CONTADORES = (CONTADOR_PROYECTOS, CONTADOR_PARES, CONTADOR_SECCIONES, CONTADOR_SECCIONES_VACIAS, CONTADOR_ERRORES)
+
+ANALISIS_SINTACTICO = "sintactico"
+ANALISIS_SEMANTICO = "semantico"
+ANALISIS_COMBINADO = "combinado"
+ANALISIS_FILTRO = "filtro"
+
+PREFIJO = "similitud"
+
+# Límites superiores (segundos) de los buckets de los histogramas; +Inf se agrega al exportar
+LIMITES_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_lock = threading.Lock()
+_histogramas = {}  # etapa -> {"buckets": [n por límite, +Inf], "suma": s, "cuenta": n}
+_contadores = {}   # (nombre, analisis) -> valor
+
+def _histograma_vacio():
+    return {"buckets": [0] * (len(LIMITES_BUCKETS) + 1), "suma": 0.0, "cuenta": 0}
+
+def observar(etapa, segundos):
+    """Registra una duración de 'etapa' en su histograma."""
+    with _lock:
+        histograma = _histogramas.setdefault(etapa, _histograma_vacio())
+        histograma["buckets"][bisect.bisect_left(LIMITES_BUCKETS, segundos)] += 1
+        histograma["suma"] += segundos
+        histograma["cuenta"] += 1
+
+@contextmanager
+def medir(etapa):
+    """Mide la duración del bloque y la registra en el histograma de 'etapa' (también si falla)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(etapa, time.perf_counter() - inicio)
+
+def incrementar(nombre, analisis, valor=1):
+    if not valor:
+        return
+    with _lock:
+        _contadores[(nombre, analisis)] = _contadores.get((nombre, analisis), 0) + valor
+
+def registrar_proyecto(analisis, num_usuarios, num_secciones, num_secciones_vacias):
+    """Cuenta un proyecto calculado con sus pares y secciones (vacías y totales)."""
+    incrementar(CONTADOR_PROYECTOS, analisis)
+    incrementar(CONTADOR_PARES, analisis, num_usuarios * (num_usuarios - 1) // 2)
+    incrementar(CONTADOR_SECCIONES, analisis, num_secciones)
+    incrementar(CONTADOR_SECCIONES_VACIAS, analisis, num_secciones_vacias)
+
+# --- Métricas de los procesos trabajadores ---
+def extraer_metricas_trabajador():
+    """
+    En un proceso trabajador, devuelve lo registrado desde la última llamada (y lo reinicia)
+    para enviarlo con el resultado de la tarea. En el proceso principal retorna None: ahí las
+    métricas ya están en el registro que expone /metrics.
+    """
+    if multiprocessing.parent_process() is None:
+        return None
+    with _lock:
+        instantanea = {"histogramas": dict(_histogramas), "contadores": dict(_contadores)}
+        _histogramas.clear()
+        _contadores.clear()
+    return instantanea
+
+def combinar_metricas(instantanea):
+    """Suma al registro de este proceso las métricas enviadas por un trabajador."""
+    if not instantanea:
+        return
+    with _lock:
+        for etapa, datos in instantanea["histogramas"].items():
+            histograma = _histogramas.setdefault(etapa, _histograma_vacio())
+            histograma["buckets"] = [a + b for a, b in zip(histograma["buckets"], datos["buckets"])]
+            histograma["suma"] += datos["suma"]
+            histograma["cuenta"] += datos["cuenta"]
+        for clave, valor in instantanea["contadores"].items():
+            _contadores[clave] = _contadores.get(clave, 0) + valor
+
+# --- Exportación ---
+def _formatear_numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+def generar_texto_prometheus():
+    """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+    with _lock:
+        histogramas = {etapa: dict(datos, buckets=list(datos["buckets"])) for etapa, datos in _histogramas.items()}
+        contadores = dict(_contadores)
+
+    lineas = [
+        f"# HELP {PREFIJO}_etapa_duracion_segundos Duración de cada etapa del análisis.",
+        f"# TYPE {PREFIJO}_etapa_duracion_segundos histogram",
+    ]
+    for etapa in ETAPAS + tuple(sorted(set(histogramas) - set(ETAPAS))):
+        datos = histogramas.get(etapa, _histograma_vacio())
+        acumulado = 0
+        for limite, cantidad in zip(LIMITES_BUCKETS + ("+Inf",), datos["buckets"]):
+            acumulado += cantidad
+            le = limite if limite == "+Inf" else _formatear_numero(limite)
+            lineas.append(f'{PREFIJO}_etapa_duracion_segundos_bucket{{etapa="{etapa}",le="{le}"}} {acumulado}')
+        lineas.append(f'{PREFIJO}_etapa_duracion_segundos_sum{{etapa="{etapa}"}} {_formatear_numero(datos["suma"])}')
+        lineas.append(f'{PREFIJO}_etapa_duracion_segundos_count{{etapa="{etapa}"}} {datos["cuenta"]}')
+
+    for nombre in CONTADORES:
+        metrica = f"{PREFIJO}_{nombre}_total"
+        lineas.append(f"# HELP {metrica} Total de {nombre.replace('_', ' ')} por tipo de análisis.")
+        lineas.append(f"# TYPE {metrica} counter")
+        for (nombre_contador, analisis), valor in sorted(contadores.items()):
+            if nombre_contador == nombre:
+                lineas.append(f'{metrica}{{analisis="{analisis}"}} {valor}')
+    return "\n".join(lineas) + "\n"
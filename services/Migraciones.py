@@ -0,0 +1,226 @@
+import importlib.util
+import logging
+import os
+import re
+from datetime import datetime
+from sqlalchemy import text, inspect
+
+from config.config import db
+
+logger = logging.getLogger(__name__)
+
+# Registro de las migraciones aplicadas en cada base
+TABLA_VERSIONES = 'schema_migraciones'
+
+# Migraciones versionadas: migraciones/V<numero>_<Nombre>.py con DESCRIPCION y aplicar(conexion)
+DIRECTORIO_MIGRACIONES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migraciones')
+PATRON_MIGRACION = re.compile(r"^V(\d+)_(\w+)\.py$")
+
+# Tablas auxiliares ya confirmadas en este proceso y ausencias ya advertidas
+_tablas_confirmadas = set()
+_ausencias_advertidas = set()
+
+# Claves únicas ya comprobadas en este proceso: (tabla, columnas) -> True/False
+_claves_unicas = {}
+
+def cargar_migraciones(directorio=None):
+    """
+    Lista ordenada por versión de las migraciones del directorio:
+    [{"version": int, "nombre": str, "descripcion": str, "modulo": modulo}, ...].
+    """
+    directorio = directorio or DIRECTORIO_MIGRACIONES
+    migraciones = {}
+    for archivo in sorted(os.listdir(directorio)):
+        coincidencia = PATRON_MIGRACION.match(archivo)
+        if not coincidencia:
+            continue
+        version = int(coincidencia.group(1))
+        if version in migraciones:
+            raise ValueError(f"Versión de migración repetida: {version} ({archivo} y {migraciones[version]['nombre']}).")
+        especificacion = importlib.util.spec_from_file_location(f"migraciones.{archivo[:-3]}", os.path.join(directorio, archivo))
+        modulo = importlib.util.module_from_spec(especificacion)
+        especificacion.loader.exec_module(modulo)
+        migraciones[version] = {"version": version, "nombre": archivo[:-3],
+                                "descripcion": getattr(modulo, "DESCRIPCION", ""), "modulo": modulo}
+    return [migraciones[version] for version in sorted(migraciones)]
+
+def tabla_disponible(nombre):
+    """
+    True si la tabla existe. Las tablas auxiliares que se mantienen al guardar (usuarios_marcados,
+    resumen_proyectos) pueden faltar en bases sin el script o las migraciones actuales: en ese caso
+    el guardado continúa sin mantenerlas y se avisa una sola vez.
+    """
+    if nombre in _tablas_confirmadas:
+        return True
+    if inspect(db.engine).has_table(nombre):
+        _tablas_confirmadas.add(nombre)
+        return True
+    if nombre not in _ausencias_advertidas:
+        _ausencias_advertidas.add(nombre)
+        logger.warning("La tabla '%s' no existe; no se mantendrá al guardar (ver Script_Base_Datos.sql y migraciones/).", nombre)
+    return False
+
+def clave_unica_disponible(tabla, columnas, revisar=False):
+    """
+    True si 'tabla' tiene una clave única exactamente sobre 'columnas'. El guardado por lotes la
+    necesita: sin ella, en MySQL, ON DUPLICATE KEY UPDATE nunca choca e inserta otra copia de cada
+    par. El resultado (también la ausencia) se recuerda en el proceso; con 'revisar' se vuelve a
+    consultar, como al iniciar un análisis global por si la base se migró entretanto.
+    """
+    clave = (tabla, tuple(columnas))
+    if revisar or clave not in _claves_unicas:
+        with db.engine.connect() as conexion:
+            inspector = inspect(conexion)
+            _claves_unicas[clave] = (inspector.has_table(tabla)
+                                    and clave_unica_existente(conexion, tabla, columnas) is not None)
+    return _claves_unicas[clave]
+
+def crear_tabla_versiones(conexion):
+    if not inspect(conexion).has_table(TABLA_VERSIONES):
+        conexion.execute(text(f"""
+            CREATE TABLE {TABLA_VERSIONES} (
+                version INTEGER NOT NULL PRIMARY KEY,
+                nombre VARCHAR(200) NOT NULL,
+                aplicada_en DATETIME NOT NULL
+            )
+        """))
+
+def versiones_aplicadas(conexion):
+    if not inspect(conexion).has_table(TABLA_VERSIONES):
+        return set()
+    return {fila[0] for fila in conexion.execute(text(f"SELECT version FROM {TABLA_VERSIONES}"))}
+
+def migraciones_pendientes(motor=None, directorio=None):
+    motor = motor or db.engine
+    with motor.connect() as conexion:
+        aplicadas = versiones_aplicadas(conexion)
+    return [migracion for migracion in cargar_migraciones(directorio) if migracion["version"] not in aplicadas]
+
+def aplicar_migraciones(hasta=None, motor=None, directorio=None):
+    """
+    Aplica en orden las migraciones pendientes (hasta la versión 'hasta', si se indica), cada una
+    en su propia transacción junto con su registro en 'schema_migraciones'. En MySQL las
+    sentencias DDL confirman implícitamente; por eso cada migración debe poder repetirse (los
+    ayudantes de este módulo omiten lo que ya existe).
+    Retorna {"estado": ..., "mensaje": ..., "aplicadas": [nombres]}.
+    """
+    motor = motor or db.engine
+    aplicadas = []
+    try:
+        with motor.begin() as conexion:
+            crear_tabla_versiones(conexion)
+        for migracion in migraciones_pendientes(motor, directorio):
+            if hasta is not None and migracion["version"] > hasta:
+                break
+            logger.info("Aplicando migración %s: %s", migracion["nombre"], migracion["descripcion"])
+            with motor.begin() as conexion:
+                migracion["modulo"].aplicar(conexion)
+                conexion.execute(
+                    text(f"INSERT INTO {TABLA_VERSIONES} (version, nombre, aplicada_en) VALUES (:version, :nombre, :ahora)"),
+                    {"version": migracion["version"], "nombre": migracion["nombre"], "ahora": datetime.utcnow()})
+            aplicadas.append(migracion["nombre"])
+    except Exception as e:
+        error_msg = f"Error al aplicar las migraciones (aplicadas: {len(aplicadas)}): {e}"
+        logger.exception(error_msg)
+        return {"estado": "error", "mensaje": error_msg, "aplicadas": aplicadas}
+
+    msg_final = f"{len(aplicadas)} migraciones aplicadas." if aplicadas else "La base ya está al día."
+    logger.info(msg_final)
+    return {"estado": "completado", "mensaje": msg_final, "aplicadas": aplicadas}
+
+# --- Ayudantes para las migraciones ---
+def crear_tabla(conexion, tabla):
+    """CREATE TABLE (con sus índices) de un modelo si no existe. Retorna True si se creó."""
+    if inspect(conexion).has_table(tabla.name):
+        logger.info("Tabla '%s' omitida: ya existe.", tabla.name)
+        return False
+    tabla.create(bind=conexion)
+    logger.info("Tabla '%s' creada.", tabla.name)
+    return True
+
+def indice_equivalente(conexion, tabla, nombre, columnas):
+    """
+    Nombre del índice (o clave única/primaria) de 'tabla' que ya sirve como 'columnas': el del
+    mismo nombre o uno cuyas primeras columnas son exactamente 'columnas'. None si no hay.
+    """
+    inspector = inspect(conexion)
+    existentes = [(indice["name"], indice["column_names"]) for indice in inspector.get_indexes(tabla)]
+    existentes += [(unica["name"], unica["column_names"]) for unica in inspector.get_unique_constraints(tabla)]
+    primaria = inspector.get_pk_constraint(tabla)
+    existentes.append((primaria.get("name") or "PRIMARY", primaria.get("constrained_columns") or []))
+    for nombre_existente, columnas_existentes in existentes:
+        if nombre_existente == nombre or list(columnas_existentes[:len(columnas)]) == list(columnas):
+            return nombre_existente
+    return None
+
+def crear_indice(conexion, tabla, nombre, columnas, unico=False):
+    """
+    CREATE INDEX si la tabla existe y no tiene ya un índice equivalente. Las tablas externas al
+    proyecto ('project', 'user') pueden no existir en bases locales: se omiten.
+    Retorna True si se creó.
+    """
+    if not inspect(conexion).has_table(tabla):
+        logger.info("Índice %s omitido: la tabla '%s' no existe.", nombre, tabla)
+        return False
+    existente = indice_equivalente(conexion, tabla, nombre, columnas)
+    if existente:
+        logger.info("Índice %s omitido: '%s' ya cubre (%s).", nombre, existente, ", ".join(columnas))
+        return False
+    tipo = "UNIQUE INDEX" if unico else "INDEX"
+    conexion.execute(text(f"CREATE {tipo} {nombre} ON {tabla} ({', '.join(columnas)})"))
+    logger.info("Índice %s creado en '%s' (%s).", nombre, tabla, ", ".join(columnas))
+    return True
+
+def clave_unica_existente(conexion, tabla, columnas):
+    """
+    Nombre del índice único, restricción única o clave primaria de 'tabla' formado exactamente
+    por 'columnas' (en cualquier orden), que es lo que necesitan ON DUPLICATE KEY UPDATE y
+    ON CONFLICT. None si no hay.
+    """
+    inspector = inspect(conexion)
+    existentes = [(indice["name"], indice["column_names"]) for indice in inspector.get_indexes(tabla)
+                if indice.get("unique")]
+    existentes += [(unica["name"], unica["column_names"]) for unica in inspector.get_unique_constraints(tabla)]
+    primaria = inspector.get_pk_constraint(tabla)
+    existentes.append((primaria.get("name") or "PRIMARY", primaria.get("constrained_columns") or []))
+    for nombre_existente, columnas_existentes in existentes:
+        if set(columnas_existentes) == set(columnas):
+            return nombre_existente
+    return None
+
+def eliminar_duplicados(conexion, tabla, columnas):
+    """
+    Borra las filas repetidas por 'columnas' conservando la de mayor id (la más reciente).
+    MySQL no permite leer en una subconsulta la tabla de la que se borra: se usa DELETE ... JOIN.
+    Retorna el número de filas borradas.
+    """
+    if conexion.dialect.name == "mysql":
+        condicion = " AND ".join(f"c1.{columna} = c2.{columna}" for columna in columnas)
+        sentencia = f"DELETE c1 FROM {tabla} c1 JOIN {tabla} c2 ON {condicion} AND c1.id < c2.id"
+    else:
+        sentencia = f"DELETE FROM {tabla} WHERE id NOT IN (SELECT MAX(id) FROM {tabla} GROUP BY {', '.join(columnas)})"
+    borradas = conexion.execute(text(sentencia)).rowcount
+    if borradas:
+        logger.warning("Tabla '%s': %d filas duplicadas por (%s) eliminadas.", tabla, borradas, ", ".join(columnas))
+    return borradas
+
+def crear_clave_unica(conexion, tabla, nombre, columnas):
+    """
+    Crea el índice único 'nombre' sobre 'columnas' si la tabla existe y aún no tiene una clave
+    única equivalente. Antes elimina las filas duplicadas (si no, el CREATE fallaría).
+    Retorna True si se creó.
+    """
+    if not inspect(conexion).has_table(tabla):
+        logger.info("Clave única %s omitida: la tabla '%s' no existe.", nombre, tabla)
+        return False
+    existente = clave_unica_existente(conexion, tabla, columnas)
+    if existente:
+        logger.info("Clave única %s omitida: '%s' ya es única por (%s).", nombre, existente, ", ".join(columnas))
+        return False
+    eliminar_duplicados(conexion, tabla, columnas)
+    if conexion.dialect.name == "sqlite":
+        # En SQLite los nombres de índice son globales a la base, no por tabla como en MySQL
+        nombre = f"{tabla}_{nombre}"
+    conexion.execute(text(f"CREATE UNIQUE INDEX {nombre} ON {tabla} ({', '.join(columnas)})"))
+    logger.info("Clave única %s creada en '%s' (%s).", nombre, tabla, ", ".join(columnas))
+    return True
@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Registro de modelos NLP: cada modelo se carga en el primer uso (no al importar) y se comparte
+# entre los servicios sintáctico y semántico del mismo proceso.
+
+NOMBRE_MODELO_SPACY = "es_core_news_md"
+NOMBRE_MODELO_SEMANTICO = "paraphrase-multilingual-MiniLM-L12-v2"
+
+# Solo se usan lemma_, is_stop e is_punct: el parser y el NER no son necesarios.
+# El lematizador depende de las etiquetas del morphologizer, por eso este se conserva.
+COMPONENTES_EXCLUIDOS_SPACY = ["parser", "ner"]
+
+_lock = threading.Lock()
+_modelos = {}  # nombre -> modelo cargado (o None si falló la carga)
+
+def _cargar(nombre, cargador):
+    """Carga el modelo una sola vez aunque lo pidan varios hilos a la vez."""
+    if nombre in _modelos:
+        return _modelos[nombre]
+    with _lock:
+        if nombre not in _modelos:
+            inicio = time.time()
+            logger.info(f"Cargando modelo '{nombre}'...")
+            try:
+                _modelos[nombre] = cargador()
+                logger.info(f"Modelo '{nombre}' cargado en {time.time() - inicio:.2f}s.")
+            except Exception as e:
+                logger.exception(f"Error cargando el modelo '{nombre}': {e}")
+                _modelos[nombre] = None
+    return _modelos[nombre]
+
+def _cargar_spacy():
+    import spacy
+    try:
+        return spacy.load(NOMBRE_MODELO_SPACY, exclude=COMPONENTES_EXCLUIDOS_SPACY)
+    except OSError:
+        logger.warning(f"Modelo '{NOMBRE_MODELO_SPACY}' no encontrado. "
+            f"Por favor, descárgalo ejecutando: python -m spacy download {NOMBRE_MODELO_SPACY}")
+        return None
+
+def _cargar_sentence_transformer():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(NOMBRE_MODELO_SEMANTICO)
+
+def obtener_nlp():
+    """Pipeline spaCy compartido (sin parser ni NER), o None si no está disponible."""
+    return _cargar(NOMBRE_MODELO_SPACY, _cargar_spacy)
+
+def obtener_modelo_semantico():
+    """SentenceTransformer compartido, o None si no se pudo cargar."""
+    return _cargar(NOMBRE_MODELO_SEMANTICO, _cargar_sentence_transformer)
+
+def modelos_cargados():
+    """{nombre: True/False} de los modelos que ya se intentaron cargar en este proceso."""
+    return {nombre: modelo is not None for nombre, modelo in _modelos.items()}
+
+def precargar_modelos(sintactico=True, semantico=True):
+    """Carga por adelantado los modelos indicados (por ejemplo, antes de un análisis global)."""
+    if sintactico:
+        obtener_nlp()
+    if semantico:
+        obtener_modelo_semantico()
+    return modelos_cargados()
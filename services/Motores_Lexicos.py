@@ -0,0 +1,231 @@
+import logging
+import hashlib
+import json
+import os
+import re
+import numpy as np
+from sqlalchemy import text
+
+from config.config import db, LEXICO_DIRECTORIO, LEXICO_AMBITO_ESTADISTICAS, BM25_K1, BM25_B
+
+logger = logging.getLogger(__name__)
+
+# Motores de similitud léxica del análisis sintáctico
+MOTOR_CONTEO = "conteo"   # Frecuencias crudas (CountVectorizer), el comportamiento original
+MOTOR_TFIDF = "tfidf"     # Frecuencias ponderadas por la IDF del corpus
+MOTOR_BM25 = "bm25"       # Saturación de frecuencias y normalización por longitud de BM25
+
+# Ámbitos de las frecuencias de documento
+AMBITO_CORPUS = "corpus"       # Todos los reportes
+AMBITO_TEMATICA = "tematica"   # Los reportes de los proyectos de la misma temática
+
+GRUPO_CORPUS = "corpus"
+
+# Mismo token_pattern que usaba el CountVectorizer; los textos se tokenizan una vez por sección
+PATRON_TOKENS = re.compile(r'\b\w+\b')
+
+# Estadísticas cargadas en este proceso: (ambito, ngrama) -> estadísticas
+_estadisticas = {}
+
+# Reportes que entran al análisis: el primero (menor id) de cada usuario en cada proyecto,
+# el mismo que toma Carga_Reportes.iterar_reportes_por_proyecto
+SQL_REPORTES_ANALIZADOS = """
+    SELECT MIN(id) AS id FROM reportes_finales WHERE project_id IS NOT NULL GROUP BY project_id, user_id
+"""
+
+def tokenizar_lemas(texto):
+    """Tokens del texto lematizado, en minúsculas como los obtiene CountVectorizer."""
+    return PATRON_TOKENS.findall(texto.lower()) if texto else []
+
+def extraer_ngramas(tokens, ngrama):
+    """N-gramas de palabras de un orden, unidos por espacio como los genera CountVectorizer."""
+    if ngrama == 1:
+        return tokens
+    return [" ".join(tokens[i:i + ngrama]) for i in range(len(tokens) - ngrama + 1)]
+
+# --- Ponderaciones ---
+def calcular_idf(terminos, estadisticas):
+    """IDF suavizada (la de TfidfVectorizer) de cada término con las frecuencias del corpus."""
+    df = estadisticas["df"]
+    frecuencias = np.fromiter((df.get(termino, 0) for termino in terminos), dtype=np.float64, count=len(terminos))
+    return np.log((1.0 + estadisticas["documentos"]) / (1.0 + frecuencias)) + 1.0
+
+def ponderar_conteo(conteos, terminos, estadisticas):
+    return conteos
+
+def ponderar_tfidf(conteos, terminos, estadisticas):
+    return conteos.multiply(calcular_idf(terminos, estadisticas)[np.newaxis, :]).tocsr()
+
+def ponderar_bm25(conteos, terminos, estadisticas):
+    """
+    Pesos BM25 de cada término de cada documento; la similitud se obtiene después con el
+    coseno de estos vectores, igual que en los otros motores.
+    """
+    df = estadisticas["df"]
+    documentos = estadisticas["documentos"]
+    frecuencias = np.fromiter((df.get(termino, 0) for termino in terminos), dtype=np.float64, count=len(terminos))
+    idf = np.log(1.0 + (documentos - frecuencias + 0.5) / (frecuencias + 0.5))
+
+    ponderados = conteos.tocsr().astype(np.float64)
+    longitudes = np.asarray(ponderados.sum(axis=1)).ravel()
+    longitud_media = estadisticas["longitud_media"] or (longitudes.mean() if len(longitudes) else 1.0)
+    filas = np.repeat(np.arange(ponderados.shape[0]), np.diff(ponderados.indptr))
+    tf = ponderados.data
+    ponderados.data = tf * (BM25_K1 + 1.0) / (tf + BM25_K1 * (1.0 - BM25_B + BM25_B * longitudes[filas] / longitud_media)) \
+        * idf[ponderados.indices]
+    return ponderados
+
+MOTORES = {
+    MOTOR_CONTEO: ponderar_conteo,
+    MOTOR_TFIDF: ponderar_tfidf,
+    MOTOR_BM25: ponderar_bm25,
+}
+
+# Motores que necesitan las frecuencias de documento del corpus
+MOTORES_CON_ESTADISTICAS = (MOTOR_TFIDF, MOTOR_BM25)
+
+def validar_motor(motor):
+    if motor not in MOTORES:
+        raise ValueError(f"Motor léxico desconocido: '{motor}'. Opciones: {', '.join(MOTORES)}")
+    return motor
+
+def usa_estadisticas(motor):
+    return motor in MOTORES_CON_ESTADISTICAS
+
+def ponderar(motor, conteos, terminos, estadisticas=None):
+    """Aplica el motor a la matriz dispersa de conteos (documentos x 'terminos')."""
+    return MOTORES[motor](conteos, terminos, estadisticas)
+
+# --- Frecuencias de documento del corpus ---
+def ruta_estadisticas(ambito, ngrama):
+    return os.path.join(LEXICO_DIRECTORIO, f"estadisticas_{ambito}_{ngrama}.json")
+
+def calcular_firma_corpus(ambito):
+    """
+    Firma del estado de la caché de lemas y de los reportes: si no cambia, las frecuencias
+    guardadas siguen vigentes.
+    """
+    lemas = db.session.execute(text(
+        "SELECT COUNT(*), MAX(id), MAX(updated_at) FROM reportes_lemas_cache")).fetchone()
+    reportes = db.session.execute(text("SELECT COUNT(*), MAX(id) FROM reportes_finales")).fetchone()
+    partes = [ambito] + [str(valor) for valor in tuple(lemas) + tuple(reportes)]
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+def calcular_estadisticas_corpus(ngramas, ambito):
+    """
+    Recorre una sola vez los lemas guardados en caché (sin pasar por spaCy) y cuenta, por grupo
+    (todo el corpus o cada temática) y sección, en cuántos documentos aparece cada n-grama de
+    cada orden, el número de documentos y su longitud media en n-gramas. Solo se cuentan los
+    reportes que entran al análisis (el primero de cada usuario por proyecto).
+    Retorna {ngrama: {"grupos": {...}, "grupo_por_proyecto": {...}}}.
+    """
+    if ambito == AMBITO_TEMATICA:
+        consulta = text(f"""
+            SELECT c.seccion, c.lemas, p.id_thematic
+            FROM reportes_lemas_cache c
+            JOIN ({SQL_REPORTES_ANALIZADOS}) analizados ON analizados.id = c.reporte_id
+            JOIN reportes_finales rf ON rf.id = c.reporte_id
+            JOIN project p ON p.id = rf.project_id
+        """)
+        grupo_por_proyecto = {str(project_id): str(id_thematic) for project_id, id_thematic in db.session.execute(text(
+            "SELECT DISTINCT rf.project_id, p.id_thematic FROM reportes_finales rf JOIN project p ON p.id = rf.project_id"))}
+    else:
+        consulta = text(f"""
+            SELECT c.seccion, c.lemas, NULL
+            FROM reportes_lemas_cache c
+            JOIN ({SQL_REPORTES_ANALIZADOS}) analizados ON analizados.id = c.reporte_id
+        """)
+        grupo_por_proyecto = {}
+
+    resultado = {ngrama: {"grupos": {}, "grupo_por_proyecto": grupo_por_proyecto} for ngrama in ngramas}
+    with db.engine.connect() as conexion:
+        filas = conexion.execution_options(stream_results=True).execute(consulta)
+        for seccion, lemas, grupo in filas:
+            tokens = tokenizar_lemas(lemas)
+            if not tokens:
+                continue
+            grupo = str(grupo) if grupo is not None else GRUPO_CORPUS
+            for ngrama in ngramas:
+                terminos = extraer_ngramas(tokens, ngrama)
+                if not terminos:
+                    continue
+                estadisticas = resultado[ngrama]["grupos"].setdefault(grupo, {}).setdefault(
+                    seccion, {"documentos": 0, "longitud_total": 0, "df": {}})
+                estadisticas["documentos"] += 1
+                estadisticas["longitud_total"] += len(terminos)
+                df = estadisticas["df"]
+                for termino in set(terminos):
+                    df[termino] = df.get(termino, 0) + 1
+
+    for datos in resultado.values():
+        for secciones in datos["grupos"].values():
+            for estadisticas in secciones.values():
+                estadisticas["longitud_media"] = estadisticas.pop("longitud_total") / estadisticas["documentos"]
+    return resultado
+
+def actualizar_estadisticas(ngramas, ambito=None):
+    """
+    Deja cargadas en este proceso (y guardadas en disco para los procesos trabajadores) las
+    frecuencias de documento de cada orden de 'ngramas'. Solo se recalculan si la caché de
+    lemas o los reportes cambiaron desde el último cálculo; si no, se reutiliza el archivo.
+    Se llama en el proceso principal, que es el único con acceso a la BD.
+    """
+    ambito = ambito or LEXICO_AMBITO_ESTADISTICAS
+    firma = calcular_firma_corpus(ambito)
+    pendientes = []
+    for ngrama in ngramas:
+        en_memoria = _estadisticas.get((ambito, ngrama))
+        if en_memoria is not None and en_memoria["firma"] == firma:
+            continue
+        guardadas = leer_estadisticas(ambito, ngrama)
+        if guardadas is not None and guardadas["firma"] == firma:
+            _estadisticas[(ambito, ngrama)] = guardadas
+        else:
+            pendientes.append(ngrama)
+    if not pendientes:
+        return
+
+    logger.info(f"Calculando frecuencias de documento ({ambito}) para n-gramas {pendientes}...")
+    os.makedirs(LEXICO_DIRECTORIO, exist_ok=True)
+    for ngrama, datos in calcular_estadisticas_corpus(pendientes, ambito).items():
+        datos.update({"firma": firma, "ambito": ambito, "ngrama": ngrama})
+        ruta = ruta_estadisticas(ambito, ngrama)
+        with open(ruta + ".tmp", "w", encoding="utf-8") as archivo:
+            json.dump(datos, archivo, ensure_ascii=False)
+        os.replace(ruta + ".tmp", ruta)
+        _estadisticas[(ambito, ngrama)] = datos
+
+def obtener_firma_estadisticas(ngramas, ambito=None):
+    """
+    Firma del corpus con que se calcularon las frecuencias cargadas (por actualizar_estadisticas)
+    de los órdenes de 'ngramas'. Entra en las huellas del análisis incremental: si las frecuencias
+    cambian, cambian los pesos de todos los pares y ningún proyecto puede omitirse.
+    """
+    ambito = ambito or LEXICO_AMBITO_ESTADISTICAS
+    return "|".join(sorted({_estadisticas[(ambito, ngrama)]["firma"] for ngrama in ngramas}))
+
+def leer_estadisticas(ambito, ngrama):
+    ruta = ruta_estadisticas(ambito, ngrama)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No se pudieron leer las frecuencias de documento '{ruta}': {e}", exc_info=True)
+        return None
+
+def obtener_estadisticas_seccion(ngrama, seccion, project_id, ambito=None):
+    """
+    Frecuencias de documento del grupo del proyecto para una sección y un orden de n-grama.
+    En los procesos trabajadores se leen del archivo escrito por actualizar_estadisticas.
+    """
+    ambito = ambito or LEXICO_AMBITO_ESTADISTICAS
+    datos = _estadisticas.get((ambito, ngrama))
+    if datos is None:
+        datos = leer_estadisticas(ambito, ngrama)
+        if datos is None:
+            raise RuntimeError(f"No hay frecuencias de documento calculadas para n-grama {ngrama} ({ambito}).")
+        _estadisticas[(ambito, ngrama)] = datos
+    grupo = datos["grupo_por_proyecto"].get(str(project_id), GRUPO_CORPUS) if ambito == AMBITO_TEMATICA else GRUPO_CORPUS
+    return datos["grupos"].get(grupo, {}).get(seccion, {"documentos": 0, "longitud_media": 0, "df": {}})
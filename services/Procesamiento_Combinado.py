@@ -0,0 +1,161 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.Procesamiento_Similitud import (
+    obtener_tolerancias, preparar_tarea_proyecto, procesar_tarea_proyecto,
+    guardar_resultado_proyecto, obtener_clave_huellas, preprocesar_reportes_pendientes
+)
+from services.Procesamiento_Semantico import (
+    obtener_indice_vecinos, preparar_tarea_proyecto_semantico, procesar_tarea_proyecto_semantico, guardar_resultado_proyecto_semantico
+)
+from services.Analisis_Incremental import TIPO_SEMANTICO, cargar_huellas
+from services.Motores_Lexicos import MOTORES, MOTOR_CONTEO, usa_estadisticas, actualizar_estadisticas
+from services.Modelos_NLP import obtener_nlp, obtener_modelo_semantico
+from services.Carga_Reportes import iterar_reportes_por_proyecto, contar_proyectos
+from services.Resumen_Proyectos import reconstruir_resumen_proyectos
+from services.Metricas import incrementar, CONTADOR_ERRORES, ANALISIS_COMBINADO
+from services.Guardado_Comparaciones import comprobar_claves_unicas
+from models.Comparacion_Similitud import ComparacionSimilitud
+from models.Comparacion_Similitud2 import ComparacionSimilitud as ComparacionSimilitudSemantica
+
+logger = logging.getLogger(__name__)
+
+def analizar_todos_los_proyectos_combinado_service(ngrama_value=1, incremental=False, progreso=None, motor=MOTOR_CONTEO):
+    """
+    Análisis sintáctico y semántico de todos los proyectos en una sola pasada:
+    - Los reportes se leen de la BD en una sola consulta en flujo y cada proyecto alimenta a ambos motores.
+    - El cálculo sintáctico (spaCy y vectorizador) y el semántico (embeddings) corren en dos
+    hilos, uno por motor, de modo que se solapan entre sí y con la lectura del siguiente proyecto.
+    - Este hilo es el único que escribe: lemas, embeddings y ambas tablas de comparación.
+    'progreso(completados, total, pares)' es opcional y se llama al terminar cada proyecto.
+    'motor' es la ponderación léxica del análisis sintáctico ('conteo', 'tfidf' o 'bm25').
+    """
+    logger.info(f"Iniciando el análisis COMBINADO (sintáctico + semántico, N-gramas={ngrama_value}) de todos los proyectos...")
+
+    if motor not in MOTORES:
+        msg = f"Error: Motor léxico desconocido '{motor}'. Opciones: {', '.join(MOTORES)}."
+        logger.error(msg)
+        return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
+
+    msg = comprobar_claves_unicas([ComparacionSimilitud, ComparacionSimilitudSemantica])
+    if msg:
+        logger.error(msg)
+        return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
+
+    tolerancias = obtener_tolerancias()
+    if tolerancias is None:
+        msg = "Error crítico: No se pudieron obtener las tolerancias generales. Abortando análisis combinado."
+        logger.error(msg)
+        return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
+    if not obtener_nlp() or not obtener_modelo_semantico():
+        msg = "Error crítico: Los modelos NLP no están disponibles. Abortando análisis combinado."
+        logger.error(msg)
+        return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
+
+    try:
+        total_proyectos = contar_proyectos()
+        if not total_proyectos:
+            msg = "No se encontraron proyectos con reportes para analizar."
+            logger.info(msg)
+            return {"estado": "completado", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
+
+        tiempo_inicio_total = time.time()
+        estadisticas_sintactico = {"proyectos_omitidos": 0, "pares_analizados": 0, "pares_omitidos": 0}
+        estadisticas_semantico = {"proyectos_omitidos": 0, "pares_analizados": 0, "pares_omitidos": 0}
+        huellas_sintactico = cargar_huellas(*obtener_clave_huellas(ngrama_value, motor=motor)) if incremental else {}
+        huellas_semantico = cargar_huellas(TIPO_SEMANTICO) if incremental else {}
+        proyectos_completados = 0
+        errores = 0
+
+        def pares_resueltos():
+            return sum(e["pares_analizados"] + e["pares_omitidos"] for e in (estadisticas_sintactico, estadisticas_semantico))
+
+        def guardar_proyecto(project_id, futuro_sintactico, futuro_semantico):
+            nonlocal proyectos_completados, errores
+            try:
+                if futuro_sintactico is not None:
+                    guardar_resultado_proyecto(futuro_sintactico.result(), estadisticas_sintactico)
+                if futuro_semantico is not None:
+                    guardar_resultado_proyecto_semantico(futuro_semantico.result(), estadisticas_semantico)
+            except Exception as e:
+                errores += 1
+                incrementar(CONTADOR_ERRORES, ANALISIS_COMBINADO)
+                logger.exception(f"Error en el análisis combinado del proyecto {project_id}: {e}")
+            proyectos_completados += 1
+            if progreso is not None:
+                progreso(proyectos_completados, total_proyectos, pares_resueltos())
+
+        if usa_estadisticas(motor):
+            # Las frecuencias de documento se cuentan sobre la caché de lemas ya completa
+            preprocesar_reportes_pendientes()
+            actualizar_estadisticas((ngrama_value,))
+
+        # Un hilo por motor: cada modelo se usa desde un solo hilo a la vez
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="sintactico") as hilo_sintactico, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantico") as hilo_semantico:
+            anterior = None
+            for i, (project_id, reportes_por_usuario) in enumerate(iterar_reportes_por_proyecto(), 1):
+                logger.debug("Procesando proyecto %d/%d (combinado): ID %s", i, total_proyectos, project_id)
+                try:
+                    tarea_sintactica = preparar_tarea_proyecto(
+                        project_id, tolerancias, ngrama_value,
+                        huellas_sintactico.get(project_id, {}) if incremental else None,
+                        estadisticas_sintactico, reportes_por_usuario=reportes_por_usuario, motor=motor)
+                    tarea_semantica = preparar_tarea_proyecto_semantico(
+                        project_id, tolerancias,
+                        huellas_semantico.get(project_id, {}) if incremental else None,
+                        estadisticas_semantico, reportes_por_usuario=reportes_por_usuario)
+                except Exception as e:
+                    errores += 1
+                    incrementar(CONTADOR_ERRORES, ANALISIS_COMBINADO)
+                    logger.exception(f"Error preparando el proyecto {project_id} (combinado): {e}")
+                    tarea_sintactica = tarea_semantica = None
+                actual = (
+                    project_id,
+                    hilo_sintactico.submit(procesar_tarea_proyecto, tarea_sintactica) if tarea_sintactica else None,
+                    hilo_semantico.submit(procesar_tarea_proyecto_semantico, tarea_semantica) if tarea_semantica else None,
+                )
+                # Mientras los motores calculan este proyecto, se guarda el anterior
+                if anterior is not None:
+                    guardar_proyecto(*anterior)
+                anterior = actual
+            if anterior is not None:
+                guardar_proyecto(*anterior)
+
+        try:
+            obtener_indice_vecinos().sincronizar()
+        except Exception as e_indice:
+            logger.warning(f"No se pudo sincronizar el índice de vecinos semánticos: {e_indice}", exc_info=True)
+
+        # Resumen del listado de todos los proyectos recorridos, también los que no tienen
+        # comparaciones (analizado = 0) y con sus integrantes actuales
+        reconstruir_resumen_proyectos()
+
+        tiempo_total_segundos = time.time() - tiempo_inicio_total
+        horas, resto = divmod(tiempo_total_segundos, 3600)
+        minutos, segundos = divmod(resto, 60)
+        tiempo_total_formateado = f"{int(horas)}h {int(minutos)}m {int(segundos)}s"
+
+        msg_final = (f"Análisis COMBINADO de todos los proyectos ({total_proyectos - errores} de {total_proyectos}) completado. "
+                    f"Pares sintácticos: {estadisticas_sintactico['pares_analizados']}, "
+                    f"pares semánticos: {estadisticas_semantico['pares_analizados']}. "
+                    f"Tiempo total: {tiempo_total_formateado}")
+        logger.info(msg_final)
+        return {
+            "estado": "completado",
+            "mensaje": msg_final,
+            "proyectos_analizados": total_proyectos - errores,
+            "total_proyectos": total_proyectos,
+            "errores": errores,
+            "sintactico": estadisticas_sintactico,
+            "semantico": estadisticas_semantico,
+            "tiempo_total_segundos": round(tiempo_total_segundos, 2),
+            "tiempo_total_formateado": tiempo_total_formateado
+        }
+
+    except Exception as e:
+        error_msg = f"Error durante el análisis combinado de todos los proyectos: {str(e)}"
+        logger.exception(error_msg)
+        incrementar(CONTADOR_ERRORES, ANALISIS_COMBINADO)
+        return {"estado": "error", "mensaje": error_msg, "proyectos_analizados": 0, "tiempo_total": 0}
@@ -1,54 +1,150 @@
+import logging
 import json
 import time
-import traceback
-from flask import current_app
+import queue
 
 # Importar las funciones de servicio de los otros módulos
 from services.Procesamiento_Similitud import analizar_todos_los_proyectos_service as analizar_sintactico
 from services.Procesamiento_Semantico import analizar_todos_los_proyectos_semantico_service as analizar_semantico
 from services.Procesamiento_Filtro import filtrar_y_guardar_reportes_service as filtrar_reportes
+from services.Procesamiento_Combinado import analizar_todos_los_proyectos_combinado_service as analizar_combinado
+from services.Motores_Lexicos import MOTOR_CONTEO
+from services.Trabajos import encolar_trabajo, TrabajoDuplicadoError
+from config.config import SSE_INTERVALO_MINIMO
+
+logger = logging.getLogger(__name__)
 
 def format_sse_event(data):
     """Formatea un diccionario como un evento SSE."""
     return f"data: {json.dumps(data)}\n\n"
 
-def realizar_analisis_completo_sse(app, ngram_value=1):
+def formatear_segundos(segundos):
+    horas, resto = divmod(int(segundos), 3600)
+    minutos, segundos = divmod(resto, 60)
+    return f"{horas}h {minutos}m {segundos}s" if horas else f"{minutos}m {segundos}s"
+
+def construir_evento_progreso(paso_actual, total_pasos, etiqueta, completados, total, pares, segundos):
+    """Evento de progreso dentro de un paso: proyectos completados, pares por segundo y tiempo restante estimado."""
+    pares_por_segundo = round(pares / segundos, 2) if pares is not None and segundos > 0 else None
+    eta_segundos = round(segundos / completados * (total - completados), 1) if completados and total else None
+    mensaje = f"{etiqueta}: {completados}/{total} proyectos"
+    if pares_por_segundo is not None:
+        mensaje += f", {pares_por_segundo:.1f} pares/s"
+    if eta_segundos is not None:
+        mensaje += f", tiempo restante estimado {formatear_segundos(eta_segundos)}"
+    return {
+        "paso_actual": paso_actual, "total_pasos": total_pasos, "estado": "progreso",
+        "progreso_paso": round(completados / total, 4) if total else 0,
+        "proyectos_completados": completados, "total_proyectos": total,
+        "pares_procesados": pares, "pares_por_segundo": pares_por_segundo, "eta_segundos": eta_segundos,
+        "mensaje": mensaje
+    }
+
+def ejecutar_con_progreso(app, funcion, tipo, paso_actual, total_pasos, etiqueta, conflictos=(), **kwargs):
+    """
+    Generador que ejecuta 'funcion(progreso=..., **kwargs)' como un trabajo de tipo 'tipo' de
+    services.Trabajos (visible en /jobs y sujeto a su control de trabajos duplicados) y emite como
+    eventos SSE el progreso que esta reporta, como máximo uno cada SSE_INTERVALO_MINIMO segundos
+    (el último siempre se envía). Retorna el resultado de 'funcion' (usar con 'yield from').
+    Lanza TrabajoDuplicadoError si ya hay un análisis activo que escribe las mismas tablas.
+    """
+    eventos = queue.Queue()
+    salida = {}
+
+    def ejecutar(progreso, **parametros):
+        def progreso_trabajo_y_sse(completados, total, pares=None):
+            progreso(completados, total, pares)
+            eventos.put((completados, total, pares))
+        try:
+            salida["resultado"] = funcion(progreso=progreso_trabajo_y_sse, **parametros)
+            return salida["resultado"]
+        except Exception as e:
+            salida["error"] = e
+            raise
+        finally:
+            eventos.put(None) # Marca de fin
+
+    inicio = time.time()
+    trabajo = encolar_trabajo(app, tipo, ejecutar, conflictos=conflictos, **kwargs)
+    logger.info("Análisis '%s' del flujo SSE encolado como trabajo %s.", tipo, trabajo["id"])
+
+    ultimo_envio = 0.0
+    pendiente = None
+    while True:
+        try:
+            evento = eventos.get(timeout=SSE_INTERVALO_MINIMO)
+        except queue.Empty:
+            evento = ()
+        if evento is None:
+            break
+        if evento:
+            pendiente = evento
+        ahora = time.time()
+        if pendiente and ahora - ultimo_envio >= SSE_INTERVALO_MINIMO:
+            yield format_sse_event(construir_evento_progreso(paso_actual, total_pasos, etiqueta, *pendiente, ahora - inicio))
+            ultimo_envio = ahora
+            pendiente = None
+
+    if pendiente:
+        yield format_sse_event(construir_evento_progreso(paso_actual, total_pasos, etiqueta, *pendiente, time.time() - inicio))
+    if "error" in salida:
+        raise salida["error"]
+    return salida["resultado"]
+
+# Modos del análisis completo: solo sintáctico, o sintáctico y semántico en una sola pasada
+MODO_SINTACTICO = "sintactico"
+MODO_COMBINADO = "combinado"
+
+# Tipo de trabajo de cada modo (el sintáctico es el mismo que encola /iniciar-analisis-global) y tipos
+# con los que comparte tablas de comparación
+TIPO_TRABAJO_COMBINADO = "combinado"
+CONFLICTOS_COMBINADO = ("sintactico", "semantico")
+
+def realizar_analisis_completo_sse(app, ngram_value=1, modo=MODO_SINTACTICO, motor=MOTOR_CONTEO):
     """
     Generador que orquesta la ejecución secuencial de todos los análisis
     y envía eventos de progreso (SSE) al cliente.
     
     Recibe la instancia de la aplicación Flask para crear su propio contexto.
+    Con modo 'combinado', el paso 1 lee cada proyecto una vez y ejecuta a la vez los
+    análisis sintáctico y semántico. 'motor' es la ponderación léxica del análisis sintáctico.
     """
     # Usar la instancia de la aplicación pasada como argumento para crear el contexto.
     with app.app_context():
         total_pasos = 2
+        if modo == MODO_COMBINADO:
+            servicio_analisis, descripcion_analisis = analizar_combinado, "SINTÁCTICO + SEMÁNTICO"
+            tipo_trabajo, conflictos = TIPO_TRABAJO_COMBINADO, CONFLICTOS_COMBINADO
+        else:
+            servicio_analisis, descripcion_analisis = analizar_sintactico, "SINTÁCTICO"
+            tipo_trabajo, conflictos = MODO_SINTACTICO, ()
         try:
             # --- PASO 0: INICIO ---
             yield format_sse_event({
                 "paso_actual": 0, "total_pasos": total_pasos, "estado": "iniciando",
                 "mensaje": "Iniciando proceso de análisis completo..."
             })
-            time.sleep(1)
 
             # --- PASO 1: ANÁLISIS SINTÁCTICO ---
             yield format_sse_event({
-                "paso_actual": 1, "total_pasos": total_pasos, "estado": "procesando",
-                "mensaje": f"Paso 1/2: Ejecutando análisis SINTÁCTICO (N-gramas={ngram_value})..."
+                "paso_actual": 1, "total_pasos": total_pasos, "estado": "procesando", "progreso_paso": 0,
+                "mensaje": f"Paso 1/2: Ejecutando análisis {descripcion_analisis} (N-gramas={ngram_value}, motor={motor})..."
             })
-            resultado_sintactico = analizar_sintactico(ngram_value)
+            resultado_sintactico = yield from ejecutar_con_progreso(app, servicio_analisis, tipo_trabajo, 1, total_pasos,
+                                                                    f"Análisis {descripcion_analisis}", conflictos=conflictos,
+                                                                    ngrama_value=ngram_value, motor=motor)
             # Asumiendo que tus servicios devuelven 'estado' para errores
             if resultado_sintactico.get("estado") == "error":
-                raise Exception(f"Falló el análisis sintáctico: {resultado_sintactico.get('mensaje')}")
+                raise Exception(f"Falló el análisis {descripcion_analisis.lower()}: {resultado_sintactico.get('mensaje')}")
             
             yield format_sse_event({
                 "paso_actual": 1, "total_pasos": total_pasos, "estado": "paso_completado",
                 "mensaje": f"Paso 1/2 completado. {resultado_sintactico.get('mensaje', 'Análisis sintáctico finalizado.')}"
             })
-            time.sleep(1)
 
             # --- PASO 2: FILTRADO DE REPORTES ---
             yield format_sse_event({
-                "paso_actual": 2, "total_pasos": total_pasos, "estado": "procesando",
+                "paso_actual": 2, "total_pasos": total_pasos, "estado": "procesando", "progreso_paso": 0,
                 "mensaje": "Paso 2/2: Filtrando reportes sin similitudes..."
             })
             resultado_filtro = filtrar_reportes()
@@ -59,7 +155,6 @@ def realizar_analisis_completo_sse(app, ngram_value=1):
                 "paso_actual": 2, "total_pasos": total_pasos, "estado": "paso_completado",
                 "mensaje": f"Paso 2/2 completado. {resultado_filtro.get('message', 'Filtrado de reportes finalizado.')}"
             })
-            time.sleep(1)
 
             # --- FINALIZACIÓN ---
             yield format_sse_event({
@@ -67,13 +162,18 @@ def realizar_analisis_completo_sse(app, ngram_value=1):
                 "mensaje": "¡Proceso de análisis y filtrado finalizado con éxito!"
             })
 
+        except TrabajoDuplicadoError as e:
+            logger.warning(f"Análisis completo rechazado: {e}")
+            yield format_sse_event({
+                "paso_actual": 0, "total_pasos": total_pasos, "estado": "error_fatal",
+                "mensaje": str(e), "trabajo_id": e.trabajo_id, "url_estado": f"/jobs/{e.trabajo_id}"
+            })
         except Exception as e:
             error_message = f"Error durante el proceso de análisis: {str(e)}"
-            current_app.logger.error(error_message, exc_info=True)
-            traceback.print_exc()
+            logger.exception(error_message)
             yield format_sse_event({
                 "paso_actual": 0, "total_pasos": total_pasos, "estado": "error_fatal",
                 "mensaje": error_message
             })
         finally:
-            current_app.logger.info("Flujo de análisis y filtrado finalizado.")
+            logger.info("Flujo de análisis y filtrado finalizado.")
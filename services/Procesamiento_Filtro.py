@@ -1,73 +1,155 @@
+import logging
+from datetime import datetime
 from sqlalchemy import text
-from config.config import db
-import traceback
+from config.config import db, FILTRO_MODO_DESTINO
+from services.Metricas import medir, incrementar, ETAPA_ESCRITURA, CONTADOR_ERRORES, ANALISIS_FILTRO
+from services.Usuarios_Marcados import sincronizar_usuarios_marcados, hay_usuarios_marcados
 
-def filtrar_y_guardar_reportes_service():
+logger = logging.getLogger(__name__)
+
+# Destinos del filtro:
+# - 'tabla': copia completa en 'reportes_finales_analisis' (textos incluidos), como antes.
+# - 'ids': solo (reporte_id, user_id, project_id) en 'reportes_finales_analisis_ids'.
+# - 'vista': ninguna copia; la vista 'reportes_finales_analisis_vista' calcula los reportes limpios.
+MODO_TABLA = 'tabla'
+MODO_IDS = 'ids'
+MODO_VISTA = 'vista'
+MODOS_DESTINO = (MODO_TABLA, MODO_IDS, MODO_VISTA)
+
+NOMBRE_VISTA = 'reportes_finales_analisis_vista'
+
+# Condición de reporte "limpio": su usuario no está en 'usuarios_marcados' (búsqueda por clave primaria)
+SIN_MARCA = "NOT EXISTS (SELECT 1 FROM usuarios_marcados um WHERE um.user_id = rf.user_id)"
+
+# Paso 1 (modo 'tabla'): quitar los reportes cuyo usuario quedó marcado, los que ya no existen
+# en 'reportes_finales' y los que cambiaron desde la copia (se vuelven a insertar en el paso 2).
+SQL_ELIMINAR_TABLA = """
+    DELETE FROM reportes_finales_analisis
+    WHERE EXISTS (SELECT 1 FROM usuarios_marcados um WHERE um.user_id = reportes_finales_analisis.user_id)
+       OR NOT EXISTS (SELECT 1 FROM reportes_finales rf
+                      WHERE rf.id = reportes_finales_analisis.id
+                        AND rf.user_id = reportes_finales_analisis.user_id
+                        AND (rf.updated_at IS NULL OR rf.updated_at <= reportes_finales_analisis.updated_at))
+"""
+
+# Paso 2 (modo 'tabla'): copiar solo los reportes limpios que faltan
+SQL_INSERTAR_TABLA = f"""
+    INSERT INTO reportes_finales_analisis (
+        id, user_id, project_id, thematic_id, subtematica_id, introduccion,
+        marcoteorico, metodo, resultados, discusion, conclusiones,
+        nombre_reporte, revisor_id, status, calificacion_final, created_at, updated_at
+    )
+    SELECT
+        rf.id, rf.user_id, rf.project_id, rf.thematic_id, rf.subtematica_id, rf.introduccion,
+        rf.marcoteorico, rf.metodo, rf.resultados, rf.discusion, rf.conclusiones,
+        rf.nombre_reporte,
+        0, -- Valor fijo para revisor_id
+        0, -- Valor fijo para status
+        0, -- Valor fijo para calificacion_final
+        rf.created_at,
+        rf.updated_at
+    FROM reportes_finales rf
+    WHERE {SIN_MARCA}
+      AND NOT EXISTS (SELECT 1 FROM reportes_finales_analisis rfa WHERE rfa.id = rf.id)
+"""
+
+# Modo 'ids': mismas diferencias, sin textos
+SQL_ELIMINAR_IDS = """
+    DELETE FROM reportes_finales_analisis_ids
+    WHERE EXISTS (SELECT 1 FROM usuarios_marcados um WHERE um.user_id = reportes_finales_analisis_ids.user_id)
+       OR NOT EXISTS (SELECT 1 FROM reportes_finales rf
+                      WHERE rf.id = reportes_finales_analisis_ids.reporte_id
+                        AND rf.user_id = reportes_finales_analisis_ids.user_id)
+"""
+
+SQL_INSERTAR_IDS = f"""
+    INSERT INTO reportes_finales_analisis_ids (reporte_id, user_id, project_id, created_at)
+    SELECT rf.id, rf.user_id, rf.project_id, :ahora
+    FROM reportes_finales rf
+    WHERE {SIN_MARCA}
+      AND NOT EXISTS (SELECT 1 FROM reportes_finales_analisis_ids rfa WHERE rfa.reporte_id = rf.id)
+"""
+
+SQL_VISTA = f"""
+    {{crear}} {NOMBRE_VISTA} AS
+    SELECT rf.id, rf.user_id, rf.project_id, rf.thematic_id, rf.subtematica_id, rf.nombre_reporte,
+           rf.created_at, rf.updated_at
+    FROM reportes_finales rf
+    WHERE {SIN_MARCA}
+"""
+
+def asegurar_usuarios_marcados():
+    """
+    Si 'usuarios_marcados' está vacía (base recién migrada o comparaciones guardadas antes de
+    mantenerla), la llena una vez desde 'comparacion_similitud'. Después la mantiene el guardado.
+    """
+    if not hay_usuarios_marcados():
+        marcados, _ = sincronizar_usuarios_marcados()
+        db.session.commit()
+        logger.info("Conjunto de usuarios marcados inicializado con %d usuarios.", marcados)
+
+def crear_vista_filtro():
+    if db.engine.dialect.name == "sqlite":
+        crear = "CREATE VIEW IF NOT EXISTS"
+    else:
+        crear = "CREATE OR REPLACE VIEW"
+    db.session.execute(text(SQL_VISTA.format(crear=crear)))
+    db.session.commit()
+
+def filtrar_y_guardar_reportes_service(modo=None):
     """
-    Filtra los reportes de usuarios sin similitudes detectadas desde 'reportes_finales'
-    y los guarda en 'reportes_finales_analisis'.
-    
-    La operación consiste en dos pasos:
-    1. Vaciar la tabla de destino ('reportes_finales_analisis') para empezar de cero.
-    2. Insertar los nuevos registros filtrados.
-    
+    Mantiene los reportes de usuarios sin similitudes detectadas en el destino del filtro
+    ('modo': 'tabla', 'ids' o 'vista'; por defecto FILTRO_MODO_DESTINO).
+
+    Solo se aplican las diferencias respecto a la ejecución anterior, apoyándose en
+    'usuarios_marcados', que se actualiza al guardar las comparaciones:
+    1. Eliminar del destino los reportes marcados, desaparecidos o modificados.
+    2. Insertar los reportes limpios que faltan.
+    Cada paso se confirma por separado para no retener bloqueos durante toda la operación; si
+    se interrumpe entre ambos, la siguiente ejecución completa lo que falte.
+
     Retorna un diccionario con el estado de la operación.
     """
-    # from flask import current_app # Descomentar para usar el logger de Flask
-
-    # Consulta para vaciar la tabla de destino.
-    # Esto asegura que cada vez que se filtra, se obtiene un conjunto de datos fresco.
-    sql_delete_query = text("DELETE FROM reportes_finales_analisis;")
-
-    # Consulta para seleccionar los reportes de usuarios "limpios" e insertarlos.
-    # Nota: Se ha simplificado la subconsulta 'WHERE' para mayor claridad y eficiencia.
-    sql_insert_query = text("""
-        INSERT INTO reportes_finales_analisis (
-            id, user_id, project_id, thematic_id, subtematica_id, introduccion,
-            marcoteorico, metodo, resultados, discusion, conclusiones,
-            nombre_reporte, revisor_id, status, calificacion_final, created_at, updated_at
-        )
-        SELECT
-            rf.id, rf.user_id, rf.project_id, rf.thematic_id, rf.subtematica_id, rf.introduccion,
-            rf.marcoteorico, rf.metodo, rf.resultados, rf.discusion, rf.conclusiones,
-            rf.nombre_reporte,
-            0, -- Valor fijo para revisor_id
-            0, -- Valor fijo para status
-            0, -- Valor fijo para calificacion_final
-            rf.created_at, 
-            rf.updated_at
-        FROM reportes_finales rf
-        WHERE rf.user_id NOT IN (
-            -- Subconsulta para obtener todos los IDs de usuarios con similitud detectada
-            SELECT usuario_1_id FROM comparacion_similitud WHERE similitud_detectada = 1
-            UNION
-            SELECT usuario_2_id FROM comparacion_similitud WHERE similitud_detectada = 1
-        );
-    """)
-    
+    modo = modo or FILTRO_MODO_DESTINO
+    if modo not in MODOS_DESTINO:
+        message = f"Modo de destino del filtro no válido: '{modo}'. Opciones: {', '.join(MODOS_DESTINO)}."
+        logger.error(message)
+        return {"status": "error", "message": message}
+
     try:
-        # Usar db.session.execute para ejecutar las consultas
-        with db.session.begin(): # Usar una transacción para asegurar que ambas operaciones se completen o ninguna
-            # Paso 1: Vaciar la tabla
-            db.session.execute(sql_delete_query)
-            print("Tabla 'reportes_finales_analisis' vaciada correctamente.")
-            # current_app.logger.info("Tabla 'reportes_finales_analisis' vaciada.")
-
-            # Paso 2: Insertar los nuevos datos filtrados
-            result = db.session.execute(sql_insert_query)
-        
-        # db.session.commit() # No es necesario si se usa with db.session.begin()
-        
-        message = f"¡Éxito! Se filtraron e insertaron {result.rowcount} reportes en la tabla de análisis."
-        print(message)
-        # current_app.logger.info(message)
-        
-        return {"status": "success", "message": message, "rows_affected": result.rowcount}
+        with medir(ETAPA_ESCRITURA):
+            asegurar_usuarios_marcados()
+
+            if modo == MODO_VISTA:
+                crear_vista_filtro()
+                message = f"Vista '{NOMBRE_VISTA}' lista: los reportes filtrados se calculan al consultarla."
+                logger.info(message)
+                return {"status": "success", "message": message, "rows_affected": 0,
+                        "insertados": 0, "eliminados": 0, "modo": modo}
+
+            if modo == MODO_TABLA:
+                sql_eliminar, sql_insertar, parametros = SQL_ELIMINAR_TABLA, SQL_INSERTAR_TABLA, {}
+            else:
+                sql_eliminar, sql_insertar, parametros = SQL_ELIMINAR_IDS, SQL_INSERTAR_IDS, {"ahora": datetime.utcnow()}
+
+            # Paso 1: Quitar lo que ya no corresponde
+            eliminados = db.session.execute(text(sql_eliminar)).rowcount
+            db.session.commit()
+
+            # Paso 2: Agregar los reportes limpios que faltan
+            insertados = db.session.execute(text(sql_insertar), parametros).rowcount
+            db.session.commit()
+
+        message = (f"¡Éxito! Filtro actualizado ({modo}): {insertados} reportes agregados "
+                f"y {eliminados} retirados de la tabla de análisis.")
+        logger.info(message)
+
+        return {"status": "success", "message": message, "rows_affected": insertados + eliminados,
+                "insertados": insertados, "eliminados": eliminados, "modo": modo}
 
     except Exception as e:
-        db.session.rollback() # Revertir cambios en caso de error
+        db.session.rollback() # Revertir el paso en curso en caso de error
+        incrementar(CONTADOR_ERRORES, ANALISIS_FILTRO)
         error_message = f"Ocurrió un error durante la operación de filtrado: {e}"
-        print(error_message)
-        traceback.print_exc()
-        # current_app.logger.error(error_message, exc_info=True)
-        return {"status": "error", "message": error_message}
\ No newline at end of file
+        logger.exception(error_message)
+        return {"status": "error", "message": error_message}
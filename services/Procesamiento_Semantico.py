@@ -1,37 +1,34 @@
-import pandas as pd
-import spacy
+import logging
 import numpy as np
-from itertools import combinations
-from sentence_transformers import SentenceTransformer, util as sentence_util
 import time
-import traceback
-from sqlalchemy import or_, distinct # distinct para obtener project_id únicos
-from datetime import datetime
 
 # Modelos de la base de datos
 from models.Reportes_Finales import ReportesFinales
 from models.Tolerancia_Porcentajes import ToleranciasPorcentajes
 from models.Comparacion_Similitud2 import ComparacionSimilitud as ComparacionSimilitudSemantica 
-from config.config import db
-
-# Carga de modelos NLP
-print("Cargando modelo spaCy 'es_core_news_md' para análisis semántico (si es necesario para preprocesamiento)...")
-try:
-    nlp_spacy = spacy.load("es_core_news_md")
-    print("Modelo spaCy 'es_core_news_md' cargado exitosamente.")
-except OSError:
-    print("Error: Modelo de spaCy 'es_core_news_md' no encontrado. "
-        "Por favor, descárgalo ejecutando: python -m spacy download es_core_news_md")
-    nlp_spacy = None
-
-print("Cargando modelo SentenceTransformer 'paraphrase-multilingual-MiniLM-L12-v2' para análisis semántico...")
-try:
-    model_sentence_transformer = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-    print("Modelo SentenceTransformer 'paraphrase-multilingual-MiniLM-L12-v2' cargado exitosamente.")
-except Exception as e:
-    print(f"Error cargando el modelo SentenceTransformer 'paraphrase-multilingual-MiniLM-L12-v2': {e}")
-    traceback.print_exc()
-    model_sentence_transformer = None
+from services.Almacen_Embeddings import AlmacenEmbeddings
+from services.Indice_Vecinos import IndiceVecinosIVF
+from services.Modelos_NLP import NOMBRE_MODELO_SEMANTICO, obtener_modelo_semantico
+from services.Registro import configurar_registro
+from services.Guardado_Comparaciones import (
+    construir_fila_comparacion, guardar_comparaciones_lote, comprobar_claves_unicas, ResultadosComparacion
+)
+from services.Ejecucion_Paralela import ejecutar_proyectos_en_paralelo
+from services.Metricas import (
+    medir, incrementar, registrar_proyecto, extraer_metricas_trabajador, combinar_metricas,
+    ETAPA_CODIFICACION, ETAPA_PUNTUACION, CONTADOR_ERRORES, ANALISIS_SEMANTICO
+)
+from services.Carga_Reportes import iterar_reportes_por_proyecto, contar_proyectos
+from services.Resumen_Proyectos import reconstruir_resumen_proyectos
+from services.Analisis_Incremental import (
+    TIPO_SEMANTICO, PLAN_OMITIR, PLAN_COMPLETO, PLAN_PARCIAL, calcular_huellas_proyecto, cargar_huellas,
+    planificar_proyecto, contar_pares, guardar_huellas_proyecto,
+    eliminar_comparaciones_obsoletas
+)
+from config.config import (db, SEMANTICO_BATCH_SIZE, EMBEDDINGS_DIRECTORIO, EMBEDDINGS_DTYPE, ANALISIS_NUM_PROCESOS,
+                        VECINOS_DIRECTORIO, VECINOS_NUM_LISTAS, VECINOS_NUM_SONDEOS)
+
+logger = logging.getLogger(__name__)
 
 def obtener_tolerancias_semantico():
     try:
@@ -41,248 +38,458 @@ def obtener_tolerancias_semantico():
             seccion_normalizada = registro.seccion.strip().lower()
             tolerancias_dict[seccion_normalizada] = registro.tolerancia
         if not tolerancias_dict:
-            print("Advertencia (Semántico): No se encontraron registros de tolerancia en la base de datos.")
+            logger.warning("(Semántico) No se encontraron registros de tolerancia en la base de datos.")
         return tolerancias_dict
     except Exception as e:
-        print(f"Error obteniendo tolerancias (Semántico) desde la base de datos: {str(e)}")
-        traceback.print_exc()
+        logger.exception(f"Error obteniendo tolerancias (Semántico) desde la base de datos: {str(e)}")
         return None
 
 def insertar_o_actualizar_comparacion_semantica(usuario_1_id, usuario_2_id, project_id, 
-                                            similitudes_dict, secciones_similares_count):
+                                    similitudes_dict, secciones_similares_count):
     """
-    Inserta o actualiza un registro de comparación de similitud semántica
-    en la tabla 'comparacion_similitud2'.
+    Inserta o actualiza una sola comparación en 'comparacion_similitud2'.
+    Los análisis por proyecto usan directamente guardar_comparaciones_lote.
     """
-    # from flask import current_app # Para logging
-    try:
-        u1_id = int(usuario_1_id)
-        u2_id = int(usuario_2_id)
-        proj_id = int(project_id)
-        num_secciones_similares = int(secciones_similares_count)
-
-        sim_introduccion = float(similitudes_dict.get('introduccion', 0.0))
-        sim_marcoteorico = float(similitudes_dict.get('marcoteorico', 0.0))
-        sim_metodo = float(similitudes_dict.get('metodo', 0.0))
-        sim_resultados = float(similitudes_dict.get('resultados', 0.0))
-        sim_discusion = float(similitudes_dict.get('discusion', 0.0))
-        sim_conclusiones = float(similitudes_dict.get('conclusiones', 0.0))
-        similitud_detectada_flag = 1 if num_secciones_similares > 0 else 0
-        
-        if u2_id == 0: 
-            id_menor = u1_id
-            id_mayor = 0 
-        else:
-            id_menor = min(u1_id, u2_id)
-            id_mayor = max(u1_id, u2_id)
-
-        registro_existente = ComparacionSimilitudSemantica.query.filter(
-            ComparacionSimilitudSemantica.project_id == proj_id,
-            ComparacionSimilitudSemantica.usuario_1_id == id_menor,
-            ComparacionSimilitudSemantica.usuario_2_id == id_mayor
-        ).first()
-
-        if registro_existente:
-            print(f"Actualizando registro semántico existente para proyecto {proj_id}, usuarios ({u1_id}, {u2_id}) -> normalizados ({id_menor}, {id_mayor})")
-            registro_existente.introduccion = sim_introduccion
-            registro_existente.marcoteorico = sim_marcoteorico
-            registro_existente.metodo = sim_metodo
-            registro_existente.resultados = sim_resultados
-            registro_existente.discusion = sim_discusion
-            registro_existente.conclusiones = sim_conclusiones
-            registro_existente.secciones_similares = num_secciones_similares
-            registro_existente.similitud_detectada = similitud_detectada_flag
-            registro_existente.status_analisis = 1 
-            registro_existente.updated_at = datetime.utcnow()
-        else:
-            print(f"Creando nuevo registro semántico para proyecto {proj_id}, usuarios ({u1_id}, {u2_id}) -> normalizados ({id_menor}, {id_mayor})")
-            nuevo_registro = ComparacionSimilitudSemantica(
-                usuario_1_id=id_menor,
-                usuario_2_id=id_mayor,
-                project_id=proj_id,
-                introduccion=sim_introduccion,
-                marcoteorico=sim_marcoteorico,
-                metodo=sim_metodo,
-                resultados=sim_resultados,
-                discusion=sim_discusion,
-                conclusiones=sim_conclusiones,
-                secciones_similares=num_secciones_similares,
-                similitud_detectada=similitud_detectada_flag,
-                status_analisis=1
-            )
-            db.session.add(nuevo_registro)
-            
-        db.session.commit()
-        print(f"Comparación semántica para proyecto {proj_id}, usuarios ({u1_id}, {u2_id}) guardada/actualizada.")
+    fila = construir_fila_comparacion(usuario_1_id, usuario_2_id, project_id,
+                                    similitudes_dict, secciones_similares_count)
+    guardar_comparaciones_lote(ComparacionSimilitudSemantica, [fila])
 
-    except Exception as e:
-        db.session.rollback()
-        error_msg = f"Error al interactuar con la BD (comparacion_similitud2): {str(e)}"
-        print(error_msg)
-        traceback.print_exc()
+# Secciones de los reportes que se comparan
+COLUMNAS_SECCIONES = ['introduccion', 'marcoteorico', 'metodo', 'resultados', 'discusion', 'conclusiones']
+
+def texto_valido_semantico(texto):
+    return bool(texto) and bool(str(texto).strip())
 
-def analizar_proyecto_semantico(project_id_param, tolerancias_externas=None):
-    if not model_sentence_transformer:
+# Almacén persistente de embeddings; se crea al primer uso
+almacen_embeddings = None
+
+def obtener_almacen_embeddings():
+    global almacen_embeddings
+    if almacen_embeddings is None:
+        almacen_embeddings = AlmacenEmbeddings(EMBEDDINGS_DIRECTORIO, NOMBRE_MODELO_SEMANTICO, dtype=EMBEDDINGS_DTYPE)
+    return almacen_embeddings
+
+# Índice de vecinos aproximados sobre el almacén; se crea al primer uso
+indice_vecinos = None
+
+def obtener_indice_vecinos():
+    global indice_vecinos
+    if indice_vecinos is None:
+        indice_vecinos = IndiceVecinosIVF(obtener_almacen_embeddings(), VECINOS_DIRECTORIO,
+                                        num_listas=VECINOS_NUM_LISTAS, num_sondeos=VECINOS_NUM_SONDEOS)
+    return indice_vecinos
+
+def buscar_secciones_similares(reporte_id, seccion, k=10, solo_otros_proyectos=True):
+    """
+    Las 'k' secciones del corpus (de cualquier reporte con embedding en el almacén) más
+    similares semánticamente a la sección indicada, usando el índice de vecinos aproximados.
+    """
+    if seccion not in COLUMNAS_SECCIONES:
+        return {"status": "error_seccion", "message": f"Sección no válida: '{seccion}'."}
+    reporte = ReportesFinales.query.get(reporte_id)
+    if reporte is None:
+        return {"status": "error_reporte", "message": f"No existe el reporte {reporte_id}."}
+    texto = getattr(reporte, seccion, "")
+    if not texto_valido_semantico(texto):
+        return {"status": "skip_seccion_vacia", "message": f"La sección '{seccion}' del reporte {reporte_id} está vacía."}
+
+    # Reutiliza el embedding guardado o lo calcula y lo añade al almacén
+    vector = obtener_almacen_embeddings().obtener_o_calcular([(reporte.id, seccion, texto)], codificar_textos)[0]
+    indice = obtener_indice_vecinos()
+    indice.sincronizar()
+
+    # project_id se consulta solo para los reportes candidatos (IN (...)); si el filtro por
+    # proyecto deja menos de k vecinos, se repite la búsqueda con más candidatos.
+    proyectos = {reporte.id: reporte.project_id}
+    def otro_reporte(clave):
+        return clave[0] != reporte.id
+
+    vecinos = []
+    tamano = k
+    while True:
+        candidatos = indice.buscar(vector, k=tamano, filtro=otro_reporte)
+        pendientes = {vecino_id for (vecino_id, _), _ in candidatos} - set(proyectos)
+        if pendientes:
+            proyectos.update(db.session.query(ReportesFinales.id, ReportesFinales.project_id)
+                            .filter(ReportesFinales.id.in_(pendientes)).all())
+        vecinos = [vecino for vecino in candidatos
+                if not solo_otros_proyectos or proyectos.get(vecino[0][0]) != reporte.project_id][:k]
+        if len(vecinos) >= k or len(candidatos) < tamano:
+            break
+        tamano *= 4
+    return {"status": "success", "reporte_id": reporte.id, "seccion": seccion, "project_id": reporte.project_id,
+            "vecinos": [{"reporte_id": vecino_id, "seccion": vecino_seccion, "project_id": proyectos.get(vecino_id),
+                        "similitud": similitud}
+                        for (vecino_id, vecino_seccion), similitud in vecinos]}
+
+def codificar_textos(textos, batch_size=None):
+    """Codifica una lista de textos en una sola llamada batched a 'encode' (matriz numpy)."""
+    with medir(ETAPA_CODIFICACION):
+        return obtener_modelo_semantico().encode(textos, batch_size=batch_size or SEMANTICO_BATCH_SIZE,
+                                                convert_to_numpy=True)
+
+def construir_entradas_semanticas(reportes_por_usuario, usuarios, columnas_secciones):
+    """
+    Lista de textos no vacíos del proyecto como (reporte_id, seccion, texto_crudo), junto con
+    la (seccion, posición del usuario) de cada uno.
+    """
+    entradas = []
+    posiciones = []
+    for seccion_nombre in columnas_secciones:
+        for posicion, user_id in enumerate(usuarios):
+            reporte = reportes_por_usuario[user_id]
+            texto = getattr(reporte, seccion_nombre, "")
+            if texto_valido_semantico(texto):
+                entradas.append((reporte.id, seccion_nombre, str(texto)))
+                posiciones.append((seccion_nombre, posicion))
+    return entradas, posiciones
+
+def calcular_matrices_semanticas(num_usuarios, posiciones, embeddings, columnas_secciones):
+    """
+    Obtiene las similitudes del proyecto con un 'cos_sim' por sección, solo entre los textos de
+    esa sección, y devuelve una matriz n x n por sección (en el orden de los usuarios). Las
+    celdas de textos vacíos quedan en 0.0.
+    """
+    num_secciones = num_usuarios * len(columnas_secciones)
+    registrar_proyecto(ANALISIS_SEMANTICO, num_usuarios, num_secciones, num_secciones - len(posiciones))
+    matrices_por_seccion = {seccion_nombre: np.zeros((num_usuarios, num_usuarios), dtype=np.float64)
+                            for seccion_nombre in columnas_secciones}
+    if len(posiciones) < 2:
+        return matrices_por_seccion
+
+    from sentence_transformers import util as sentence_util
+    with medir(ETAPA_PUNTUACION):
+        for seccion_nombre in columnas_secciones:
+            indices = [k for k, (seccion, _) in enumerate(posiciones) if seccion == seccion_nombre]
+            if len(indices) < 2:
+                continue
+            usuarios_seccion = [posiciones[k][1] for k in indices]
+            embeddings_seccion = embeddings[indices]
+            similitudes = sentence_util.cos_sim(embeddings_seccion, embeddings_seccion).cpu().numpy()
+            matrices_por_seccion[seccion_nombre][np.ix_(usuarios_seccion, usuarios_seccion)] = similitudes
+    return matrices_por_seccion
+
+def agrupar_reportes_por_usuario(reportes):
+    reportes_por_usuario = {}
+    for reporte in reportes:
+        if reporte.user_id not in reportes_por_usuario:
+            reportes_por_usuario[reporte.user_id] = reporte
+    return reportes_por_usuario
+
+def registrar_resumen_proyecto_semantico(project_id, num_usuarios, comparaciones):
+    """Una línea por proyecto con los pares guardados y los que tienen alguna sección similar."""
+    logger.info("Proyecto %s (Semántico): %d usuarios, %d pares guardados (%d con similitud).", project_id,
+                num_usuarios, len(comparaciones), comparaciones.contar_con_similitud())
+
+def registrar_proyecto_un_integrante_semantico(project_id, user_id):
+    logger.debug("El proyecto %s (Semántico) tiene solo un integrante (%s). Registrando con 0%% de similitud.", project_id, user_id)
+    insertar_o_actualizar_comparacion_semantica(
+        usuario_1_id=user_id,
+        usuario_2_id=0, 
+        project_id=project_id,
+        similitudes_dict={col: 0.0 for col in COLUMNAS_SECCIONES},
+        secciones_similares_count=0
+    )
+
+def finalizar_proyecto_incremental_semantico(project_id, plan, huellas_actuales):
+    """Tras guardar las comparaciones: limpia pares de exintegrantes y registra las huellas actuales."""
+    if plan == PLAN_COMPLETO:
+        eliminar_comparaciones_obsoletas(ComparacionSimilitudSemantica, project_id, huellas_actuales.keys())
+    guardar_huellas_proyecto(TIPO_SEMANTICO, 0, project_id, huellas_actuales)
+
+def analizar_proyecto_semantico(project_id_param, tolerancias_externas=None, huellas_previas=None, reportes_por_usuario=None):
+    """
+    Analiza semánticamente los pares del proyecto. Con 'huellas_previas' (modo incremental) se
+    omite el proyecto si nada cambió, o se guardan solo los pares que tocan un reporte modificado.
+    'reportes_por_usuario' evita volver a consultar los reportes si el llamador ya los leyó.
+    """
+    if not obtener_modelo_semantico():
         error_msg = "Error crítico (Semántico): El modelo SentenceTransformer no está cargado. Abortando análisis."
-        print(error_msg)
+        logger.error(error_msg)
         return {"status": "error_modelo", "message": error_msg}
 
-    print(f"Iniciando análisis SEMÁNTICO para el proyecto ID: {project_id_param}")
+    logger.debug("Iniciando análisis SEMÁNTICO para el proyecto ID: %s", project_id_param)
     
     tolerancias = tolerancias_externas
     if tolerancias is None:
-        print("Obteniendo tolerancias para análisis semántico individual...")
+        logger.debug("Obteniendo tolerancias para análisis semántico individual...")
         tolerancias = obtener_tolerancias_semantico()
 
     if tolerancias is None: 
         error_msg = f"Error crítico (Semántico): No se pudieron obtener las tolerancias para el proyecto {project_id_param}. Abortando."
-        print(error_msg)
+        logger.error(error_msg)
         return {"status": "error_tolerancias", "message": error_msg}
 
-    reportes_del_proyecto = ReportesFinales.query.filter_by(project_id=project_id_param).all()
+    if reportes_por_usuario is None:
+        reportes_por_usuario = agrupar_reportes_por_usuario(
+            ReportesFinales.query.filter_by(project_id=project_id_param).all())
 
-    if not reportes_del_proyecto:
+    if not reportes_por_usuario:
         msg = f"No se encontraron reportes para el proyecto {project_id_param} (análisis semántico)."
-        print(msg)
+        logger.info(msg)
         return {"status": "skip_no_reportes", "message": msg}
-
-    reportes_por_usuario = {}
-    for reporte in reportes_del_proyecto:
-        if reporte.user_id not in reportes_por_usuario:
-            reportes_por_usuario[reporte.user_id] = reporte
     
     lista_usuarios_con_reporte = list(reportes_por_usuario.keys())
     
-    print(f"Usuarios con reportes en el proyecto {project_id_param} (Semántico): {len(lista_usuarios_con_reporte)}. IDs: {lista_usuarios_con_reporte}")
+    logger.debug("Usuarios con reportes en el proyecto %s (Semántico): %d. IDs: %s", project_id_param,
+                len(lista_usuarios_con_reporte), lista_usuarios_con_reporte)
 
-    columnas_secciones = ['introduccion', 'marcoteorico', 'metodo', 'resultados', 'discusion', 'conclusiones']
+    columnas_secciones = COLUMNAS_SECCIONES
+    num_pares = contar_pares(len(lista_usuarios_con_reporte))
+
+    huellas_actuales = calcular_huellas_proyecto(reportes_por_usuario, columnas_secciones)
+    plan, usuarios_cambiados = PLAN_COMPLETO, None
+    if huellas_previas is not None:
+        plan, usuarios_cambiados = planificar_proyecto(huellas_actuales, huellas_previas)
+        if plan == PLAN_OMITIR:
+            msg = f"Proyecto {project_id_param} sin cambios desde el último análisis semántico. Se omite."
+            logger.debug(msg)
+            return {"status": "skip_sin_cambios", "message": msg, "pares_analizados": 0, "pares_omitidos": num_pares}
 
     if len(lista_usuarios_con_reporte) <= 1:
         if len(lista_usuarios_con_reporte) == 1:
-            user_id = lista_usuarios_con_reporte[0]
-            print(f"El proyecto {project_id_param} (Semántico) tiene solo un integrante ({user_id}). Registrando con 0% de similitud.")
-            similitudes_vacias = {col: 0.0 for col in columnas_secciones}
-            insertar_o_actualizar_comparacion_semantica(
-                usuario_1_id=user_id,
-                usuario_2_id=0, 
-                project_id=project_id_param,
-                similitudes_dict=similitudes_vacias,
-                secciones_similares_count=0
-            )
+            registrar_proyecto_un_integrante_semantico(project_id_param, lista_usuarios_con_reporte[0])
+            if huellas_previas is not None:
+                eliminar_comparaciones_obsoletas(ComparacionSimilitudSemantica, project_id_param, lista_usuarios_con_reporte)
+            guardar_huellas_proyecto(TIPO_SEMANTICO, 0, project_id_param, huellas_actuales)
             return {"status": "single_user", "message": f"Proyecto {project_id_param} con un solo usuario."}
         else:
             msg = f"No hay usuarios con reportes en el proyecto {project_id_param} (Semántico)."
-            print(msg)
+            logger.debug(msg)
             return {"status": "no_users", "message": msg}
 
-    pares_de_usuarios = list(combinations(lista_usuarios_con_reporte, 2))
-    print(f"Se analizarán {len(pares_de_usuarios)} pares de usuarios para el proyecto {project_id_param} (Semántico).")
-
-    for user1_id, user2_id in pares_de_usuarios:
-        reporte_user1 = reportes_por_usuario[user1_id]
-        reporte_user2 = reportes_por_usuario[user2_id]
-        
-        similitudes_calculadas_semanticas = {}
-        secciones_semanticas_similares_alta = 0
-        
-        print(f"\nComparando SEMÁNTICAMENTE Usuario {user1_id} vs Usuario {user2_id} para proyecto {project_id_param}")
-
-        for seccion_nombre in columnas_secciones:
-            texto1_crudo = getattr(reporte_user1, seccion_nombre, "")
-            texto2_crudo = getattr(reporte_user2, seccion_nombre, "")
-            
-            similitud_semantica_actual = 0.0
-            if texto1_crudo and texto1_crudo.strip() and texto2_crudo and texto2_crudo.strip():
-                try:
-                    embedding1 = model_sentence_transformer.encode(texto1_crudo, convert_to_tensor=True)
-                    embedding2 = model_sentence_transformer.encode(texto2_crudo, convert_to_tensor=True)
-                    cosine_scores = sentence_util.cos_sim(embedding1, embedding2)
-                    similitud_semantica_actual = cosine_scores[0][0].item()
-                except Exception as e_encode: 
-                    similitud_semantica_actual = 0.0
-                    print(f"  Advertencia (Semántico): Error al generar embeddings o calcular similitud para la sección '{seccion_nombre}'. Error: {e_encode}")
-                    traceback.print_exc()
-            else:
-                print(f"  Info (Semántico): Uno o ambos textos para la sección '{seccion_nombre}' están vacíos. Similitud establecida a 0.0.")
-                similitud_semantica_actual = 0.0
-
-            similitud_semantica_actual = round(similitud_semantica_actual, 4)
-            similitudes_calculadas_semanticas[seccion_nombre] = similitud_semantica_actual
-            
-            nombre_seccion_normalizado = seccion_nombre.lower().strip()
-            umbral_tolerancia = tolerancias.get(nombre_seccion_normalizado, 0.0) 
-            
-            if nombre_seccion_normalizado not in tolerancias:
-                print(f"  Advertencia (Semántico): No existe configuración de tolerancia para la sección '{nombre_seccion_normalizado}'. Usando umbral 0.0.")
-
-            if similitud_semantica_actual > umbral_tolerancia:
-                secciones_semanticas_similares_alta += 1
-            
-            print(f"  Sección '{seccion_nombre}' (Semántico): Similitud = {similitud_semantica_actual*100:.2f}%, Umbral = {umbral_tolerancia*100:.2f}%")
+    logger.debug("Se analizarán %d pares de usuarios para el proyecto %s (Semántico).", num_pares, project_id_param)
 
-        print(f"  Total secciones con similitud semántica por encima del umbral para par ({user1_id} vs {user2_id}): {secciones_semanticas_similares_alta}")
-        
-        insertar_o_actualizar_comparacion_semantica(
-            usuario_1_id=user1_id,
-            usuario_2_id=user2_id,
-            project_id=project_id_param,
-            similitudes_dict=similitudes_calculadas_semanticas,
-            secciones_similares_count=secciones_semanticas_similares_alta
-        )
+    # Cada texto (reporte, sección) se codifica a lo sumo una vez, todos en un mismo 'encode'
+    # (los ya presentes en el almacén de embeddings no se vuelven a codificar).
+    entradas, posiciones = construir_entradas_semanticas(reportes_por_usuario, lista_usuarios_con_reporte, columnas_secciones)
+    try:
+        embeddings = None
+        if len(entradas) >= 2:
+            embeddings = obtener_almacen_embeddings().obtener_o_calcular(entradas, codificar_textos)
+        matrices_por_seccion = calcular_matrices_semanticas(len(lista_usuarios_con_reporte), posiciones,
+                                                            embeddings, columnas_secciones)
+    except Exception as e_encode:
+        error_msg = f"Error (Semántico): No se pudieron generar los embeddings del proyecto {project_id_param}: {e_encode}"
+        logger.exception(error_msg)
+        return {"status": "error_embeddings", "message": error_msg}
+
+    comparaciones = ResultadosComparacion.desde_matrices(project_id_param, lista_usuarios_con_reporte,
+                                                    matrices_por_seccion, tolerancias, etiqueta=" (Semántico)")
+    if plan == PLAN_PARCIAL:
+        comparaciones = comparaciones.filtrar_por_usuarios(usuarios_cambiados)
+
+    if guardar_comparaciones_lote(ComparacionSimilitudSemantica, comparaciones) is None:
+        error_msg = f"Error (Semántico): No se pudieron guardar las comparaciones del proyecto {project_id_param}."
+        logger.error(error_msg)
+        return {"status": "error_guardado", "message": error_msg}
+    finalizar_proyecto_incremental_semantico(project_id_param, plan if huellas_previas is not None else None,
+                                            huellas_actuales)
     
     msg_final_proyecto = f"Análisis SEMÁNTICO completado para el proyecto ID: {project_id_param}"
-    print(msg_final_proyecto)
-    return {"status": "success", "message": msg_final_proyecto}
+    registrar_resumen_proyecto_semantico(project_id_param, len(lista_usuarios_con_reporte), comparaciones)
+    return {"status": "success", "message": msg_final_proyecto,
+            "pares_analizados": len(comparaciones), "pares_omitidos": num_pares - len(comparaciones)}
+
+# --- Ejecución en procesos: preparación (proceso principal) y cálculo (trabajador) ---
+def inicializar_trabajador_semantico():
+    """
+    Inicializador de cada proceso trabajador: el SentenceTransformer se carga una sola vez por
+    proceso y torch usa un solo hilo, ya que el paralelismo lo dan los procesos.
+    """
+    import torch
+    torch.set_num_threads(1)
+    configurar_registro()
+    if not obtener_modelo_semantico():
+        logger.error("El modelo SentenceTransformer no está cargado en el proceso trabajador.")
+
+def preparar_tarea_proyecto_semantico(project_id, tolerancias, huellas_previas=None, estadisticas=None,
+                                    reportes_por_usuario=None):
+    """
+    Lee de la BD los reportes del proyecto y del almacén los embeddings vigentes, y arma la
+    tarea del trabajador. Los proyectos sin pares o sin cambios (modo incremental) se resuelven
+    aquí y retornan None. 'estadisticas' acumula los pares omitidos. Si se recibe
+    'reportes_por_usuario' (ya leídos por el llamador), no se vuelven a consultar.
+    """
+    if reportes_por_usuario is None:
+        reportes_por_usuario = agrupar_reportes_por_usuario(
+            ReportesFinales.query.filter_by(project_id=project_id).all())
+    usuarios = list(reportes_por_usuario.keys())
+    num_pares = contar_pares(len(usuarios))
+
+    huellas_actuales = calcular_huellas_proyecto(reportes_por_usuario, COLUMNAS_SECCIONES)
+    plan, usuarios_cambiados = PLAN_COMPLETO, None
+    if huellas_previas is not None:
+        plan, usuarios_cambiados = planificar_proyecto(huellas_actuales, huellas_previas)
+        if plan == PLAN_OMITIR:
+            if estadisticas is not None:
+                estadisticas["proyectos_omitidos"] += 1
+                estadisticas["pares_omitidos"] += num_pares
+            return None
+
+    if len(usuarios) <= 1:
+        if len(usuarios) == 1:
+            registrar_proyecto_un_integrante_semantico(project_id, usuarios[0])
+            if huellas_previas is not None:
+                eliminar_comparaciones_obsoletas(ComparacionSimilitudSemantica, project_id, usuarios)
+            guardar_huellas_proyecto(TIPO_SEMANTICO, 0, project_id, huellas_actuales)
+        return None
+
+    entradas, posiciones = construir_entradas_semanticas(reportes_por_usuario, usuarios, COLUMNAS_SECCIONES)
+    embeddings, pendientes = obtener_almacen_embeddings().buscar(entradas)
+    return {
+        "project_id": project_id,
+        "usuarios": usuarios,
+        "posiciones": posiciones,
+        "embeddings": embeddings,
+        "pendientes": [(i, entradas[i]) for i in pendientes],
+        "tolerancias": tolerancias,
+        "plan": plan if huellas_previas is not None else None,
+        "usuarios_cambiados": usuarios_cambiados,
+        "huellas_actuales": huellas_actuales,
+        "num_pares": num_pares,
+    }
+
+def procesar_tarea_proyecto_semantico(tarea):
+    """
+    Se ejecuta en el proceso trabajador: codifica los textos que no estaban en el almacén y
+    calcula las comparaciones del proyecto. No accede a la BD.
+    """
+    embeddings = tarea["embeddings"]
+    pendientes = tarea["pendientes"]
+    nuevos = None
+    if pendientes:
+        nuevos = np.asarray(codificar_textos([entrada[2] for _, entrada in pendientes]), dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.zeros((len(tarea["posiciones"]), nuevos.shape[1]), dtype=np.float32)
+        embeddings[[i for i, _ in pendientes]] = nuevos
+
+    matrices_por_seccion = calcular_matrices_semanticas(len(tarea["usuarios"]), tarea["posiciones"],
+                                                        embeddings, COLUMNAS_SECCIONES)
+    comparaciones = ResultadosComparacion.desde_matrices(tarea["project_id"], tarea["usuarios"], matrices_por_seccion,
+                                        tarea["tolerancias"], etiqueta=" (Semántico)")
+    if tarea["plan"] == PLAN_PARCIAL:
+        comparaciones = comparaciones.filtrar_por_usuarios(tarea["usuarios_cambiados"])
+    return {"project_id": tarea["project_id"], "comparaciones": comparaciones,
+            "entradas_nuevas": [entrada for _, entrada in pendientes], "embeddings_nuevos": nuevos,
+            "plan": tarea["plan"], "huellas_actuales": tarea["huellas_actuales"], "num_pares": tarea["num_pares"],
+            "metricas": extraer_metricas_trabajador()}
+
+def guardar_resultado_proyecto_semantico(resultado, estadisticas=None):
+    """Escritor único en el proceso principal: guarda embeddings nuevos, comparaciones y huellas del proyecto."""
+    combinar_metricas(resultado.get("metricas"))
+    if resultado["entradas_nuevas"]:
+        obtener_almacen_embeddings().agregar(resultado["entradas_nuevas"], resultado["embeddings_nuevos"])
+    if guardar_comparaciones_lote(ComparacionSimilitudSemantica, resultado["comparaciones"]) is None:
+        raise RuntimeError(f"No se pudieron guardar las comparaciones semánticas del proyecto {resultado['project_id']}.")
+    finalizar_proyecto_incremental_semantico(resultado["project_id"], resultado["plan"], resultado["huellas_actuales"])
+    registrar_resumen_proyecto_semantico(resultado["project_id"], len(resultado["huellas_actuales"]), resultado["comparaciones"])
+    if estadisticas is not None:
+        estadisticas["pares_analizados"] += len(resultado["comparaciones"])
+        estadisticas["pares_omitidos"] += resultado["num_pares"] - len(resultado["comparaciones"])
 
 # --- Nueva función para analizar todos los proyectos semánticamente (versión no-SSE) ---
-def analizar_todos_los_proyectos_semantico_service():
+def analizar_todos_los_proyectos_semantico_service(num_procesos=None, incremental=False, progreso=None):
+    """
+    Analiza semánticamente todos los proyectos con reportes. En modo incremental solo se
+    reanalizan los proyectos cuya membresía o cuyos textos cambiaron desde el último análisis.
+    'progreso(completados, total, pares)' es opcional y se llama al terminar cada proyecto, con el
+    número acumulado de pares resueltos (analizados u omitidos).
+    """
 
-    print("Iniciando el análisis SEMÁNTICO de todos los proyectos...")
-    # current_app.logger.info("Iniciando el análisis SEMÁNTICO de todos los proyectos...")
+    logger.info(f"Iniciando el análisis SEMÁNTICO {'incremental ' if incremental else ''}de todos los proyectos...")
+
+    msg = comprobar_claves_unicas([ComparacionSimilitudSemantica])
+    if msg:
+        logger.error(msg)
+        return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "total_proyectos":0, "tiempo_total_segundos": 0, "tiempo_total_formateado": "0s"}
 
     # Obtener tolerancias una sola vez al inicio
     tolerancias = obtener_tolerancias_semantico()
     if tolerancias is None:
         msg = "Error crítico (Semántico): No se pudieron obtener las tolerancias generales. Abortando análisis global."
-        print(msg)
-        # current_app.logger.error(msg)
+        logger.error(msg)
         return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "total_proyectos":0, "tiempo_total_segundos": 0, "tiempo_total_formateado": "0s"}
 
     try:
-        # Obtener todos los IDs de proyectos únicos desde la tabla de reportes finales
-        query_proyectos = db.session.query(distinct(ReportesFinales.project_id)).all()
-        project_ids = [pid[0] for pid in query_proyectos if pid[0] is not None]
+        # Los reportes se leen después en una sola consulta; aquí solo se cuentan los proyectos
+        total_proyectos_encontrados = contar_proyectos()
         
-        total_proyectos_encontrados = len(project_ids)
-        
-        if not project_ids:
+        if not total_proyectos_encontrados:
             msg = "No se encontraron proyectos con reportes para el análisis semántico."
-            print(msg)
-            # current_app.logger.info(msg)
+            logger.info(msg)
             return {"estado": "completado_sin_proyectos", "mensaje": msg, "proyectos_analizados": 0, "total_proyectos":0, "tiempo_total_segundos": 0, "tiempo_total_formateado": "0s"}
 
-        print(f"Se encontraron {total_proyectos_encontrados} proyectos únicos con reportes para el análisis SEMÁNTICO.")
+        logger.info(f"Se encontraron {total_proyectos_encontrados} proyectos únicos con reportes para el análisis SEMÁNTICO.")
             
         tiempo_inicio_total = time.time()
         proyectos_procesados_con_exito = 0
         proyectos_intentados = 0
         
-        for i, project_id in enumerate(project_ids, 1):
-            proyectos_intentados += 1
-            print(f"\n{'=' * 40}")
-            print(f"Procesando SEMÁNTICAMENTE proyecto {i}/{total_proyectos_encontrados}: ID {project_id}")
-            # current_app.logger.info(f"Procesando SEMÁNTICAMENTE proyecto {i}/{total_proyectos_encontrados}: ID {project_id}")
-            print(f"{'=' * 40}\n")
-            
-            resultado_proyecto = analizar_proyecto_semantico(project_id, tolerancias) # Pasar las tolerancias obtenidas
-            
-            if resultado_proyecto and resultado_proyecto.get("status") == "success":
-                proyectos_procesados_con_exito +=1
-            elif resultado_proyecto: # Loguear si hubo otro estado (skip, error_modelo, etc.)
-                print(f"Resultado del análisis semántico para proyecto {project_id}: {resultado_proyecto.get('status')} - {resultado_proyecto.get('message')}")
-            else:
-                print(f"Análisis semántico para proyecto {project_id} no devolvió un resultado esperado.")
+        num_procesos = num_procesos or ANALISIS_NUM_PROCESOS
+        estadisticas = {"proyectos_omitidos": 0, "pares_analizados": 0, "pares_omitidos": 0}
+        huellas = cargar_huellas(TIPO_SEMANTICO) if incremental else {}
+
+        def huellas_de(project_id):
+            return huellas.get(project_id, {}) if incremental else None
 
+        def pares_resueltos():
+            return estadisticas["pares_analizados"] + estadisticas["pares_omitidos"]
+        
+        if num_procesos > 1:
+            # Proyectos completos repartidos entre procesos, de mayor a menor; este proceso es el único escritor
+            logger.info(f"Analizando SEMÁNTICAMENTE en paralelo con {num_procesos} procesos trabajadores.")
+            resultado_paralelo = ejecutar_proyectos_en_paralelo(
+                iterar_reportes_por_proyecto(ordenar_por_tamano=True),
+                total_proyectos_encontrados,
+                preparar_tarea=lambda pid, reportes: preparar_tarea_proyecto_semantico(pid, tolerancias,
+                                                                                    huellas_de(pid), estadisticas,
+                                                                                    reportes_por_usuario=reportes),
+                procesar_tarea=procesar_tarea_proyecto_semantico,
+                guardar_resultado=lambda resultado: guardar_resultado_proyecto_semantico(resultado, estadisticas),
+                inicializador=inicializar_trabajador_semantico,
+                num_procesos=num_procesos,
+                progreso=(lambda completados, total: progreso(completados, total, pares_resueltos())) if progreso else None
+            )
+            proyectos_intentados = total_proyectos_encontrados
+            proyectos_procesados_con_exito = resultado_paralelo["procesados"] - estadisticas["proyectos_omitidos"]
+            incrementar(CONTADOR_ERRORES, ANALISIS_SEMANTICO, resultado_paralelo["errores"])
+        else:
+            for i, (project_id, reportes_por_usuario) in enumerate(iterar_reportes_por_proyecto(), 1):
+                proyectos_intentados += 1
+                logger.debug("Procesando SEMÁNTICAMENTE proyecto %d/%d: ID %s", i, total_proyectos_encontrados, project_id)
+                
+                resultado_proyecto = analizar_proyecto_semantico(project_id, tolerancias,
+                                                                huellas_previas=huellas_de(project_id),
+                                                                reportes_por_usuario=reportes_por_usuario) # Pasar las tolerancias obtenidas
+                if resultado_proyecto:
+                    estadisticas["pares_analizados"] += resultado_proyecto.get("pares_analizados", 0)
+                    estadisticas["pares_omitidos"] += resultado_proyecto.get("pares_omitidos", 0)
+                
+                if resultado_proyecto and resultado_proyecto.get("status") == "skip_sin_cambios":
+                    estadisticas["proyectos_omitidos"] += 1
+                elif resultado_proyecto and resultado_proyecto.get("status") == "success":
+                    proyectos_procesados_con_exito +=1
+                elif resultado_proyecto: # Loguear si hubo otro estado (skip, error_modelo, etc.)
+                    if resultado_proyecto.get("status", "").startswith("error"):
+                        incrementar(CONTADOR_ERRORES, ANALISIS_SEMANTICO)
+                    logger.debug("Resultado del análisis semántico para proyecto %s: %s - %s", project_id,
+                                resultado_proyecto.get('status'), resultado_proyecto.get('message'))
+                else:
+                    logger.warning(f"Análisis semántico para proyecto {project_id} no devolvió un resultado esperado.")
+                if progreso is not None:
+                    progreso(i, total_proyectos_encontrados, pares_resueltos())
+
+
+        # Los embeddings nuevos del almacén se insertan en el índice de vecinos
+        try:
+            obtener_indice_vecinos().sincronizar()
+        except Exception as e_indice:
+            logger.warning(f"No se pudo sincronizar el índice de vecinos semánticos: {e_indice}", exc_info=True)
+
+        # Resumen del listado de todos los proyectos recorridos, también los que no tienen
+        # comparaciones (analizado = 0) y con sus integrantes actuales
+        reconstruir_resumen_proyectos()
 
         tiempo_total_segundos = time.time() - tiempo_inicio_total
         
@@ -292,24 +499,27 @@ def analizar_todos_los_proyectos_semantico_service():
         tiempo_total_formateado = f"{int(horas)}h {int(minutos)}m {int(segundos_finales)}s"
 
         msg_final = (f"Análisis SEMÁNTICO de todos los proyectos ({proyectos_intentados} intentados, {proyectos_procesados_con_exito} completados con éxito) finalizado. "
+                    f"Proyectos omitidos sin cambios: {estadisticas['proyectos_omitidos']}, "
+                    f"pares omitidos: {estadisticas['pares_omitidos']}. "
                     f"Tiempo total: {tiempo_total_formateado}")
-        print(msg_final)
-        # current_app.logger.info(msg_final)
+        logger.info(msg_final)
         
         return {
             "estado": "completado",
             "mensaje": msg_final,
             "proyectos_analizados": proyectos_procesados_con_exito, # O proyectos_intentados, según se prefiera reportar
             "total_proyectos": total_proyectos_encontrados,
+            "proyectos_omitidos": estadisticas["proyectos_omitidos"],
+            "pares_analizados": estadisticas["pares_analizados"],
+            "pares_omitidos": estadisticas["pares_omitidos"],
             "tiempo_total_segundos": round(tiempo_total_segundos, 2),
             "tiempo_total_formateado": tiempo_total_formateado
         }
 
     except Exception as e:
         error_msg = f"Error durante el análisis SEMÁNTICO de todos los proyectos: {str(e)}"
-        print(error_msg)
-        # current_app.logger.error(error_msg, exc_info=True)
-        traceback.print_exc()
+        logger.exception(error_msg)
+        incrementar(CONTADOR_ERRORES, ANALISIS_SEMANTICO)
         return {"estado": "error", "mensaje": error_msg, 
                 "proyectos_analizados": proyectos_procesados_con_exito if 'proyectos_procesados_con_exito' in locals() else 0, 
                 "total_proyectos": total_proyectos_encontrados if 'total_proyectos_encontrados' in locals() else 0,
@@ -1,40 +1,106 @@
-import spacy
+import logging
 import pandas as pd
-from sqlalchemy import or_, distinct # distinct para obtener project_id únicos
-from datetime import datetime
-from itertools import combinations 
 import time # Para la temporización
+from functools import partial
 
 # Importaciones de Scikit-learn
 from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+import numpy as np
 
 # Modelos y DB
 from models.Reportes_Finales import ReportesFinales
 from models.Tolerancia_Porcentajes import ToleranciasPorcentajes
 from models.Comparacion_Similitud import ComparacionSimilitud
+from models.Comparacion_TM import ComparacionTM, ComparacionTMBigrama, ComparacionTMTrigrama, ComparacionTM4grama
+from services.Cache_Lemas import obtener_lemas_reportes, buscar_lemas_en_cache, guardar_lemas_en_cache
+from services.Guardado_Comparaciones import (
+    construir_fila_comparacion, guardar_comparaciones_lote, comprobar_claves_unicas, ResultadosComparacion
+)
+from services.Ejecucion_Paralela import ejecutar_proyectos_en_paralelo
+from services.Carga_Reportes import iterar_reportes_por_proyecto, iterar_reportes_analizados, contar_proyectos
+from services.Resumen_Proyectos import reconstruir_resumen_proyectos
+from services.Analisis_Incremental import (
+    TIPO_SINTACTICO, TIPO_MULTINGRAMA, PLAN_OMITIR, PLAN_COMPLETO, PLAN_PARCIAL, calcular_huellas_proyecto, cargar_huellas,
+    planificar_proyecto, contar_pares, guardar_huellas_proyecto,
+    eliminar_comparaciones_obsoletas
+)
+from services.Modelos_NLP import obtener_nlp
+from services.Registro import configurar_registro
+from services.Metricas import (
+    medir, incrementar, registrar_proyecto, extraer_metricas_trabajador, combinar_metricas,
+    ETAPA_SPACY, ETAPA_VECTORIZACION, ETAPA_PUNTUACION, CONTADOR_ERRORES, ANALISIS_SINTACTICO
+)
+from services.Motores_Lexicos import (
+    MOTORES, MOTOR_CONTEO, tokenizar_lemas, extraer_ngramas, ponderar, usa_estadisticas, actualizar_estadisticas,
+    obtener_estadisticas_seccion, obtener_firma_estadisticas
+)
 
-from config.config import db
+from config.config import SPACY_N_PROCESS, SPACY_BATCH_SIZE, SPACY_BLOQUE_REPORTES, ANALISIS_NUM_PROCESOS
 
-# --- Carga del modelo spaCy ---
-try:
-    nlp = spacy.load("es_core_news_md")
-except OSError:
-    print("Modelo 'es_core_news_md' no encontrado. "
-        "Por favor, descárgalo ejecutando: python -m spacy download es_core_news_md")
-    nlp = None
+logger = logging.getLogger(__name__)
+
+# Secciones de los reportes que se comparan
+COLUMNAS_SECCIONES = ['introduccion', 'marcoteorico', 'metodo', 'resultados', 'discusion', 'conclusiones']
+
+# Modo multi n-grama: cada orden de n-grama se guarda en su tabla comparacion_tm*
+MODELOS_MULTINGRAMA = {1: ComparacionTM, 2: ComparacionTMBigrama, 3: ComparacionTMTrigrama, 4: ComparacionTM4grama}
+
+def extraer_lemas(doc):
+    lemas = [token.lemma_.lower() for token in doc if not token.is_stop 
+            and not token.is_punct and token.lemma_.strip()]
+    return " ".join(lemas)
 
 # --- Función de preprocesamiento ---
 def preprocesar_texto(texto):
+    nlp = obtener_nlp()
     if not nlp:
-        print("Error: El modelo de spaCy 'es_core_news_md' no está cargado.")
+        logger.error("El modelo de spaCy 'es_core_news_md' no está cargado.")
         return "" 
     if pd.isna(texto) or not texto:
         return ""
-    doc = nlp(str(texto))
-    lemas = [token.lemma_.lower() for token in doc if not token.is_stop 
-            and not token.is_punct and token.lemma_.strip()]
-    return " ".join(lemas)
+    return extraer_lemas(nlp(str(texto)))
+
+def preprocesar_textos(textos, n_process=None, batch_size=None):
+    """
+    Preprocesa una lista de textos crudos con nlp.pipe y devuelve sus lemas en el mismo orden.
+    Los textos vacíos no se envían a spaCy.
+    """
+    nlp = obtener_nlp()
+    if not nlp:
+        logger.error("El modelo de spaCy 'es_core_news_md' no está cargado.")
+        return ["" for _ in textos]
+
+    n_process = n_process or SPACY_N_PROCESS
+    batch_size = batch_size or SPACY_BATCH_SIZE
+
+    resultado = ["" for _ in textos]
+    indices_validos = [i for i, texto in enumerate(textos) if not pd.isna(texto) and texto]
+    if not indices_validos:
+        return resultado
+
+    # Con pocos textos no compensa arrancar procesos adicionales
+    if len(indices_validos) < n_process * batch_size:
+        n_process = 1
+
+    with medir(ETAPA_SPACY):
+        docs = nlp.pipe((str(textos[i]) for i in indices_validos), batch_size=batch_size, n_process=n_process)
+        for i, doc in zip(indices_validos, docs):
+            resultado[i] = extraer_lemas(doc)
+    return resultado
+
+# --- Etapa de preprocesamiento de un análisis global ---
+def preprocesar_reportes_pendientes(columnas_secciones=COLUMNAS_SECCIONES, tamano_bloque=None):
+    """
+    Recorre todos los reportes que entran al análisis (el primero de cada usuario por proyecto)
+    y lematiza en lotes las secciones que aún no están en la caché o cuyo texto cambió.
+    Así, el análisis por proyecto solo lee lemas ya calculados.
+    """
+    tamano_bloque = tamano_bloque or SPACY_BLOQUE_REPORTES
+
+    logger.info(f"Preprocesando secciones pendientes de los reportes en bloques de {tamano_bloque}...")
+    for reportes in iterar_reportes_analizados(tamano_bloque):
+        obtener_lemas_reportes(reportes, columnas_secciones, preprocesar_textos)
 
 # --- Función para obtener tolerancias ---
 def obtener_tolerancias():
@@ -45,200 +111,471 @@ def obtener_tolerancias():
             seccion_normalizada = registro.seccion.strip().lower()
             tolerancias_dict[seccion_normalizada] = registro.tolerancia
         if not tolerancias_dict:
-            print("Advertencia: No se encontraron registros de tolerancia en la base de datos.")
+            logger.warning("No se encontraron registros de tolerancia en la base de datos.")
 
         return tolerancias_dict
     except Exception as e:
-        print(f"Error obteniendo tolerancias desde la base de datos: {str(e)}")
+        logger.error(f"Error obteniendo tolerancias desde la base de datos: {str(e)}")
 
         return None
 
 # --- Función para insertar o actualizar comparación ---
 def insertar_o_actualizar_comparacion(usuario_1_id, usuario_2_id, project_id, 
                                     similitudes_dict, secciones_similares_count):
-    try:
-        u1_id = int(usuario_1_id)
-        u2_id = int(usuario_2_id)
-        proj_id = int(project_id)
-        num_secciones_similares = int(secciones_similares_count)
-
-        sim_introduccion = float(similitudes_dict.get('introduccion', 0.0))
-        sim_marcoteorico = float(similitudes_dict.get('marcoteorico', 0.0))
-        sim_metodo = float(similitudes_dict.get('metodo', 0.0))
-        sim_resultados = float(similitudes_dict.get('resultados', 0.0))
-        sim_discusion = float(similitudes_dict.get('discusion', 0.0))
-        sim_conclusiones = float(similitudes_dict.get('conclusiones', 0.0))
-        similitud_detectada_flag = 1 if num_secciones_similares > 0 else 0
-        
-        if u2_id == 0: 
-            id_menor = u1_id
-            id_mayor = 0 
-        else:
-            id_menor = min(u1_id, u2_id)
-            id_mayor = max(u1_id, u2_id)
-
-        registro_existente = ComparacionSimilitud.query.filter(
-            ComparacionSimilitud.project_id == proj_id,
-            ComparacionSimilitud.usuario_1_id == id_menor,
-            ComparacionSimilitud.usuario_2_id == id_mayor
-        ).first()
-
-        if registro_existente:
-            registro_existente.introduccion = sim_introduccion
-            registro_existente.marcoteorico = sim_marcoteorico
-            registro_existente.metodo = sim_metodo
-            registro_existente.resultados = sim_resultados
-            registro_existente.discusion = sim_discusion
-            registro_existente.conclusiones = sim_conclusiones
-            registro_existente.secciones_similares = num_secciones_similares
-            registro_existente.similitud_detectada = similitud_detectada_flag
-            registro_existente.status_analisis = 1
-            registro_existente.updated_at = datetime.utcnow()
-            # db.session.add(registro_existente)
-            print(f"Actualizada la comparación (Usuarios: {u1_id}, {u2_id}; Proyecto: {proj_id}).")
-        else:
-            nuevo_registro = ComparacionSimilitud(
-                usuario_1_id=id_menor,
-                usuario_2_id=id_mayor,
-                project_id=proj_id,
-                introduccion=sim_introduccion,
-                marcoteorico=sim_marcoteorico,
-                metodo=sim_metodo,
-                resultados=sim_resultados,
-                discusion=sim_discusion,
-                conclusiones=sim_conclusiones,
-                secciones_similares=num_secciones_similares,
-                similitud_detectada=similitud_detectada_flag,
-                status_analisis=1
-            )
-            db.session.add(nuevo_registro)
-            print(f"Guardada nueva comparación (Usuarios: {u1_id}, {u2_id}; Proyecto: {proj_id}).")
-            
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error al interactuar con comparacion_similitud DB: {e}")
-        import traceback
-        traceback.print_exc()
+    """
+    Inserta o actualiza una sola comparación en 'comparacion_similitud'.
+    Los análisis por proyecto usan directamente guardar_comparaciones_lote.
+    """
+    fila = construir_fila_comparacion(usuario_1_id, usuario_2_id, project_id,
+                                    similitudes_dict, secciones_similares_count)
+    guardar_comparaciones_lote(ComparacionSimilitud, [fila])
 
-# --- Función para analizar un proyecto individual ---
-def analizar_proyecto(project_id_param, tolerancias, ngrama_value = 1): # Pasamos tolerancias como argumento
+# --- Matrices de similitud de una sección para todo el proyecto ---
+def calcular_matrices_similitud(textos, ngramas=(1,), motor=MOTOR_CONTEO, estadisticas_por_ngrama=None):
+    """
+    Calcula, para cada orden de 'ngramas', la matriz n x n de similitud coseno entre los textos
+    lematizados de una sección: {ngrama: matriz}. Los textos se tokenizan una sola vez y cada
+    orden solo arma sus n-gramas a partir de esos tokens.
+    'motor' pondera los conteos antes del coseno (ver Motores_Lexicos); los motores con IDF usan
+    las frecuencias de documento del corpus de 'estadisticas_por_ngrama' ({ngrama: estadísticas}).
+
+    El vocabulario de cada orden se construye una sola vez con todos los textos no vacíos del
+    proyecto y la matriz se obtiene con un único producto de la matriz dispersa normalizada (L2).
+    Los n-gramas que solo aparecen en otros documentos no alteran el coseno de un par,
+    por lo que cada celda coincide con ajustar un CountVectorizer solo sobre ese par.
+    Las filas de textos vacíos (o sin n-gramas del tamaño pedido) quedan en 0.0.
+    """
+    n = len(textos)
+    matrices = {ngrama: np.zeros((n, n), dtype=np.float64) for ngrama in ngramas}
+    indices_validos = [i for i, texto in enumerate(textos) if texto]
+    if len(indices_validos) < 2:
+        return matrices
+
+    tokens = [tokenizar_lemas(textos[i]) for i in indices_validos]
+    for ngrama in ngramas:
+        with medir(ETAPA_VECTORIZACION):
+            try:
+                vectorizador = CountVectorizer(analyzer=partial(extraer_ngramas, ngrama=ngrama))
+                vectores = vectorizador.fit_transform(tokens)
+            except ValueError:
+                # Ningún texto produjo n-gramas del tamaño pedido (vocabulario vacío)
+                continue
+
+            if motor != MOTOR_CONTEO:
+                terminos = [None] * len(vectorizador.vocabulary_)
+                for termino, indice in vectorizador.vocabulary_.items():
+                    terminos[indice] = termino
+                vectores = ponderar(motor, vectores, terminos, (estadisticas_por_ngrama or {}).get(ngrama))
 
-    print(f"Iniciando análisis para el proyecto ID: {project_id_param}")
+            vectores_normalizados = normalize(vectores, norm='l2', axis=1)
 
-    reportes_del_proyecto = ReportesFinales.query.filter_by(project_id=project_id_param).all()
+        with medir(ETAPA_PUNTUACION):
+            similitudes = (vectores_normalizados @ vectores_normalizados.T).toarray()
+            matrices[ngrama][np.ix_(indices_validos, indices_validos)] = similitudes
+    return matrices
 
-    if not reportes_del_proyecto:
-        print(f"No se encontraron reportes para el proyecto {project_id_param}. No se realizará análisis.")
-        return
+def calcular_matriz_similitud(textos, ngrama_value=1):
+    """Matriz n x n de similitud coseno de una sección para un solo orden de n-grama."""
+    return calcular_matrices_similitud(textos, (ngrama_value,))[ngrama_value]
 
+# --- Cálculo de las comparaciones de un proyecto (sin acceso a la BD) ---
+def calcular_comparaciones_ngramas(project_id, usuarios, lemas_por_seccion, tolerancias, ngramas=(1,),
+                                motor=MOTOR_CONTEO):
+    """
+    Calcula las comparaciones de todos los pares de 'usuarios' para cada orden de 'ngramas':
+    {ngrama: ResultadosComparacion}. Con un motor con IDF, las frecuencias de documento deben estar
+    cargadas antes con actualizar_estadisticas.
+    'lemas_por_seccion' es {seccion: [texto lematizado de cada usuario, en el orden de 'usuarios']}.
+    Una matriz n x n por sección y orden; cada par se lee de ella en lugar de ajustar un vectorizador por par.
+    """
+    registrar_proyecto(ANALISIS_SINTACTICO, len(usuarios), len(usuarios) * len(lemas_por_seccion),
+                    sum(1 for textos in lemas_por_seccion.values() for texto in textos if not texto))
+    matrices_por_ngrama = {ngrama: {} for ngrama in ngramas}
+    for seccion_nombre, textos_seccion in lemas_por_seccion.items():
+        estadisticas = None
+        if usa_estadisticas(motor):
+            estadisticas = {ngrama: obtener_estadisticas_seccion(ngrama, seccion_nombre, project_id) for ngrama in ngramas}
+        for ngrama, matriz in calcular_matrices_similitud(textos_seccion, ngramas, motor, estadisticas).items():
+            matrices_por_ngrama[ngrama][seccion_nombre] = matriz
+    return {ngrama: ResultadosComparacion.desde_matrices(project_id, usuarios, matrices, tolerancias,
+                                                        etiqueta=f" ({ngrama}-grama)" if len(ngramas) > 1 else "")
+            for ngrama, matrices in matrices_por_ngrama.items()}
+
+def calcular_comparaciones_proyecto(project_id, usuarios, lemas_por_seccion, tolerancias, ngrama_value=1):
+    """Comparaciones de todos los pares de 'usuarios' para un solo orden de n-grama (un ResultadosComparacion)."""
+    return calcular_comparaciones_ngramas(project_id, usuarios, lemas_por_seccion, tolerancias,
+                                        (ngrama_value,))[ngrama_value]
+
+def agrupar_reportes_por_usuario(reportes):
     reportes_por_usuario = {}
-    for reporte in reportes_del_proyecto:
+    for reporte in reportes:
         if reporte.user_id not in reportes_por_usuario: # Tomar el primer reporte por usuario
             reportes_por_usuario[reporte.user_id] = reporte
+    return reportes_por_usuario
+
+def obtener_destinos(ngrama_value, multingrama=False):
+    """Tabla de destino de cada orden de n-grama analizado: {ngrama: modelo}."""
+    return dict(MODELOS_MULTINGRAMA) if multingrama else {ngrama_value: ComparacionSimilitud}
+
+def calcular_huellas_sintacticas(reportes_por_usuario, destinos, motor=MOTOR_CONTEO):
+    """
+    Huellas del análisis incremental sintáctico. Con un motor con IDF incluyen la firma de las
+    frecuencias cargadas, de modo que un cambio en el corpus reanaliza todos los pares.
+    """
+    firma = obtener_firma_estadisticas(tuple(destinos)) if usa_estadisticas(motor) else None
+    return calcular_huellas_proyecto(reportes_por_usuario, COLUMNAS_SECCIONES, firma)
+
+def obtener_clave_huellas(ngrama_value, multingrama=False, motor=MOTOR_CONTEO):
+    """
+    (tipo_analisis, ngrama) con que se guardan las huellas del análisis incremental. Cada motor
+    tiene las suyas, para que cambiar de motor no omita proyectos analizados con otro.
+    """
+    tipo_analisis, ngrama = (TIPO_MULTINGRAMA, 0) if multingrama else (TIPO_SINTACTICO, ngrama_value)
+    return (tipo_analisis if motor == MOTOR_CONTEO else f"{tipo_analisis}_{motor}"), ngrama
+
+def guardar_comparaciones_destinos(destinos, comparaciones_por_ngrama):
+    """
+    Guarda las comparaciones de cada orden de n-grama en su tabla.
+    Retorna el número de pares guardados (el mismo en cada tabla), o None si alguna tabla falló.
+    """
+    guardadas = 0
+    for ngrama, comparaciones in comparaciones_por_ngrama.items():
+        guardadas = guardar_comparaciones_lote(destinos[ngrama], comparaciones)
+        if guardadas is None:
+            return None
+    return guardadas
+
+def registrar_proyecto_un_integrante(project_id, user_id, modelos=(ComparacionSimilitud,)):
+    logger.debug("El proyecto %s tiene solo un integrante (%s). Registrando con 0%% de similitud.", project_id, user_id)
+    fila = construir_fila_comparacion(
+        usuario_1_id=user_id,
+        usuario_2_id=0,
+        project_id=project_id,
+        similitudes_dict={col: 0.0 for col in COLUMNAS_SECCIONES},
+        secciones_similares_count=0
+    )
+    for modelo in modelos:
+        guardar_comparaciones_lote(modelo, [fila])
+
+def finalizar_proyecto_incremental(project_id, ngrama_value, plan, huellas_actuales, multingrama=False,
+                                motor=MOTOR_CONTEO):
+    """Tras guardar las comparaciones: limpia pares de exintegrantes y registra las huellas actuales."""
+    if plan == PLAN_COMPLETO:
+        for modelo in obtener_destinos(ngrama_value, multingrama).values():
+            eliminar_comparaciones_obsoletas(modelo, project_id, huellas_actuales.keys())
+    tipo_analisis, ngrama = obtener_clave_huellas(ngrama_value, multingrama, motor)
+    guardar_huellas_proyecto(tipo_analisis, ngrama, project_id, huellas_actuales)
+
+def resolver_proyecto_un_integrante(project_id, user_id, ngrama_value, huellas_previas, huellas_actuales, multingrama=False,
+                                    motor=MOTOR_CONTEO):
+    """Registra el (usuario, 0) del único integrante en cada tabla de destino y guarda sus huellas."""
+    destinos = obtener_destinos(ngrama_value, multingrama)
+    registrar_proyecto_un_integrante(project_id, user_id, destinos.values())
+    if huellas_previas is not None:
+        for modelo in destinos.values():
+            eliminar_comparaciones_obsoletas(modelo, project_id, [user_id])
+    tipo_analisis, ngrama = obtener_clave_huellas(ngrama_value, multingrama, motor)
+    guardar_huellas_proyecto(tipo_analisis, ngrama, project_id, huellas_actuales)
+
+# --- Función para analizar un proyecto individual ---
+def analizar_proyecto(project_id_param, tolerancias, ngrama_value = 1, huellas_previas = None, reportes_por_usuario = None,
+                    multingrama = False, motor = MOTOR_CONTEO, estadisticas_listas = False): # Pasamos tolerancias como argumento
+    """
+    Analiza los pares del proyecto y guarda sus comparaciones.
+    'reportes_por_usuario' evita volver a consultar los reportes si el llamador ya los leyó.
+    Si se reciben 'huellas_previas' (modo incremental, {user_id: (reporte_id, huella)} del último
+    análisis), el proyecto se omite cuando nada cambió y, si la membresía es la misma, solo se
+    guardan los pares que tocan un reporte modificado.
+    Con 'multingrama' se calculan los n-gramas 1 a 4 en la misma pasada y cada orden se guarda
+    en su tabla comparacion_tm*.
+    'motor' elige la ponderación léxica; con 'estadisticas_listas' el llamador ya cargó las
+    frecuencias de documento (análisis global) y no se vuelve a verificar su vigencia.
+    Retorna {"omitido": bool, "pares_analizados": n, "pares_omitidos": n}.
+    """
+    estadisticas = {"omitido": False, "pares_analizados": 0, "pares_omitidos": 0}
+
+    logger.debug("Iniciando análisis para el proyecto ID: %s", project_id_param)
+
+    if reportes_por_usuario is None:
+        reportes_por_usuario = agrupar_reportes_por_usuario(
+            ReportesFinales.query.filter_by(project_id=project_id_param).all())
+
+    if not reportes_por_usuario:
+        logger.info("No se encontraron reportes para el proyecto %s. No se realizará análisis.", project_id_param)
+        return estadisticas
     
     lista_usuarios_con_reporte = list(reportes_por_usuario.keys())
-    print(f"Usuarios con reportes en el proyecto {project_id_param}: {len(lista_usuarios_con_reporte)}. IDs: {lista_usuarios_con_reporte}")
-    columnas_secciones = ['introduccion', 'marcoteorico', 'metodo', 'resultados', 'discusion', 'conclusiones']
+    logger.debug("Usuarios con reportes en el proyecto %s: %d. IDs: %s", project_id_param, len(lista_usuarios_con_reporte),
+                lista_usuarios_con_reporte)
+    columnas_secciones = COLUMNAS_SECCIONES
+    num_pares = contar_pares(len(lista_usuarios_con_reporte))
+
+    destinos = obtener_destinos(ngrama_value, multingrama)
+    if usa_estadisticas(motor) and not estadisticas_listas:
+        actualizar_estadisticas(tuple(destinos))
+    huellas_actuales = calcular_huellas_sintacticas(reportes_por_usuario, destinos, motor)
+    plan, usuarios_cambiados = PLAN_COMPLETO, None
+    if huellas_previas is not None:
+        plan, usuarios_cambiados = planificar_proyecto(huellas_actuales, huellas_previas)
+        if plan == PLAN_OMITIR:
+            logger.debug("Proyecto %s sin cambios desde el último análisis. Se omite.", project_id_param)
+            return {"omitido": True, "pares_analizados": 0, "pares_omitidos": num_pares}
 
     if len(lista_usuarios_con_reporte) <= 1:
         if len(lista_usuarios_con_reporte) == 1:
-            user_id = lista_usuarios_con_reporte[0]
-            print(f"El proyecto {project_id_param} tiene solo un integrante ({user_id}). Registrando con 0% de similitud.")
-            similitudes_vacias = {col: 0.0 for col in columnas_secciones}
-            insertar_o_actualizar_comparacion(
-                usuario_1_id=user_id,
-                usuario_2_id=0, 
-                project_id=project_id_param,
-                similitudes_dict=similitudes_vacias,
-                secciones_similares_count=0
-            )
+            resolver_proyecto_un_integrante(project_id_param, lista_usuarios_con_reporte[0], ngrama_value,
+                                            huellas_previas, huellas_actuales, multingrama, motor)
         else:
-            print(f"No hay usuarios con reportes en el proyecto {project_id_param}. No se creará ningún registro de comparación.")
-        return
-
-    pares_de_usuarios = list(combinations(lista_usuarios_con_reporte, 2))
-    print(f"Se analizarán {len(pares_de_usuarios)} pares de usuarios para el proyecto {project_id_param}.")
-
-    for user1_id, user2_id in pares_de_usuarios:
-        reporte_user1 = reportes_por_usuario[user1_id]
-        reporte_user2 = reportes_por_usuario[user2_id]
-        similitudes_calculadas = {}
-        secciones_con_similitud_alta = 0
-        print(f"\nComparando Usuario {user1_id} vs Usuario {user2_id} para proyecto {project_id_param}")
-
-        for seccion_nombre in columnas_secciones:
-            texto1 = preprocesar_texto(getattr(reporte_user1, seccion_nombre, ""))
-            texto2 = preprocesar_texto(getattr(reporte_user2, seccion_nombre, ""))
-            similitud_actual = 0.0
-            if texto1 and texto2: 
-                try:
-                    # vectorizador = TfidfVectorizer()
-                    vectorizador = CountVectorizer(ngram_range=(ngrama_value, ngrama_value), token_pattern=r'\b\w+\b') # Usar CountVectorizer para n-gramas
-                    vectores = vectorizador.fit_transform([texto1, texto2])
-                    if vectores.shape[1] > 0:
-                        similitud_actual = cosine_similarity(vectores[0:1], vectores[1:2])[0][0]
-                    else:
-                        similitud_actual = 0.0 
-                except ValueError:
-                    similitud_actual = 0.0
-                    print(f"  Advertencia: ValueError al calcular similitud para la sección '{seccion_nombre}'.")
-            similitud_actual = round(similitud_actual, 4)
-            similitudes_calculadas[seccion_nombre] = similitud_actual
-            nombre_seccion_normalizado = seccion_nombre.lower().strip()
-            umbral_tolerancia = tolerancias.get(nombre_seccion_normalizado, 0.0)
-            if nombre_seccion_normalizado not in tolerancias:
-                print(f"  Advertencia: No existe config de tolerancia para '{nombre_seccion_normalizado}'. Usando umbral 0.0.")
-            if similitud_actual > umbral_tolerancia:
-                secciones_con_similitud_alta += 1
-            print(f"  Sección '{seccion_nombre}': Similitud = {similitud_actual*100:.2f}%, Umbral = {umbral_tolerancia*100:.2f}%")
-        print(f"  Total secciones con similitud por encima del umbral: {secciones_con_similitud_alta}")
-        insertar_o_actualizar_comparacion(
-            usuario_1_id=user1_id,
-            usuario_2_id=user2_id,
-            project_id=project_id_param,
-            similitudes_dict=similitudes_calculadas,
-            secciones_similares_count=secciones_con_similitud_alta
-        )
-    print(f"Análisis completado para el proyecto ID: {project_id_param}")
+            logger.debug("No hay usuarios con reportes en el proyecto %s. No se creará ningún registro de comparación.",
+                        project_id_param)
+        return estadisticas
+
+    logger.debug("Se analizarán %d pares de usuarios para el proyecto %s.", num_pares, project_id_param)
+
+    # Cada sección se lematiza una sola vez (o se reutiliza de la caché) en lugar de una vez por par
+    lemas = obtener_lemas_reportes(list(reportes_por_usuario.values()), columnas_secciones, preprocesar_textos)
+    lemas_por_seccion = {seccion_nombre: [lemas.get((reportes_por_usuario[user_id].id, seccion_nombre), "")
+                                        for user_id in lista_usuarios_con_reporte]
+                        for seccion_nombre in columnas_secciones}
+
+    comparaciones_por_ngrama = calcular_comparaciones_ngramas(project_id_param, lista_usuarios_con_reporte,
+                                                            lemas_por_seccion, tolerancias, tuple(destinos), motor)
+    if plan == PLAN_PARCIAL:
+        comparaciones_por_ngrama = {ngrama: comparaciones.filtrar_por_usuarios(usuarios_cambiados)
+                                    for ngrama, comparaciones in comparaciones_por_ngrama.items()}
+
+    guardadas = guardar_comparaciones_destinos(destinos, comparaciones_por_ngrama)
+    if guardadas is None:
+        incrementar(CONTADOR_ERRORES, ANALISIS_SINTACTICO)
+    else:
+        finalizar_proyecto_incremental(project_id_param, ngrama_value,
+                                    plan if huellas_previas is not None else None, huellas_actuales, multingrama, motor)
+        registrar_resumen_proyecto(project_id_param, len(lista_usuarios_con_reporte), comparaciones_por_ngrama)
+    pares_calculados = len(comparaciones_por_ngrama[next(iter(destinos))])
+    return {"omitido": False, "pares_analizados": pares_calculados,
+            "pares_omitidos": num_pares - pares_calculados}
+
+# --- Ejecución en procesos: preparación (proceso principal) y cálculo (trabajador) ---
+def inicializar_trabajador_sintactico():
+    """Inicializador de cada proceso trabajador: registro por cola y modelo spaCy cargado una sola vez por proceso."""
+    configurar_registro()
+    if not obtener_nlp():
+        logger.error("El modelo de spaCy 'es_core_news_md' no está cargado en el proceso trabajador.")
+
+def preparar_tarea_proyecto(project_id, tolerancias, ngrama_value, huellas_previas=None, estadisticas=None,
+                            reportes_por_usuario=None, multingrama=False, motor=MOTOR_CONTEO):
+    """
+    Lee de la BD los reportes del proyecto y los lemas vigentes en caché, y arma la tarea que
+    recibe el trabajador. Los proyectos sin pares o sin cambios (modo incremental) se resuelven
+    aquí y retornan None. 'estadisticas' acumula los pares omitidos. Si se recibe
+    'reportes_por_usuario' (ya leídos por el llamador), no se vuelven a consultar.
+    Con un motor con IDF, el llamador debe haber llamado antes a actualizar_estadisticas.
+    """
+    if reportes_por_usuario is None:
+        reportes_por_usuario = agrupar_reportes_por_usuario(
+            ReportesFinales.query.filter_by(project_id=project_id).all())
+    usuarios = list(reportes_por_usuario.keys())
+    num_pares = contar_pares(len(usuarios))
+
+    huellas_actuales = calcular_huellas_sintacticas(reportes_por_usuario, obtener_destinos(ngrama_value, multingrama),
+                                                    motor)
+    plan, usuarios_cambiados = PLAN_COMPLETO, None
+    if huellas_previas is not None:
+        plan, usuarios_cambiados = planificar_proyecto(huellas_actuales, huellas_previas)
+        if plan == PLAN_OMITIR:
+            if estadisticas is not None:
+                estadisticas["proyectos_omitidos"] += 1
+                estadisticas["pares_omitidos"] += num_pares
+            return None
+
+    if len(usuarios) <= 1:
+        if len(usuarios) == 1:
+            resolver_proyecto_un_integrante(project_id, usuarios[0], ngrama_value, huellas_previas,
+                                            huellas_actuales, multingrama, motor)
+        return None
+
+    lemas, pendientes = buscar_lemas_en_cache(list(reportes_por_usuario.values()), COLUMNAS_SECCIONES)
+    lemas_por_seccion = {}
+    secciones_pendientes = []
+    for seccion_nombre in COLUMNAS_SECCIONES:
+        lemas_por_seccion[seccion_nombre] = []
+        for posicion, user_id in enumerate(usuarios):
+            clave = (reportes_por_usuario[user_id].id, seccion_nombre)
+            lemas_por_seccion[seccion_nombre].append(lemas.get(clave, ""))
+            if clave in pendientes:
+                texto_hash, texto = pendientes[clave]
+                secciones_pendientes.append((seccion_nombre, posicion, clave, texto_hash, str(texto)))
+
+    return {
+        "project_id": project_id,
+        "usuarios": usuarios,
+        "lemas_por_seccion": lemas_por_seccion,
+        "secciones_pendientes": secciones_pendientes,
+        "tolerancias": tolerancias,
+        "ngrama_value": ngrama_value,
+        "multingrama": multingrama,
+        "motor": motor,
+        "ngramas": tuple(obtener_destinos(ngrama_value, multingrama)),
+        "plan": plan if huellas_previas is not None else None,
+        "usuarios_cambiados": usuarios_cambiados,
+        "huellas_actuales": huellas_actuales,
+        "num_pares": num_pares,
+    }
+
+def procesar_tarea_proyecto(tarea):
+    """
+    Se ejecuta en el proceso trabajador: lematiza las secciones que no estaban en caché y
+    calcula las comparaciones del proyecto. No accede a la BD.
+    """
+    pendientes = tarea["secciones_pendientes"]
+    lemas_nuevos = {}
+    if pendientes:
+        lemas_calculados = preprocesar_textos([texto for *_, texto in pendientes], n_process=1)
+        for (seccion_nombre, posicion, clave, texto_hash, _), lemas in zip(pendientes, lemas_calculados):
+            tarea["lemas_por_seccion"][seccion_nombre][posicion] = lemas
+            lemas_nuevos[clave] = (texto_hash, lemas)
+
+    comparaciones_por_ngrama = calcular_comparaciones_ngramas(tarea["project_id"], tarea["usuarios"],
+                                                            tarea["lemas_por_seccion"], tarea["tolerancias"],
+                                                            tarea["ngramas"], tarea["motor"])
+    if tarea["plan"] == PLAN_PARCIAL:
+        comparaciones_por_ngrama = {ngrama: comparaciones.filtrar_por_usuarios(tarea["usuarios_cambiados"])
+                                    for ngrama, comparaciones in comparaciones_por_ngrama.items()}
+    return {"project_id": tarea["project_id"], "comparaciones": comparaciones_por_ngrama, "lemas_nuevos": lemas_nuevos,
+            "ngrama_value": tarea["ngrama_value"], "multingrama": tarea["multingrama"],
+            "motor": tarea["motor"], "plan": tarea["plan"], "huellas_actuales": tarea["huellas_actuales"], "num_pares": tarea["num_pares"],
+            "metricas": extraer_metricas_trabajador()}
+
+def registrar_resumen_proyecto(project_id, num_usuarios, comparaciones_por_ngrama):
+    """Una línea por proyecto con los pares guardados y los que tienen alguna sección similar, por orden."""
+    logger.info("Proyecto %s: %d usuarios, %s.", project_id, num_usuarios, ", ".join(
+        f"{len(comparaciones)} pares guardados ({comparaciones.contar_con_similitud()} con similitud)"
+        + (f" en {ngrama}-grama" if len(comparaciones_por_ngrama) > 1 else "")
+        for ngrama, comparaciones in comparaciones_por_ngrama.items()))
+
+def guardar_resultado_proyecto(resultado, estadisticas=None):
+    """Escritor único en el proceso principal: guarda lemas nuevos, comparaciones y huellas del proyecto."""
+    combinar_metricas(resultado.get("metricas"))
+    guardar_lemas_en_cache(resultado["lemas_nuevos"])
+    destinos = obtener_destinos(resultado["ngrama_value"], resultado["multingrama"])
+    pares_guardados = guardar_comparaciones_destinos(destinos, resultado["comparaciones"])
+    if pares_guardados is None:
+        raise RuntimeError(f"No se pudieron guardar las comparaciones del proyecto {resultado['project_id']}.")
+    finalizar_proyecto_incremental(resultado["project_id"], resultado["ngrama_value"],
+                                resultado["plan"], resultado["huellas_actuales"], resultado["multingrama"],
+                                resultado["motor"])
+    registrar_resumen_proyecto(resultado["project_id"], len(resultado["huellas_actuales"]), resultado["comparaciones"])
+    if estadisticas is not None:
+        estadisticas["pares_analizados"] += pares_guardados
+        estadisticas["pares_omitidos"] += resultado["num_pares"] - pares_guardados
 
 
 # --- Nueva función para analizar todos los proyectos (adaptada) ---
-def analizar_todos_los_proyectos_service(ngrama_value=1):
+def analizar_todos_los_proyectos_service(ngrama_value=1, num_procesos=None, incremental=False, progreso=None,
+                                        multingrama=False, motor=MOTOR_CONTEO):
+    """
+    Analiza todos los proyectos con reportes. En modo incremental solo se reanalizan los proyectos
+    cuya membresía o cuyos textos cambiaron desde el último análisis con el mismo n-grama.
+    Con 'multingrama' cada sección se tokeniza una vez y se calculan los n-gramas 1 a 4 en la
+    misma pasada, guardando cada orden en su tabla comparacion_tm* ('ngrama_value' se ignora).
+    'motor' es la ponderación léxica ('conteo', 'tfidf' o 'bm25'). Las frecuencias de documento
+    de los motores con IDF salen de la caché de lemas y se recalculan solo si cambió.
+    'progreso(completados, total, pares)' es opcional y se llama al terminar cada proyecto, con el
+    número acumulado de pares resueltos (analizados u omitidos).
+    """
 
-    print("Iniciando el análisis de todos los proyectos...")
+    logger.info(f"Iniciando el análisis {'incremental ' if incremental else ''}"
+        f"{'multi n-grama ' if multingrama else ''}de todos los proyectos (motor: {motor})...")
+
+    if motor not in MOTORES:
+        msg = f"Error: Motor léxico desconocido '{motor}'. Opciones: {', '.join(MOTORES)}."
+        logger.error(msg)
+        return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
+
+    msg = comprobar_claves_unicas(obtener_destinos(ngrama_value, multingrama).values())
+    if msg:
+        logger.error(msg)
+        return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
 
     # Obtener tolerancias una sola vez al inicio
     tolerancias = obtener_tolerancias()
     if tolerancias is None:
         msg = "Error crítico: No se pudieron obtener las tolerancias generales. Abortando análisis global."
-        print(msg)
-        # current_app.logger.error(msg)
+        logger.error(msg)
         return {"estado": "error", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
 
     try:
-        query_proyectos = db.session.query(distinct(ReportesFinales.project_id)).all()
-        project_ids = [pid[0] for pid in query_proyectos if pid[0] is not None]
-        
-        total_proyectos_encontrados = len(project_ids)
+        total_proyectos_encontrados = contar_proyectos()
         
-        if not project_ids:
+        if not total_proyectos_encontrados:
             msg = "No se encontraron proyectos con reportes para analizar."
-            print(msg)
+            logger.info(msg)
             return {"estado": "completado", "mensaje": msg, "proyectos_analizados": 0, "tiempo_total": 0}
 
-        print(f"Se encontraron {total_proyectos_encontrados} proyectos únicos con reportes para analizar.")
+        logger.info(f"Se encontraron {total_proyectos_encontrados} proyectos únicos con reportes para analizar.")
             
         tiempo_inicio_total = time.time()
         proyectos_procesados_count = 0
-        
-        for i, project_id in enumerate(project_ids, 1):
-            print(f"\n{'=' * 40}")
-            print(f"Procesando proyecto {i}/{total_proyectos_encontrados}: ID {project_id}")
-            print(f"{'=' * 40}\n")
+        num_procesos = num_procesos or ANALISIS_NUM_PROCESOS
+        estadisticas = {"proyectos_omitidos": 0, "pares_analizados": 0, "pares_omitidos": 0}
+        huellas = cargar_huellas(*obtener_clave_huellas(ngrama_value, multingrama, motor)) if incremental else {}
+
+        def huellas_de(project_id):
+            return huellas.get(project_id, {}) if incremental else None
+
+        def pares_resueltos():
+            return estadisticas["pares_analizados"] + estadisticas["pares_omitidos"]
+
+        if usa_estadisticas(motor):
+            # Las frecuencias de documento se cuentan sobre la caché de lemas: primero se lematiza
+            # lo pendiente (solo lo nuevo pasa por spaCy) y los trabajadores las leen del disco
+            preprocesar_reportes_pendientes()
+            actualizar_estadisticas(tuple(obtener_destinos(ngrama_value, multingrama)))
+
+        if num_procesos > 1:
+            # Proyectos completos repartidos entre procesos, de mayor a menor; este proceso es el único escritor
+            logger.info(f"Analizando en paralelo con {num_procesos} procesos trabajadores.")
+            resultado_paralelo = ejecutar_proyectos_en_paralelo(
+                iterar_reportes_por_proyecto(ordenar_por_tamano=True), total_proyectos_encontrados,
+                preparar_tarea=lambda pid, reportes: preparar_tarea_proyecto(pid, tolerancias, ngrama_value,
+                                                                            huellas_de(pid), estadisticas,
+                                                                            reportes_por_usuario=reportes,
+                                                                            multingrama=multingrama, motor=motor),
+                procesar_tarea=procesar_tarea_proyecto,
+                guardar_resultado=lambda resultado: guardar_resultado_proyecto(resultado, estadisticas),
+                inicializador=inicializar_trabajador_sintactico,
+                num_procesos=num_procesos,
+                progreso=(lambda completados, total: progreso(completados, total, pares_resueltos())) if progreso else None
+            )
+            proyectos_procesados_count = resultado_paralelo["procesados"] - estadisticas["proyectos_omitidos"]
+            incrementar(CONTADOR_ERRORES, ANALISIS_SINTACTICO, resultado_paralelo["errores"])
+        else:
+            # Etapa de preprocesamiento: todas las secciones pendientes pasan por nlp.pipe en lotes.
+            # En modo incremental se omite: solo los proyectos con cambios lematizan lo que falte.
+            if not incremental and not usa_estadisticas(motor):
+                preprocesar_reportes_pendientes()
             
-            analizar_proyecto(project_id, tolerancias, ngrama_value = ngrama_value) # Pasar las tolerancias obtenidas
-            proyectos_procesados_count +=1
+            # Una sola consulta en flujo para todos los proyectos, en lugar de una por proyecto
+            for i, (project_id, reportes_por_usuario) in enumerate(iterar_reportes_por_proyecto(), 1):
+                logger.debug("Procesando proyecto %d/%d: ID %s", i, total_proyectos_encontrados, project_id)
+
+                resultado_proyecto = analizar_proyecto(project_id, tolerancias, ngrama_value = ngrama_value,
+                                                    huellas_previas = huellas_de(project_id),
+                                                    reportes_por_usuario = reportes_por_usuario,
+                                                    multingrama = multingrama, motor = motor,
+                                                    estadisticas_listas = True) # Pasar las tolerancias obtenidas
+                estadisticas["pares_analizados"] += resultado_proyecto["pares_analizados"]
+                estadisticas["pares_omitidos"] += resultado_proyecto["pares_omitidos"]
+                if resultado_proyecto["omitido"]:
+                    estadisticas["proyectos_omitidos"] += 1
+                else:
+                    proyectos_procesados_count +=1
+                if progreso is not None:
+                    progreso(i, total_proyectos_encontrados, pares_resueltos())
+
+        # Resumen del listado de todos los proyectos recorridos, también los que no tienen
+        # comparaciones (analizado = 0) y con sus integrantes actuales
+        reconstruir_resumen_proyectos()
 
         tiempo_total_segundos = time.time() - tiempo_inicio_total
         
@@ -248,24 +585,26 @@ def analizar_todos_los_proyectos_service(ngrama_value=1):
         tiempo_total_formateado = f"{int(horas)}h {int(minutos)}m {int(segundos)}s"
 
         msg_final = (f"Análisis de todos los proyectos ({proyectos_procesados_count}) completado. "
+                    f"Proyectos omitidos sin cambios: {estadisticas['proyectos_omitidos']}, "
+                    f"pares omitidos: {estadisticas['pares_omitidos']}. "
                     f"Tiempo total: {tiempo_total_formateado}")
-        print(msg_final)
-        # current_app.logger.info(msg_final)
+        logger.info(msg_final)
         
         return {
             "estado": "completado",
             "mensaje": msg_final,
             "proyectos_analizados": proyectos_procesados_count,
+            "proyectos_omitidos": estadisticas["proyectos_omitidos"],
+            "pares_analizados": estadisticas["pares_analizados"],
+            "pares_omitidos": estadisticas["pares_omitidos"],
             "tiempo_total_segundos": round(tiempo_total_segundos, 2),
             "tiempo_total_formateado": tiempo_total_formateado
         }
 
     except Exception as e:
         error_msg = f"Error durante el análisis de todos los proyectos: {str(e)}"
-        print(error_msg)
-        # current_app.logger.error(error_msg)
-        import traceback
-        traceback.print_exc() # Para log detallado del error en el servidor
+        logger.exception(error_msg) # Incluye la traza del error
+        incrementar(CONTADOR_ERRORES, ANALISIS_SINTACTICO)
         return {"estado": "error", "mensaje": error_msg, 
                 "proyectos_analizados": proyectos_procesados_count if 'proyectos_procesados_count' in locals() else 0, 
                 "tiempo_total": 0}
\ No newline at end of file
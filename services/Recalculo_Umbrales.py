@@ -0,0 +1,70 @@
+import logging
+import time
+from sqlalchemy import text, inspect
+
+from services.Guardado_Comparaciones import COLUMNAS_SIMILITUD, TABLAS_COMPARACION
+from services.Procesamiento_Similitud import obtener_tolerancias
+from services.Usuarios_Marcados import TABLA_ORIGEN_MARCADOS, sincronizar_usuarios_marcados
+from services.Resumen_Proyectos import TABLA_ORIGEN_RESUMEN, reconstruir_resumen_proyectos
+from config.config import db
+
+logger = logging.getLogger(__name__)
+
+def construir_sentencia_recalculo(tabla):
+    """
+    UPDATE que recalcula 'secciones_similares' y 'similitud_detectada' a partir de las
+    similitudes guardadas. Se redondea a 4 decimales como al analizar, para que el valor FLOAT
+    almacenado se compare igual que el original contra el umbral.
+    """
+    conteo = " + ".join(f"(ROUND(COALESCE({columna}, 0), 4) > :umbral_{columna})" for columna in COLUMNAS_SIMILITUD)
+    return text(f"""
+        UPDATE {tabla}
+        SET secciones_similares = {conteo},
+            similitud_detectada = CASE WHEN ({conteo}) > 0 THEN 1 ELSE 0 END
+    """)
+
+def recalcular_umbrales(tolerancias=None, tablas=None, progreso=None):
+    """
+    Vuelve a aplicar las tolerancias actuales a todas las comparaciones ya guardadas, sin
+    recalcular similitudes: una sentencia UPDATE por tabla de comparación existente.
+    'tolerancias' es {seccion: umbral}; si no se indica, se lee de la BD.
+    Retorna {"estado": ..., "tablas": {tabla: filas_modificadas}, ...}.
+    """
+    tiempo_inicio = time.time()
+    if tolerancias is None:
+        tolerancias = obtener_tolerancias()
+        if tolerancias is None:
+            msg = "Error: No se pudieron obtener las tolerancias para recalcular los umbrales."
+            logger.error(msg)
+            return {"estado": "error", "mensaje": msg}
+
+    parametros = {f"umbral_{columna}": float(tolerancias.get(columna, 0.0)) for columna in COLUMNAS_SIMILITUD}
+    existentes = set(inspect(db.engine).get_table_names())
+    tablas = [tabla for tabla in (tablas or TABLAS_COMPARACION) if tabla in existentes]
+
+    resultado_tablas = {}
+    try:
+        for i, tabla in enumerate(tablas, 1):
+            filas = db.session.execute(construir_sentencia_recalculo(tabla), parametros).rowcount
+            if tabla == TABLA_ORIGEN_MARCADOS:
+                # El nuevo umbral puede marcar o desmarcar a cualquier usuario
+                sincronizar_usuarios_marcados()
+            db.session.commit()
+            resultado_tablas[tabla] = filas
+            logger.info(f"Umbrales recalculados en '{tabla}': {filas} filas modificadas.")
+            if progreso is not None:
+                progreso(i, len(tablas))
+        if TABLA_ORIGEN_RESUMEN in tablas:
+            # Cambian los integrantes con similitud de cualquier proyecto
+            reconstruir_resumen_proyectos()
+    except Exception as e:
+        db.session.rollback()
+        error_msg = f"Error al recalcular los umbrales: {str(e)}"
+        logger.exception(error_msg)
+        return {"estado": "error", "mensaje": error_msg, "tablas": resultado_tablas}
+
+    tiempo_total_segundos = round(time.time() - tiempo_inicio, 2)
+    msg_final = f"Umbrales recalculados en {len(tablas)} tablas en {tiempo_total_segundos}s."
+    logger.info(msg_final)
+    return {"estado": "completado", "mensaje": msg_final, "tablas": resultado_tablas,
+            "tiempo_total_segundos": tiempo_total_segundos}
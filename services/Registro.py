@@ -0,0 +1,71 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from multiprocessing import util as multiprocessing_util
+
+from config.config import LOG_NIVEL, LOG_NIVELES_MODULOS, LOG_FORMATO, LOG_TRAZA_PARES
+
+# Logger de la traza por par; solo emite con LOG_TRAZA_PARES (o traza_pares=True)
+NOMBRE_TRAZA_PARES = "traza_pares"
+
+_lock = threading.Lock()
+_listener = None
+_manejador_cola = None
+
+def interpretar_niveles_modulos(texto):
+    """'modulo=NIVEL,modulo=NIVEL' -> {modulo: NIVEL}; se ignoran las entradas mal formadas."""
+    niveles = {}
+    for entrada in (texto or "").split(","):
+        modulo, separador, nivel = entrada.partition("=")
+        if separador and modulo.strip() and nivel.strip():
+            niveles[modulo.strip()] = nivel.strip().upper()
+    return niveles
+
+def configurar_registro(nivel=None, niveles_modulos=None, traza_pares=None):
+    """
+    Envía todos los registros a una cola (QueueHandler en el logger raíz) y los formatea y
+    escribe en stdout desde el hilo de un QueueListener, de modo que el hilo del análisis no
+    espera la E/S. Se llama una vez por proceso (la aplicación, cada trabajador, el benchmark);
+    las llamadas siguientes solo cambian los niveles.
+    - nivel: nivel general ('INFO' por defecto, de LOG_NIVEL).
+    - niveles_modulos: {modulo: nivel} o texto 'modulo=NIVEL,...' (de LOG_NIVELES_MODULOS).
+    - traza_pares: activa la traza por par de NOMBRE_TRAZA_PARES (de LOG_TRAZA_PARES).
+    """
+    global _listener, _manejador_cola
+    nivel = (nivel or LOG_NIVEL).upper()
+    if niveles_modulos is None or isinstance(niveles_modulos, str):
+        niveles_modulos = interpretar_niveles_modulos(LOG_NIVELES_MODULOS if niveles_modulos is None else niveles_modulos)
+    traza_pares = LOG_TRAZA_PARES if traza_pares is None else traza_pares
+
+    raiz = logging.getLogger()
+    with _lock:
+        if _listener is None:
+            cola = queue.SimpleQueue()
+            manejador_salida = logging.StreamHandler(sys.stdout)
+            manejador_salida.setFormatter(logging.Formatter(LOG_FORMATO))
+            _manejador_cola = logging.handlers.QueueHandler(cola)
+            raiz.addHandler(_manejador_cola)
+            _listener = logging.handlers.QueueListener(cola, manejador_salida, respect_handler_level=True)
+            _listener.start()
+            # Vacía la cola al salir; los trabajadores de multiprocessing no ejecutan atexit
+            atexit.register(detener_registro)
+            multiprocessing_util.Finalize(None, detener_registro, exitpriority=0)
+
+    raiz.setLevel(nivel)
+    for modulo, nivel_modulo in niveles_modulos.items():
+        logging.getLogger(modulo).setLevel(nivel_modulo)
+    logging.getLogger(NOMBRE_TRAZA_PARES).setLevel(logging.DEBUG if traza_pares else logging.WARNING)
+
+def detener_registro():
+    """Escribe los registros pendientes de la cola y detiene el hilo del QueueListener."""
+    global _listener, _manejador_cola
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        logging.getLogger().removeHandler(_manejador_cola)
+        _listener = None
+        _manejador_cola = None
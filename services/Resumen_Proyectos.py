@@ -0,0 +1,157 @@
+import logging
+from datetime import datetime
+from sqlalchemy import text, bindparam, insert, inspect
+
+from config.config import db
+from models.Resumen_Proyectos import ResumenProyecto
+from services.Migraciones import tabla_disponible
+
+logger = logging.getLogger(__name__)
+
+# Tabla de comparaciones de la que salen los conteos de similitud y el estado 'analizado'
+TABLA_ORIGEN_RESUMEN = 'comparacion_similitud'
+
+# Tablas que lee el cálculo del resumen
+TABLAS_FUENTE_RESUMEN = ['reportes_finales', 'comparacion_similitud', 'project']
+
+# Proyectos por consulta al reconstruir el resumen completo (y por commit)
+TAMANO_BLOQUE_RESUMEN = 500
+
+# Consultas agrupadas por proyecto, cada una resuelta con un índice que empieza por project_id
+# (o por similitud_detectada, project_id)
+SQL_INTEGRANTES = """
+    SELECT project_id, COUNT(DISTINCT user_id)
+    FROM reportes_finales
+    WHERE project_id IN :ids
+    GROUP BY project_id
+"""
+
+SQL_INTEGRANTES_CON_SIMILITUD = """
+    SELECT usuarios.project_id, COUNT(DISTINCT usuarios.user_id)
+    FROM (
+        SELECT project_id, usuario_1_id AS user_id FROM comparacion_similitud
+        WHERE similitud_detectada = 1 AND project_id IN :ids
+        UNION
+        SELECT project_id, usuario_2_id FROM comparacion_similitud
+        WHERE similitud_detectada = 1 AND project_id IN :ids
+    ) usuarios
+    GROUP BY usuarios.project_id
+"""
+
+SQL_ESTADO_ANALISIS = """
+    SELECT project_id, COUNT(*), MIN(status_analisis)
+    FROM comparacion_similitud
+    WHERE project_id IN :ids
+    GROUP BY project_id
+"""
+
+SQL_TEMATICAS = "SELECT id, id_thematic FROM project WHERE id IN :ids"
+
+def _consultar_por_proyectos(sql, project_ids, conexion=None):
+    consulta = text(sql).bindparams(bindparam("ids", expanding=True))
+    return (conexion or db.session).execute(consulta, {"ids": project_ids}).all()
+
+def calcular_resumen(project_ids, conexion=None):
+    """
+    Filas de 'resumen_proyectos' para los proyectos indicados, con los mismos criterios que el
+    listado calculaba en cada visita:
+    - num_integrantes: usuarios distintos con reporte en el proyecto.
+    - integrantes_con_similitud: usuarios distintos en pares con similitud detectada.
+    - analizado: 1 si el proyecto tiene comparaciones y ninguna está pendiente.
+    Solo se incluyen proyectos con reportes que existen en 'project'. Con 'conexion' (en una
+    migración) se consulta con ella en lugar de la sesión.
+    """
+    integrantes = dict(_consultar_por_proyectos(SQL_INTEGRANTES, project_ids, conexion))
+    if not integrantes:
+        return []
+    con_similitud = dict(_consultar_por_proyectos(SQL_INTEGRANTES_CON_SIMILITUD, list(integrantes), conexion))
+    estados = {project_id: (total, minimo) for project_id, total, minimo in
+            _consultar_por_proyectos(SQL_ESTADO_ANALISIS, list(integrantes), conexion)}
+    tematicas = dict(_consultar_por_proyectos(SQL_TEMATICAS, list(integrantes), conexion))
+
+    ahora = datetime.utcnow()
+    filas = []
+    for project_id, num_integrantes in integrantes.items():
+        if project_id not in tematicas:
+            continue
+        total, minimo = estados.get(project_id, (0, 0))
+        filas.append({
+            "project_id": project_id,
+            "id_thematic": tematicas[project_id],
+            "num_integrantes": num_integrantes,
+            "integrantes_con_similitud": con_similitud.get(project_id, 0),
+            "analizado": 1 if total and minimo != 0 else 0,
+            "updated_at": ahora,
+        })
+    return filas
+
+def actualizar_resumen_proyectos(project_ids):
+    """
+    Recalcula el resumen de los proyectos indicados (los de un lote recién guardado) y elimina el
+    de los que ya no tienen reportes. No hace commit: se ejecuta dentro de la transacción del
+    llamador, como la actualización de 'usuarios_marcados'.
+    Retorna el número de proyectos con resumen.
+    """
+    if not tabla_disponible(ResumenProyecto.__tablename__):
+        return 0
+    project_ids = sorted({int(project_id) for project_id in project_ids})
+    if not project_ids:
+        return 0
+    filas = calcular_resumen(project_ids)
+    db.session.query(ResumenProyecto).filter(ResumenProyecto.project_id.in_(project_ids)) \
+        .delete(synchronize_session=False)
+    if filas:
+        db.session.bulk_insert_mappings(ResumenProyecto, filas)
+    return len(filas)
+
+def reconstruir_resumen_proyectos(tamano_bloque=TAMANO_BLOQUE_RESUMEN):
+    """
+    Recalcula el resumen de todos los proyectos con reportes (y elimina el de los demás), por
+    bloques de 'tamano_bloque' proyectos con un commit por bloque. Se usa tras recalcular los
+    umbrales, que cambia 'similitud_detectada' en toda la tabla sin pasar por el guardado por lotes,
+    y al final de cada análisis global, que recorre todos los proyectos: así el listado incluye los
+    proyectos cuyos primeros reportes llegaron después del llenado inicial (aunque no tengan
+    comparaciones) y el número de integrantes no queda desactualizado.
+    Retorna el número de proyectos con resumen, o None si ocurrió un error.
+    """
+    if not tabla_disponible(ResumenProyecto.__tablename__):
+        return None
+    try:
+        project_ids = {fila[0] for fila in db.session.execute(
+            text("SELECT DISTINCT project_id FROM reportes_finales WHERE project_id IS NOT NULL"))}
+        project_ids |= {fila[0] for fila in db.session.query(ResumenProyecto.project_id)}
+        project_ids = sorted(project_ids)
+        total = 0
+        for i in range(0, len(project_ids), tamano_bloque):
+            total += actualizar_resumen_proyectos(project_ids[i:i + tamano_bloque])
+            db.session.commit()
+        logger.info("Resumen de proyectos reconstruido: %d proyectos.", total)
+        return total
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"Error al reconstruir el resumen de proyectos: {e}")
+        return None
+
+def llenar_resumen_proyectos(conexion, tamano_bloque=TAMANO_BLOQUE_RESUMEN):
+    """
+    Llena 'resumen_proyectos', si está vacía, con todos los proyectos con reportes, dentro de la
+    transacción de la migración que la crea: el listado solo lee la tabla. Si falta alguna tabla
+    fuente (bases locales sin 'project'), la deja vacía; se llenará al guardar comparaciones.
+    Retorna el número de proyectos con resumen.
+    """
+    faltantes = [tabla for tabla in TABLAS_FUENTE_RESUMEN if not inspect(conexion).has_table(tabla)]
+    if faltantes:
+        logger.info("Resumen de proyectos no llenado: faltan las tablas %s.", ", ".join(faltantes))
+        return 0
+    if conexion.execute(text("SELECT 1 FROM resumen_proyectos LIMIT 1")).first() is not None:
+        return 0
+    project_ids = sorted(fila[0] for fila in conexion.execute(
+        text("SELECT DISTINCT project_id FROM reportes_finales WHERE project_id IS NOT NULL")))
+    total = 0
+    for i in range(0, len(project_ids), tamano_bloque):
+        filas = calcular_resumen(project_ids[i:i + tamano_bloque], conexion)
+        if filas:
+            conexion.execute(insert(ResumenProyecto.__table__), filas)
+        total += len(filas)
+    logger.info("Resumen de proyectos llenado: %d proyectos.", total)
+    return total
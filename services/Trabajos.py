@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config import TRABAJOS_MAX_HILOS, TRABAJOS_MAX_HISTORIAL
+
+logger = logging.getLogger(__name__)
+
+# Estados de un trabajo en segundo plano
+ESTADO_EN_COLA = "en_cola"
+ESTADO_EN_EJECUCION = "en_ejecucion"
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+
+ESTADOS_ACTIVOS = (ESTADO_EN_COLA, ESTADO_EN_EJECUCION)
+
+_ejecutor = ThreadPoolExecutor(max_workers=TRABAJOS_MAX_HILOS, thread_name_prefix="trabajo-analisis")
+_lock = threading.Lock()
+_trabajos = OrderedDict() # trabajo_id -> dict con el estado del trabajo
+
+
+class TrabajoDuplicadoError(Exception):
+    """Ya hay un trabajo activo (en cola o en ejecución) del mismo tipo o de un tipo en conflicto."""
+
+    def __init__(self, trabajo_id):
+        super().__init__(f"Ya existe un trabajo activo que escribe las mismas tablas: {trabajo_id}")
+        self.trabajo_id = trabajo_id
+
+
+def _copiar_trabajo(trabajo):
+    copia = dict(trabajo)
+    copia["progreso"] = dict(trabajo["progreso"])
+    inicio = trabajo["iniciado_en"]
+    if inicio is not None:
+        copia["tiempo_transcurrido_segundos"] = round((trabajo["finalizado_en"] or time.time()) - inicio, 2)
+    else:
+        copia["tiempo_transcurrido_segundos"] = 0
+    return copia
+
+def _depurar_historial():
+    """Descarta los trabajos terminados más antiguos cuando se supera el historial máximo."""
+    terminados = [trabajo_id for trabajo_id, trabajo in _trabajos.items() if trabajo["estado"] not in ESTADOS_ACTIVOS]
+    for trabajo_id in terminados[:max(0, len(_trabajos) - TRABAJOS_MAX_HISTORIAL)]:
+        del _trabajos[trabajo_id]
+
+def _ejecutar(app, trabajo_id, funcion, kwargs):
+    with _lock:
+        trabajo = _trabajos[trabajo_id]
+        trabajo["estado"] = ESTADO_EN_EJECUCION
+        trabajo["iniciado_en"] = time.time()
+
+    def progreso(completados, total, pares=None):
+        with _lock:
+            trabajo["progreso"]["proyectos_completados"] = completados
+            trabajo["progreso"]["total_proyectos"] = total
+            if pares is not None:
+                trabajo["progreso"]["pares_procesados"] = pares
+
+    try:
+        # El hilo trabajador necesita su propio contexto de aplicación para usar la BD
+        with app.app_context():
+            resultado = funcion(progreso=progreso, **kwargs)
+        estado = ESTADO_ERROR if isinstance(resultado, dict) and resultado.get("estado") == "error" else ESTADO_COMPLETADO
+    except Exception as e:
+        logger.exception(f"Error en el trabajo {trabajo_id} ({trabajo['tipo']}): {e}")
+        resultado = {"estado": "error", "mensaje": f"Error inesperado en el trabajo: {str(e)}"}
+        estado = ESTADO_ERROR
+
+    with _lock:
+        trabajo["estado"] = estado
+        trabajo["resultado"] = resultado
+        trabajo["finalizado_en"] = time.time()
+
+def _en_conflicto(trabajo, tipo, conflictos):
+    return (trabajo["tipo"] == tipo or trabajo["tipo"] in conflictos or tipo in trabajo["conflictos"])
+
+def encolar_trabajo(app, tipo, funcion, conflictos=(), **kwargs):
+    """
+    Registra y encola la ejecución de 'funcion(progreso=..., **kwargs)' en el grupo de hilos.
+    'funcion' debe aceptar el callback progreso(completados, total, pares=None).
+    'conflictos' son otros tipos que escriben las mismas tablas (por ejemplo, el análisis
+    combinado escribe las del sintáctico y las del semántico).
+    Lanza TrabajoDuplicadoError si ya hay un trabajo activo del mismo tipo o en conflicto.
+    Retorna una copia del estado del trabajo creado.
+    """
+    conflictos = tuple(conflictos)
+    with _lock:
+        for trabajo_id, trabajo in _trabajos.items():
+            if trabajo["estado"] in ESTADOS_ACTIVOS and _en_conflicto(trabajo, tipo, conflictos):
+                raise TrabajoDuplicadoError(trabajo_id)
+
+        trabajo_id = uuid.uuid4().hex
+        trabajo = {
+            "id": trabajo_id,
+            "tipo": tipo,
+            "conflictos": conflictos,
+            "parametros": kwargs,
+            "estado": ESTADO_EN_COLA,
+            "progreso": {"proyectos_completados": 0, "total_proyectos": None},
+            "creado_en": time.time(),
+            "iniciado_en": None,
+            "finalizado_en": None,
+            "resultado": None,
+        }
+        _trabajos[trabajo_id] = trabajo
+        _depurar_historial()
+        copia = _copiar_trabajo(trabajo)
+
+    _ejecutor.submit(_ejecutar, app, trabajo_id, funcion, kwargs)
+    return copia
+
+def obtener_trabajo(trabajo_id):
+    """Copia del estado del trabajo, o None si no existe (o ya salió del historial)."""
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        return _copiar_trabajo(trabajo) if trabajo is not None else None
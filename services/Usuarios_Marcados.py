@@ -0,0 +1,72 @@
+import logging
+from datetime import datetime
+from sqlalchemy import text, bindparam
+
+from config.config import db
+from services.Migraciones import tabla_disponible
+
+logger = logging.getLogger(__name__)
+
+# Tabla de comparaciones de la que sale el conjunto de usuarios marcados (la que usa el filtro)
+TABLA_ORIGEN_MARCADOS = 'comparacion_similitud'
+
+# Usuarios con similitud detectada que aún no están marcados. Cada SELECT de la UNION usa el
+# índice (usuario_X_id, similitud_detectada) de la tabla de comparaciones.
+SQL_MARCAR = """
+    INSERT INTO usuarios_marcados (user_id, updated_at)
+    SELECT candidatos.user_id, :ahora
+    FROM (
+        SELECT usuario_1_id AS user_id FROM comparacion_similitud WHERE similitud_detectada = 1 {filtro_1}
+        UNION
+        SELECT usuario_2_id FROM comparacion_similitud WHERE similitud_detectada = 1 {filtro_2}
+    ) candidatos
+    WHERE candidatos.user_id <> 0
+      AND NOT EXISTS (SELECT 1 FROM usuarios_marcados um WHERE um.user_id = candidatos.user_id)
+"""
+
+# Usuarios marcados que ya no tienen ninguna comparación con similitud detectada
+SQL_DESMARCAR = """
+    DELETE FROM usuarios_marcados
+    WHERE NOT EXISTS (SELECT 1 FROM comparacion_similitud cs
+                      WHERE cs.usuario_1_id = usuarios_marcados.user_id AND cs.similitud_detectada = 1)
+      AND NOT EXISTS (SELECT 1 FROM comparacion_similitud cs
+                      WHERE cs.usuario_2_id = usuarios_marcados.user_id AND cs.similitud_detectada = 1)
+      {filtro}
+"""
+
+def sincronizar_usuarios_marcados(user_ids=None):
+    """
+    Ajusta 'usuarios_marcados' a las comparaciones guardadas insertando y borrando solo las
+    diferencias. Con 'user_ids' se revisan únicamente esos usuarios (los de un lote recién
+    escrito); sin ellos, todos. No hace commit: se ejecuta dentro de la transacción del llamador,
+    de modo que el conjunto cambia junto con las comparaciones.
+    Retorna (marcados, desmarcados).
+    """
+    if not tabla_disponible('usuarios_marcados'):
+        return 0, 0
+    parametros = {}
+    if user_ids is not None:
+        user_ids = sorted({int(user_id) for user_id in user_ids} - {0})
+        if not user_ids:
+            return 0, 0
+        parametros["ids"] = user_ids
+        marcar = text(SQL_MARCAR.format(filtro_1="AND usuario_1_id IN :ids", filtro_2="AND usuario_2_id IN :ids"))
+        desmarcar = text(SQL_DESMARCAR.format(filtro="AND usuarios_marcados.user_id IN :ids"))
+        marcar = marcar.bindparams(bindparam("ids", expanding=True))
+        desmarcar = desmarcar.bindparams(bindparam("ids", expanding=True))
+    else:
+        marcar = text(SQL_MARCAR.format(filtro_1="", filtro_2=""))
+        desmarcar = text(SQL_DESMARCAR.format(filtro=""))
+
+    marcados = db.session.execute(marcar, dict(parametros, ahora=datetime.utcnow())).rowcount
+    desmarcados = db.session.execute(desmarcar, parametros).rowcount
+    if marcados or desmarcados:
+        logger.debug("Usuarios marcados: %d nuevos, %d sin similitud retirados.", marcados, desmarcados)
+    return marcados, desmarcados
+
+def usuarios_de_filas(filas):
+    """IDs de usuario de un lote de filas de comparación (sin el 0 de los proyectos de un integrante)."""
+    return {fila[columna] for fila in filas for columna in ('usuario_1_id', 'usuario_2_id')} - {0}
+
+def hay_usuarios_marcados():
+    return db.session.execute(text("SELECT 1 FROM usuarios_marcados LIMIT 1")).first() is not None